@@ -1,4 +1,5 @@
 # kassensystem_basic/app/config/settings.py
+import os
 
 APP_NAME: str = "Kassensystem Basic"
 SECRET_KEY: str = "change-this-in-production-please-32bytes"
@@ -9,8 +10,69 @@ DEFAULT_DEV_MODE: bool = True
 # DB-URL (sqlite Datei liegt unter ./db/)
 DATABASE_URL: str = "sqlite:///./db/kassensystem.db"
 
+# SQLite-Performanceprofil (wird bei jeder neuen Verbindung gesetzt)
+# WAL: Berichte (Leser) blockieren Checkouts (Schreiber) nicht mehr.
+SQLITE_PRAGMAS: dict = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,       # ms warten statt "database is locked"
+    "cache_size": -20000,       # negativ = KiB (hier ~20 MB)
+    "mmap_size": 134217728,     # 128 MB
+    "temp_store": "MEMORY",
+}
+
+# Intervall fuer periodisches WAL-Checkpointing (Sekunden, 0 = aus)
+SQLITE_WAL_CHECKPOINT_SEC: int = 300
+
+# Belegnummern: Anzahl Nummern, die je Kasse am Stueck reserviert werden.
+# 1 = jede Nummer einzeln (lueckenlos); >1 spart den Schreibzugriff pro Beleg,
+# nicht verbrauchte Nummern eines Blocks bleiben beim Neustart als Luecke.
+RECEIPT_BLOCK_SIZE: int = 1
+
+# Login: max. gleichzeitige PBKDF2-Berechnungen (eigener Threadpool)
+AUTH_HASH_WORKERS: int = 2
+# Cache fuer den angemeldeten Benutzer je Session-user_id (Sekunden, 0 = aus)
+AUTH_USER_CACHE_TTL: int = 30
+
+# Session-Cookie (SessionMiddleware in main.py): Geheimnis aus der Umgebung.
+# Ohne KSB_SESSION_SECRET gilt das Entwicklungs-Geheimnis; damit verweigert
+# run_server.py den Server-Modus mit mehreren Workern oder ausserhalb von localhost.
+SESSION_SECRET_ENV: str = "KSB_SESSION_SECRET"
+DEV_SESSION_SECRET: str = "dev-secret"
+
+# Server-Modus (python run_server.py --server): Standardwerte, per Kommandozeile aenderbar.
+# Ohne --server startet wie bisher ein einzelner Prozess auf 127.0.0.1 (Desktop/EXE).
+# Auch im Server-Modus nur lokal; im Netz erreichbar erst mit ausdruecklichem --host.
+SERVER_HOST: str = "127.0.0.1"
+SERVER_PORT: int = 8000
+SERVER_WORKERS: int = 0                 # 0 = min(4, Anzahl CPUs)
+SERVER_KEEPALIVE_SEC: int = 5
+SERVER_BACKLOG: int = 2048
+SERVER_GRACEFUL_TIMEOUT_SEC: int = 30   # offene Requests beim Stoppen/Neuladen abarbeiten
+
+# Stempel-Dateien fuer Cache-Invalidierung zwischen Worker-Prozessen
+SHARED_STATE_DIR: str = "app/data/shared"
+
+# Freie Termine (app/services/verfuegbarkeit.py)
+TERMIN_RASTER_MIN: int = 5              # Aufloesung der Belegungs-Bitmaps (Minuten, teilt 60)
+TERMIN_SLOT_SCHRITT_MIN: int = 15       # angebotene Startzeiten (Vielfaches des Rasters)
+TERMIN_SUCHE_TAGE: int = 14
+# Gilt fuer Mitarbeiter ohne (gueltige) Verfuegbarkeit. Format wie Mitarbeiter.verfuegbarkeit:
+# {"mo": [["08:00", "12:00"], ["13:00", "18:00"]], ..., "ausnahmen": {"2025-12-24": []}}
+VERFUEGBARKEIT_STANDARD: dict = {
+    "mo": [["08:00", "18:00"]], "di": [["08:00", "18:00"]], "mi": [["08:00", "18:00"]],
+    "do": [["08:00", "18:00"]], "fr": [["08:00", "18:00"]], "sa": [["08:00", "14:00"]],
+}
+
 # Pfad fuer die DEV-UI-Konfiguration (JSON)
 DEV_CONFIG_PATH: str = "app/config/dev_ui_config.json"
+# Datei-Aenderungen (mtime) hoechstens alle n Sekunden pruefen (0 = bei jedem Zugriff)
+DEV_CONFIG_POLL_SEC: float = 1.0
+
+
+def session_secret() -> str:
+    """Geheimnis fuer die Session-Cookies (KSB_SESSION_SECRET, sonst DEV_SESSION_SECRET)."""
+    return os.environ.get(SESSION_SECRET_ENV) or DEV_SESSION_SECRET
 
 
 def get_nav_items(dev: bool) -> list[dict]:
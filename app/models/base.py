@@ -1,10 +1,13 @@
 # kassensystem_basic/app/models/base.py
 from __future__ import annotations
 
+import threading
+import time
 from pathlib import Path
-from typing import Iterator
+from typing import Iterator, Optional
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from app.config import settings as app_settings
@@ -12,6 +15,50 @@ from app.config import settings as app_settings
 Base = declarative_base()
 
 
+def apply_sqlite_profile(engine: Engine, pragmas: Optional[dict] = None) -> Engine:
+    """
+    Setzt das SQLite-Performanceprofil (WAL, synchronous, busy_timeout, ...)
+    auf jeder neuen Verbindung. Fuer andere DBs ohne Wirkung.
+    """
+    if engine.dialect.name != "sqlite":
+        return engine
+    profile = dict(app_settings.SQLITE_PRAGMAS if pragmas is None else pragmas)
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            for key, value in profile.items():
+                cur.execute(f"PRAGMA {key}={value}")
+        finally:
+            cur.close()
+
+    return engine
+
+
+def start_wal_checkpointer(engine: Engine, interval: Optional[int] = None) -> Optional[threading.Thread]:
+    """
+    Startet einen Daemon-Thread, der periodisch PRAGMA wal_checkpoint(PASSIVE)
+    ausfuehrt, damit die -wal-Datei nicht unbegrenzt waechst.
+    """
+    interval = app_settings.SQLITE_WAL_CHECKPOINT_SEC if interval is None else interval
+    if engine.dialect.name != "sqlite" or not interval:
+        return None
+
+    def _loop():
+        while True:
+            time.sleep(interval)
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("PRAGMA wal_checkpoint(PASSIVE)"))
+            except Exception:
+                pass
+
+    t = threading.Thread(target=_loop, name=f"wal-checkpoint-{engine.url.database}", daemon=True)
+    t.start()
+    return t
+
+
 def _build_engine():
     url = app_settings.DATABASE_URL
 
@@ -23,12 +70,12 @@ def _build_engine():
             db_file = Path.cwd() / db_file
         db_file.parent.mkdir(parents=True, exist_ok=True)
         abs_url = f"sqlite:///{db_file.as_posix()}"
-        return create_engine(
+        return apply_sqlite_profile(create_engine(
             abs_url,
             connect_args={"check_same_thread": False},  # nur für SQLite
             future=True,
             pool_pre_ping=True,
-        )
+        ))
 
     # Andere DBs (Postgres/MySQL)
     return create_engine(url, future=True, pool_pre_ping=True)
@@ -4,7 +4,7 @@ from datetime import datetime, date
 from typing import Optional
 
 from sqlalchemy import (
-    Column, Integer, String, Text, DateTime, Date, Numeric, ForeignKey, CheckConstraint, UniqueConstraint
+    Column, Integer, String, Text, DateTime, Date, Numeric, ForeignKey, CheckConstraint, UniqueConstraint, Index
 )
 from sqlalchemy.orm import relationship
 
@@ -43,7 +43,7 @@ class Service(Base):
     dauer_min = Column(Integer, nullable=False)
     basispreis = Column(Numeric(10, 2), nullable=False)
     kategorie = Column(String(100))
-    steuer_code = Column(String(50), nullable=False)  # z. B. "CH-7.7"
+    steuer_code = Column(String(50), nullable=False)  # z. B. "CH-8.1"
     materialkosten = Column(Numeric(10, 2))
     aktiv = Column(Integer, default=1)
 
@@ -60,6 +60,11 @@ class Produkt(Base):
 # ---------- Termine (optional) ----------
 class Termin(Base):
     __tablename__ = "termine"
+    __table_args__ = (
+        # Intervall-Abfragen (Tag/Woche): start_ts eingegrenzt, ende_ts aus dem Index geprueft
+        Index("ix_termine_start_ende", "start_ts", "ende_ts"),
+        Index("ix_termine_mitarbeiter_start_ende", "mitarbeiter_id", "start_ts", "ende_ts"),
+    )
     id = Column(Integer, primary_key=True)
     kunde_id = Column(Integer, ForeignKey("kunden.id", ondelete="CASCADE"), nullable=False)
     mitarbeiter_id = Column(Integer, ForeignKey("mitarbeiter.id", ondelete="SET NULL"))
@@ -169,3 +174,30 @@ class Audit(Base):
     ziel_id = Column(Integer)
     timestamp = Column(DateTime, default=datetime.utcnow)
     details_json = Column(Text)
+
+# ---------- Lager ----------
+class Lagerbewegung(Base):
+    __tablename__ = "lagerbewegungen"               # produkte.lagerbestand = laufender Saldo
+    id = Column(Integer, primary_key=True)
+    produkt_id = Column(Integer, ForeignKey("produkte.id", ondelete="CASCADE"), nullable=False, index=True)
+    beleg_id = Column(Integer, ForeignKey("belege.id", ondelete="SET NULL"), index=True)
+    menge = Column(Integer, nullable=False)          # +Zugang / -Abgang
+    bestand_nach = Column(Integer)                   # NULL = Produkt ohne Lagerfuehrung
+    grund = Column(String(20), nullable=False)       # verkauf|korrektur
+    timestamp = Column(DateTime, default=datetime.utcnow)
+
+# ---------- Belegnummern ----------
+class BelegnummerSequenz(Base):
+    __tablename__ = "belegnummer_sequenz"
+    name = Column(String(50), primary_key=True)      # z. B. "receipt"
+    prefix = Column(String(20), nullable=False, default="KS-")
+    next_number = Column(Integer, nullable=False)    # naechste freie Nummer
+
+class BelegnummerBlock(Base):
+    __tablename__ = "belegnummer_bloecke"            # Vergabeprotokoll (fuer Luecken-Audit)
+    id = Column(Integer, primary_key=True)
+    sequenz = Column(String(50), nullable=False)
+    kassen_id = Column(String(20), nullable=False)
+    von_nr = Column(Integer, nullable=False)
+    bis_nr = Column(Integer, nullable=False)         # inklusive
+    created_at = Column(DateTime, default=datetime.utcnow)
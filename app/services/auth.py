@@ -2,12 +2,21 @@
 import base64
 import hmac
 import os
+import threading
+import time
+from dataclasses import dataclass
 from hashlib import pbkdf2_hmac
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
+import anyio
+import anyio.to_thread
 from fastapi import Request
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
+from app.config import settings as app_settings
+from app.models.base import SessionLocal
+from app.services import shared_state
 from app.models.user import (
     User,
     ROLE_ADMIN,
@@ -43,6 +52,87 @@ def verify_password(plain: str, stored: str) -> bool:
     except Exception:
         return False
 
+# PBKDF2 blockiert ~0.3 s CPU; aus async-Handlern daher nur ueber den Hash-Pool
+# (hashlib gibt dabei den GIL frei, Threads reichen). Der Limiter begrenzt,
+# wie viele Logins gleichzeitig rechnen – der Rest wartet, der Server nicht.
+_hash_limiter: Optional[anyio.CapacityLimiter] = None
+
+def _limiter() -> anyio.CapacityLimiter:
+    global _hash_limiter
+    if _hash_limiter is None:
+        _hash_limiter = anyio.CapacityLimiter(app_settings.AUTH_HASH_WORKERS)
+    return _hash_limiter
+
+async def hash_password_async(plain: str, **kwargs) -> str:
+    return await anyio.to_thread.run_sync(lambda: hash_password(plain, **kwargs), limiter=_limiter())
+
+async def verify_password_async(plain: str, stored: str) -> bool:
+    return await anyio.to_thread.run_sync(verify_password, plain, stored, limiter=_limiter())
+
+# ---------- Benutzer-Cache ----------
+@dataclass(frozen=True)
+class AuthUser:
+    """Schreibgeschuetzte Sicht auf den angemeldeten Benutzer (sessionunabhaengig cachebar)."""
+    id: int
+    email: str
+    full_name: str
+    role: str
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "AuthUser":
+        return cls(id=user.id, email=user.email, full_name=user.full_name,
+                   role=user.role, is_active=bool(user.is_active))
+
+    def has_role(self, *roles: str) -> bool:
+        return self.role in roles
+
+_user_cache: Dict[int, Tuple[float, AuthUser]] = {}   # user_id -> (gueltig_bis, user)
+_user_cache_lock = threading.Lock()
+_user_cache_stamp: list = [None]                      # shared_state-Stand beim Befuellen
+USER_STATE_NAME = "auth_users"
+
+def invalidate_user(user_id: Optional[int] = None, *more: int) -> None:
+    """Entfernt einen (oder alle) Benutzer aus dem Cache – auch in anderen Worker-Prozessen."""
+    with _user_cache_lock:
+        if user_id is None:
+            _user_cache.clear()
+        else:
+            for uid in (user_id, *more):
+                _user_cache.pop(uid, None)
+    shared_state.bump(USER_STATE_NAME)
+
+# Aenderungen ueber das ORM: beim Flush merken, nach Commit invalidieren (wie
+# termine.py). Beim Flush waere zu frueh: ein paralleler Request liest noch den
+# alten, committeten Stand und cacht ihn bis zum Ablauf der TTL.
+# Nur Sessions aus app.models.base.SessionLocal (dort liegt users); andere
+# Sessions (z. B. main.py) zahlen nichts. Wer users anders aendert: invalidate_user().
+_USERS_CHANGED = "auth_users_geaendert"
+
+@event.listens_for(SessionLocal, "after_flush")
+def _users_flushed(session: Session, _ctx) -> None:
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            session.info.setdefault(_USERS_CHANGED, set()).add(obj.id)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _users_committed(session: Session) -> None:
+    changed = session.info.pop(_USERS_CHANGED, None)
+    if changed:
+        invalidate_user(*changed)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _users_rolled_back(session: Session) -> None:
+    session.info.pop(_USERS_CHANGED, None)
+
+def deactivate_user(db: Session, user_id: int) -> bool:
+    user = db.get(User, user_id)
+    if not user:
+        return False
+    user.is_active = False
+    db.commit()             # invalidiert den Cache (after_commit)
+    return True
+
 # ---------- Auth-Helpers ----------
 def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     user = db.query(User).filter(User.email == email, User.is_active == True).first()  # noqa: E712
@@ -60,11 +150,39 @@ def logout_user(request: Request) -> None:
     request.session.pop(SESSION_USER_ID, None)
     request.session.pop(SESSION_ROLE, None)
 
-def get_current_user(request: Request, db: Session) -> Optional[User]:
+def get_current_user(request: Request, db: Session) -> Optional[AuthUser]:
+    """
+    Angemeldeter Benutzer der Session als AuthUser (schreibgeschuetzt, nicht an
+    die Session gebunden; fuer Aenderungen den User per db.get() laden). Aktive
+    Benutzer werden bis zu AUTH_USER_CACHE_TTL Sekunden gecacht; Aenderungen am
+    User invalidieren sofort.
+    """
     uid = request.session.get(SESSION_USER_ID)
     if not uid:
         return None
-    return db.query(User).filter(User.id == uid, User.is_active == True).first()  # noqa: E712
+    ttl = app_settings.AUTH_USER_CACHE_TTL
+    now = time.monotonic()
+    stamp = shared_state.stamp(USER_STATE_NAME)
+    if stamp != _user_cache_stamp[0]:
+        # anderer Prozess hat Benutzer geaendert -> lokalen Cache verwerfen
+        with _user_cache_lock:
+            _user_cache.clear()
+            _user_cache_stamp[0] = stamp
+    if ttl:
+        with _user_cache_lock:
+            hit = _user_cache.get(uid)
+        if hit is not None and hit[0] > now:
+            return hit[1]
+    user = db.query(User).filter(User.id == uid, User.is_active == True).first()  # noqa: E712
+    if user is None:
+        with _user_cache_lock:
+            _user_cache.pop(uid, None)   # nur lokal, kein Stempel je unbekannter Session
+        return None
+    current = AuthUser.from_user(user)
+    if ttl:
+        with _user_cache_lock:
+            _user_cache[uid] = (now + ttl, current)
+    return current
 
 def is_admin_or_owner(request: Request) -> bool:
     return request.session.get(SESSION_ROLE) in {ROLE_ADMIN, ROLE_OWNER}
@@ -0,0 +1,135 @@
+# kassensystem_basic/app/services/catalog_index.py
+from __future__ import annotations
+
+import heapq
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# -----------------------------------------------------------------------------
+# Katalog-Index fuer die Kasse (Type-ahead + Scanner).
+# - Praefix-Tabelle: jedes Praefix (bis MAX_PREFIX Zeichen) jedes Namensworts
+#   -> Menge von Artikel-Schluesseln; eine Suche ist ein Dict-Zugriff je Wort
+#   plus Schnittmenge (ein flachgeklopfter Trie).
+# - Code-Tabelle: Barcode/SKU -> fertige Warenkorbzeile (ein Dict-Zugriff).
+# Eintraege werden einzeln ersetzt/entfernt (upsert/remove), ohne Neuaufbau.
+# Unabhaengig vom ORM: main.py liefert die Zeilen als dicts.
+# -----------------------------------------------------------------------------
+MAX_PREFIX = 12
+Key = Tuple[str, int]                     # ("service" | "produkt", id)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def fold(text: str) -> str:
+    """Kleinschreibung ohne Akzente/Umlaut-Punkte ("Shampoo Sensitiv Ölig" -> "shampoo sensitiv olig")."""
+    norm = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in norm if not unicodedata.combining(c)).casefold()
+
+
+def normalize_code(code: Optional[str]) -> Optional[str]:
+    """Barcode/SKU vergleichbar machen: Leerzeichen weg, Grossschrift; leer -> None."""
+    c = "".join((code or "").split()).upper()
+    return c or None
+
+
+def _words(name: str) -> List[str]:
+    return _WORD.findall(fold(name))
+
+
+class CatalogIndex:
+    """Suchindex ueber aktive Services/Produkte. Alle Methoden sind threadsicher."""
+
+    def __init__(self, items: Iterable[dict] = ()):
+        self._lock = threading.Lock()
+        self._items: Dict[Key, dict] = {}
+        self._words: Dict[Key, List[str]] = {}
+        self._names: Dict[Key, str] = {}          # gefalteter Name (Sortierung)
+        self._prefix: Dict[str, Set[Key]] = {}
+        self._codes: Dict[str, dict] = {}
+        for it in items:
+            self._add(it)
+
+    # -- Pflege -------------------------------------------------------------
+    @staticmethod
+    def line(it: dict) -> dict:
+        """Warenkorbzeile, wie sie die Kasse in den Warenkorb legt."""
+        return {"type": it["type"], "id": it["id"], "name": it["name"], "price": it["price"],
+                "tax_code": it["tax"], "grp": it["grp"], "qty": 1}
+
+    def _add(self, it: dict) -> None:
+        key = (it["type"], it["id"])
+        words = _words(it["name"])
+        self._items[key] = it
+        self._words[key] = words
+        self._names[key] = " ".join(words)
+        for w in words:
+            for n in range(1, min(len(w), MAX_PREFIX) + 1):
+                self._prefix.setdefault(w[:n], set()).add(key)
+        code = normalize_code(it.get("barcode"))
+        if code:
+            self._codes[code] = self.line(it)
+
+    def _drop(self, key: Key) -> None:
+        it = self._items.pop(key, None)
+        if it is None:
+            return
+        del self._names[key]
+        for w in self._words.pop(key, ()):
+            for n in range(1, min(len(w), MAX_PREFIX) + 1):
+                keys = self._prefix.get(w[:n])
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._prefix[w[:n]]
+        code = normalize_code(it.get("barcode"))
+        if code and self._codes.get(code, {}).get("id") == it["id"] \
+                and self._codes[code]["type"] == it["type"]:
+            del self._codes[code]
+
+    def upsert(self, it: dict) -> None:
+        """Artikel neu/geaendert; inaktive Artikel werden entfernt."""
+        with self._lock:
+            self._drop((it["type"], it["id"]))
+            if it.get("aktiv", True):
+                self._add(it)
+
+    def remove(self, typ: str, item_id: int) -> None:
+        with self._lock:
+            self._drop((typ, item_id))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    # -- Abfragen -----------------------------------------------------------
+    def by_code(self, code: str) -> Optional[dict]:
+        """Scanner: Barcode/SKU -> Warenkorbzeile (Kopie) oder None."""
+        line = self._codes.get(normalize_code(code) or "")
+        return dict(line) if line is not None else None
+
+    def search(self, q: str, limit: int = 20) -> List[dict]:
+        """
+        Alle Woerter der Eingabe muessen Praefix eines Namensworts sein.
+        Reihenfolge: Name beginnt mit der Eingabe, dann erstes Wort passt, dann alphabetisch.
+        """
+        words = _words(q)
+        if not words:
+            return []
+        with self._lock:
+            sets = []
+            for w in words:
+                keys = self._prefix.get(w[:MAX_PREFIX])
+                if not keys:
+                    return []
+                sets.append(keys)
+            sets.sort(key=len)
+            hits = set(sets[0]).intersection(*sets[1:])
+            if any(len(w) > MAX_PREFIX for w in words):     # lange Woerter exakt nachpruefen
+                long = [w for w in words if len(w) > MAX_PREFIX]
+                hits = {k for k in hits if all(any(x.startswith(w) for x in self._words[k]) for w in long)}
+            phrase, names = " ".join(words), self._names
+            top = heapq.nsmallest(limit, hits, key=lambda k: (
+                not names[k].startswith(phrase), not names[k].startswith(words[0]), names[k], k))
+            items = [self._items[k] for k in top]
+        return [self.line(it) | {"barcode": it.get("barcode")} for it in items]
@@ -3,22 +3,20 @@ from __future__ import annotations
 from dataclasses import dataclass
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
-from typing import Any, Dict, List, Tuple, Optional
+from typing import Any, Dict, List, Optional
 import json
 import uuid
 
+from sqlalchemy import bindparam, insert, inspect as sa_inspect, or_, select, update
 from sqlalchemy.orm import Session
 
 # Modelle
-from app.models.entities import Service, Produkt
+from app.models.entities import Beleg, BelegPosition, Lagerbewegung, Produkt, Service, Zahlung
+from app.services.money import allocate, fmt_chf, line_total, percent_of, split_gross, to_decimal, to_rappen
+from app.services.tax_rates import DEFAULT_CODE, TaxRates, load_tax_rates
 
 # --- Hilfen -------------------------------------------------------------
 
-TAX = {
-    "CH-7.7": Decimal("0.077"),
-    "CH-2.6": Decimal("0.026"),
-    "CH-0":   Decimal("0.0"),
-}
 
 @dataclass
 class CartItem:
@@ -40,40 +38,129 @@ def _D(val: Any, default: str = "0") -> Decimal:
     except Exception:
         raise InvalidOperation(s)
 
-def _get_receipt_number(db: Session) -> str:
+def _get_receipt_number(db: Session, kassen_id: str = "K1") -> str:
     """
-    Versuche, die bestehende Nummernlogik zu verwenden – fallbacksicher.
+    Belegnummer aus der Sequenz (atomar, je Kasse ggf. blockweise reserviert) – fallbacksicher.
     """
     try:
-        from app.services import receipt_numbers as rn
-        for fn in ("get_next_receipt_number", "next_number", "next_receipt_number", "generate_receipt_number"):
-            if hasattr(rn, fn):
-                return str(getattr(rn, fn)(db))
+        from app.services.receipt_numbers import next_receipt_number
+        return next_receipt_number(db, kassen_id)
     except Exception:
         pass
     # Fallback: Timestamp + Kurz-UUID
     return f"R{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6].upper()}"
 
-def _set_if(obj: Any, field: str, value: Any):
-    if hasattr(obj, field):
-        setattr(obj, field, value)
+def _columns(model) -> set:
+    return set(sa_inspect(model).column_attrs.keys())
 
-def _compute_totals(items: List[CartItem], disc_abs: Decimal, disc_pct: Decimal, tip: Decimal) -> Tuple[Decimal, Decimal, Decimal, Dict[str, Decimal]]:
+def _field_map(model, **candidates) -> Dict[str, str]:
     """
-    Annahme: Preise sind Bruttopreise (üblich an der Kasse).
-    Gibt zurück: (subtotal, discount_total, total, tax_breakdown)
+    Ordnet logische Felder einmalig den vorhandenen Spalten zu
+    (erster Kandidat, den das Modell kennt); fehlende Felder entfallen.
     """
-    subtotal = sum((it.price * it.qty for it in items), start=Decimal("0"))
-    pct_amt = (subtotal * disc_pct / Decimal("100")).quantize(Decimal("0.01"))
-    discount = min(subtotal, (disc_abs + pct_amt))
-    tax_breakdown: Dict[str, Decimal] = {}
-    for it in items:
-        rate = TAX.get(it.tax_code, Decimal("0"))
-        line = it.price * it.qty
-        tax_part = (line * rate / (Decimal("1") + rate)).quantize(Decimal("0.01"))
-        tax_breakdown[it.tax_code] = tax_breakdown.get(it.tax_code, Decimal("0")) + tax_part
-    total = max(Decimal("0"), subtotal - discount) + tip
-    return (subtotal, discount, total, tax_breakdown)
+    cols = _columns(model)
+    out: Dict[str, str] = {}
+    for key, names in candidates.items():
+        for name in (names if isinstance(names, tuple) else (names,)):
+            if name in cols:
+                out[key] = name
+                break
+    return out
+
+# Feldzuordnung zum Beleg-Schema – beim Import aufgeloest, nicht pro Zeile
+BELEG_FIELDS = _field_map(
+    Beleg,
+    nummer=("belegnr", "nummer"),
+    datum=("timestamp", "datum", "created_at"),
+    brutto=("summe_brutto", "brutto"),
+    netto="netto",
+    steuer="steuer_summe",
+    steuer_json="steuer_json",
+    rabatt="rabatt_betrag",
+    rabatt_prozent="rabatt_prozent",
+    trinkgeld="trinkgeld",
+    user_id="user_id",
+    rolle="rolle",
+)
+POSITION_FIELDS = _field_map(
+    BelegPosition,
+    beleg_id="beleg_id",
+    typ="typ",
+    ref_id="ref_id",
+    produkt_id="produkt_id",
+    service_id="service_id",
+    name="name",
+    menge="menge",
+    preis=("einzelpreis", "preis", "betrag"),
+    steuer_code="steuer_code",
+    steuer_betrag="steuer_betrag",
+    brutto=("gesamtpreis", "brutto"),
+)
+ZAHLUNG_FIELDS = _field_map(
+    Zahlung,
+    beleg_id="beleg_id",
+    methode=("art", "methode"),
+    betrag=("betrag", "amount", "wert"),
+)
+
+def _row(fields: Dict[str, str], **values: Any) -> Dict[str, Any]:
+    return {fields[k]: v for k, v in values.items() if k in fields}
+
+@dataclass
+class Totals:
+    """Summen eines Warenkorbs in Rappen (app.services.money)."""
+    lines: List[int]            # Brutto je Position, vor Rabatt
+    line_tax: List[int]         # Steueranteil je Position, nach Rabatt
+    subtotal: int
+    discount: int
+    tip: int
+    total: int
+    tax_breakdown: Dict[str, int]
+
+def _compute_totals(items: List[CartItem], disc_abs: Decimal, disc_pct: Decimal, tip: Decimal,
+                    rates: TaxRates) -> Totals:
+    """
+    Annahme: Preise sind Bruttopreise (üblich an der Kasse). Gerechnet wird wie in
+    pricing.summarize_cart: Zeilensumme einmal gerundet, Rabatt proportional auf die
+    Positionen verteilt, Steuer aus dem rabattierten Brutto herausgerechnet.
+    """
+    lines = [line_total(it.price, it.qty) for it in items]
+    subtotal = sum(lines)
+    discount = max(0, min(subtotal, to_rappen(disc_abs) + percent_of(subtotal, disc_pct)))
+    line_tax: List[int] = []
+    tax_breakdown: Dict[str, int] = {}
+    for it, gross, part in zip(items, lines, allocate(discount, lines)):
+        _net, tax = split_gross(gross - part, rates.rate(it.tax_code))
+        line_tax.append(tax)
+        tax_breakdown[it.tax_code] = tax_breakdown.get(it.tax_code, 0) + tax
+    tip_rp = to_rappen(tip)
+    return Totals(lines, line_tax, subtotal, discount, tip_rp, subtotal - discount + tip_rp, tax_breakdown)
+
+def _load_catalog(db: Session, parsed: list) -> Dict[str, Dict[int, Any]]:
+    """Services/Produkte des Warenkorbs mit je einer IN-Abfrage."""
+    ids: Dict[str, set] = {"service": set(), "produkt": set()}
+    for kind, ref_id, *_ in parsed:
+        if ref_id:
+            ids["service" if kind == "service" else "produkt"].add(ref_id)
+    out: Dict[str, Dict[int, Any]] = {"service": {}, "produkt": {}}
+    for kind, model in (("service", Service), ("produkt", Produkt)):
+        if ids[kind]:
+            out[kind] = {o.id: o for o in db.scalars(select(model).where(model.id.in_(ids[kind])))}
+    return out
+
+class OutOfStock(ValueError):
+    """Produkt nicht in ausreichender Menge an Lager."""
+
+# Bedingter Abzug: greift nur, wenn genug Bestand da ist (atomar in der DB).
+# lagerbestand NULL = Produkt ohne Lagerfuehrung, bleibt NULL.
+_stock = Produkt.__table__.c
+_STOCK_TAKE = (
+    update(Produkt.__table__)
+    .where(_stock.id == bindparam("pid"),
+           or_(_stock.lagerbestand.is_(None), _stock.lagerbestand >= bindparam("qty")))
+    .values(lagerbestand=_stock.lagerbestand - bindparam("qty"))
+    .returning(_stock.lagerbestand)
+)
 
 # --- Hauptfunktion ------------------------------------------------------
 
@@ -86,15 +173,15 @@ def process_checkout(db: Session, payload: Dict[str, Any], current_user: Any) ->
     if not isinstance(items_raw, list) or len(items_raw) == 0:
         raise ValueError("Leerer Warenkorb.")
 
-    items: List[CartItem] = []
-    # Validierung & Aufbereitung
+    # Vorpruefung ohne DB, IDs je Typ sammeln
+    parsed = []
     for row in items_raw:
         rid_raw = str(row.get("id", ""))
         kind = row.get("type") or ("service" if rid_raw.startswith("s-") else "produkt")
         name = (row.get("name") or "").strip()
         price = _D(row.get("price"))
         qty = int(row.get("qty") or 1)
-        tax_code = (row.get("tax") or "CH-7.7").strip() or "CH-7.7"
+        tax_code = (row.get("tax") or DEFAULT_CODE).strip() or DEFAULT_CODE
 
         if not name or price <= 0 or qty <= 0:
             raise ValueError("Ungültige Position.")
@@ -105,118 +192,96 @@ def process_checkout(db: Session, payload: Dict[str, Any], current_user: Any) ->
                 ref_id = int(rid_raw.split("-", 1)[1])
             except Exception:
                 ref_id = None
+        parsed.append((kind, ref_id, name, price, qty, tax_code))
 
-        # Existenz prüfen (falls ID vorhanden)
-        if ref_id:
-            if kind == "service":
-                obj = db.get(Service, ref_id)
-                if not obj or (hasattr(obj, "aktiv") and not obj.aktiv):
-                    raise ValueError("Service nicht (mehr) verfügbar.")
-                # Absicherung konsistenter Werte
-                if hasattr(obj, "steuer_code"):
-                    tax_code = obj.steuer_code
-            else:
-                obj = db.get(Produkt, ref_id)
-                if not obj or (hasattr(obj, "aktiv") and not obj.aktiv):
-                    raise ValueError("Produkt nicht (mehr) verfügbar.")
-                if hasattr(obj, "steuer_code"):
-                    tax_code = obj.steuer_code
+    # Katalog einmal laden (eine IN-Abfrage je Typ)
+    catalog = _load_catalog(db, parsed)
 
+    items: List[CartItem] = []
+    for kind, ref_id, name, price, qty, tax_code in parsed:
+        if ref_id:
+            obj = catalog["service" if kind == "service" else "produkt"].get(ref_id)
+            if not obj or not obj.aktiv:
+                raise ValueError("Service nicht (mehr) verfügbar." if kind == "service"
+                                 else "Produkt nicht (mehr) verfügbar.")
+            tax_code = obj.steuer_code or tax_code  # Absicherung konsistenter Werte
         items.append(CartItem(kind=kind, ref_id=ref_id, name=name, price=price, qty=qty, tax_code=tax_code))
 
     disc_abs = _D(payload.get("discount_abs"))
     disc_pct = _D(payload.get("discount_pct"))
     tip      = _D(payload.get("tip"))
 
-    subtotal, discount, total, tax_breakdown = _compute_totals(items, disc_abs, disc_pct, tip)
+    rates = load_tax_rates(db)
+    totals = _compute_totals(items, disc_abs, disc_pct, tip, rates)
 
-    # --- Persistenz versuchen ------------------------------------------
-    receipt_number = _get_receipt_number(db)
+    # --- Persistenz: eine Transaktion, Sammel-INSERTs ------------------
+    receipt_number = _get_receipt_number(db, str(payload.get("kassen_id") or "K1"))
     created_id: Optional[int] = None
+    now = datetime.now()
+    steuer = sum(totals.line_tax)
 
     try:
-        # Belegmodell dynamisch holen
-        from app.models.entities import Beleg, BelegPosition, Zahlung  # type: ignore
-
-        receipt = Beleg()  # type: ignore
-        _set_if(receipt, "nummer", receipt_number)
-        _set_if(receipt, "datum", datetime.now())
-        _set_if(receipt, "created_at", datetime.now())
-        _set_if(receipt, "brutto", (subtotal - discount + tip))
-        _set_if(receipt, "netto", (subtotal - sum(tax_breakdown.values()) - discount))
-        _set_if(receipt, "rabatt_betrag", discount)
-        _set_if(receipt, "rabatt_prozent", disc_pct)
-        _set_if(receipt, "trinkgeld", tip)
-        _set_if(receipt, "steuer_json", json.dumps({k: str(v) for k, v in tax_breakdown.items()}))
-        _set_if(receipt, "user_id", getattr(current_user, "id", None))
-        _set_if(receipt, "rolle", getattr(current_user, "role", None))
-
-        db.add(receipt)
-        db.flush()  # ID verfügbar
-        created_id = getattr(receipt, "id", None)
-
-        # Positionen
+        res = db.execute(insert(Beleg).values(**_row(
+            BELEG_FIELDS,
+            nummer=receipt_number,
+            datum=now,
+            brutto=to_decimal(totals.total),
+            netto=to_decimal(totals.subtotal - totals.discount - steuer),
+            steuer=to_decimal(steuer),
+            steuer_json=json.dumps({k: fmt_chf(v) for k, v in totals.tax_breakdown.items()}),
+            rabatt=to_decimal(totals.discount),
+            rabatt_prozent=disc_pct,
+            trinkgeld=to_decimal(totals.tip),
+            user_id=getattr(current_user, "id", None),
+            rolle=getattr(current_user, "role", None),
+        )))
+        created_id = res.inserted_primary_key[0]
+
+        db.execute(insert(BelegPosition), [_row(
+            POSITION_FIELDS,
+            beleg_id=created_id,
+            typ=it.kind,
+            ref_id=it.ref_id or 0,               # 0 = freie Position ohne Katalogbezug
+            produkt_id=it.ref_id if it.kind == "produkt" else None,
+            service_id=it.ref_id if it.kind == "service" else None,
+            name=it.name,
+            menge=it.qty,
+            preis=it.price,
+            steuer_code=it.tax_code,
+            steuer_betrag=to_decimal(tax),
+            brutto=to_decimal(gross),
+        ) for it, gross, tax in zip(items, totals.lines, totals.line_tax)])
+
+        payments = [_row(
+            ZAHLUNG_FIELDS,
+            beleg_id=created_id,
+            methode=(pay.get("method") or "BAR").lower(),
+            betrag=to_decimal(to_rappen(_D(pay.get("amount")))),
+        ) for pay in payload.get("payment") or []]
+        if payments:
+            db.execute(insert(Zahlung), payments)
+
+        # Lagerabzug: Mengen je Produkt summieren, je Produkt ein bedingtes UPDATE,
+        # Bewegungen als Sammel-INSERT; reicht der Bestand nicht, wird alles verworfen
+        need: Dict[int, int] = {}
         for it in items:
-            pos = BelegPosition()  # type: ignore
-            # Beziehung / FK
-            if hasattr(pos, "beleg"):
-                setattr(pos, "beleg", receipt)
-            elif hasattr(pos, "beleg_id") and created_id is not None:
-                setattr(pos, "beleg_id", created_id)
-
-            # Referenzen
-            if it.kind == "produkt":
-                if hasattr(pos, "produkt_id"): _set_if(pos, "produkt_id", it.ref_id)
-                _set_if(pos, "typ", "produkt")
-            else:
-                if hasattr(pos, "service_id"): _set_if(pos, "service_id", it.ref_id)
-                _set_if(pos, "typ", "service")
-
-            # Werte
-            _set_if(pos, "name", it.name)
-            _set_if(pos, "menge", it.qty)
-            for field in ("einzelpreis", "preis", "betrag"):
-                if hasattr(pos, field):
-                    setattr(pos, field, it.price)
-                    break
-            _set_if(pos, "steuer_code", it.tax_code)
-            # optional: brutto
-            if hasattr(pos, "brutto"):
-                setattr(pos, "brutto", (it.price * it.qty))
-
-            db.add(pos)
-
-            # Lagerabzug bei Produkt
             if it.kind == "produkt" and it.ref_id:
-                p = db.get(Produkt, it.ref_id)
-                if p is not None and hasattr(p, "lagerbestand"):
-                    try:
-                        new_val = (p.lagerbestand or 0) - it.qty  # type: ignore
-                        if new_val < 0:
-                            new_val = 0
-                        p.lagerbestand = new_val  # type: ignore
-                        db.add(p)
-                    except Exception:
-                        pass
-
-        # Zahlungen
-        for pay in payload.get("payment") or []:
-            m = (pay.get("method") or "BAR").upper()
-            amt = _D(pay.get("amount"))
-            z = Zahlung()  # type: ignore
-            if hasattr(z, "beleg"):
-                setattr(z, "beleg", receipt)
-            elif hasattr(z, "beleg_id") and created_id is not None:
-                setattr(z, "beleg_id", created_id)
-            _set_if(z, "methode", m)
-            for field in ("betrag", "amount", "wert"):
-                if hasattr(z, field):
-                    setattr(z, field, amt)
-                    break
-            db.add(z)
+                need[it.ref_id] = need.get(it.ref_id, 0) + it.qty
+        moves = []
+        for pid, qty in need.items():
+            row = db.execute(_STOCK_TAKE, {"pid": pid, "qty": qty}).first()
+            if row is None:
+                raise OutOfStock(f"Produkt '{catalog['produkt'][pid].name}' nicht genügend an Lager.")
+            moves.append({"produkt_id": pid, "beleg_id": created_id, "menge": -qty,
+                          "bestand_nach": row[0], "grund": "verkauf"})
+        if moves:
+            db.execute(insert(Lagerbewegung), moves)
 
         db.commit()
 
+    except OutOfStock:
+        db.rollback()
+        raise
     except Exception:
         # Sicherheitshalber nichts halbgares hinterlassen
         db.rollback()
@@ -227,9 +292,9 @@ def process_checkout(db: Session, payload: Dict[str, Any], current_user: Any) ->
         "ok": True,
         "receipt_number": receipt_number,
         "receipt_id": created_id,
-        "subtotal": str(subtotal),
-        "discount": str(discount),
-        "tip": str(tip),
-        "total": str(total),
-        "tax_breakdown": {k: str(v) for k, v in tax_breakdown.items()},
+        "subtotal": fmt_chf(totals.subtotal),
+        "discount": fmt_chf(totals.discount),
+        "tip": fmt_chf(totals.tip),
+        "total": fmt_chf(totals.total),
+        "tax_breakdown": {k: fmt_chf(v) for k, v in totals.tax_breakdown.items()},
     }
@@ -2,8 +2,12 @@
 from __future__ import annotations
 
 import json
+import os
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 from app.config import settings as app_settings
 
@@ -39,9 +43,13 @@ def load_config() -> dict:
 
 
 def save_config(cfg: dict) -> None:
+    """Schreibt atomar (tmp + replace) und uebernimmt die Aenderung sofort in den Snapshot."""
     path = Path(app_settings.DEV_CONFIG_PATH)
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(cfg, indent=2), encoding="utf-8")
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(cfg, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+    current_config(force=True)
 
 
 def sanitize_config(cfg: dict) -> dict:
@@ -62,26 +70,121 @@ def sanitize_config(cfg: dict) -> dict:
     return {"header_visibility": clean_hv, "dashboard_flags": clean_df}
 
 
+# -----------------------------------------------------------------------------
+# Snapshot im Speicher: bereinigte Config plus daraus abgeleitete Navigation und
+# Flags je DEV-Flag. Die Datei wird nur neu gelesen, wenn sich mtime/Groesse
+# aendern (geprueft beim Lesen, hoechstens alle DEV_CONFIG_POLL_SEC); bei
+# inhaltlicher Aenderung werden die Abonnenten (subscribe) benachrichtigt.
+# Kein eigener Thread: die Pruefung laeuft mit dem naechsten Seitenaufruf.
+# -----------------------------------------------------------------------------
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    config: dict                        # sanitize_config(...) – nicht veraendern
+    nav: Dict[bool, List[dict]]         # dev -> sichtbare Navigationspunkte
+    flags: Dict[bool, Dict[str, int]]   # dev -> Dashboard-Flags
+    version: int
+
+
+_lock = threading.Lock()
+_snapshot: Optional[ConfigSnapshot] = None
+_file_key: Optional[Tuple[int, int]] = None
+_checked_at = 0.0
+_subscribers: List[Callable[[ConfigSnapshot], None]] = []
+
+
+def _stat_key(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def _read_file(path: Path) -> Optional[dict]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else None
+    except Exception:
+        return None
+
+
+def _build(cfg: dict, version: int) -> ConfigSnapshot:
+    clean = sanitize_config(cfg)
+    vis = clean["header_visibility"]
+    dev_flags = dict(app_settings.get_dash_flags(True))
+    dev_flags.update(clean["dashboard_flags"])
+    return ConfigSnapshot(
+        config=clean,
+        nav={
+            False: app_settings.get_nav_items(False),
+            True: [it for it in app_settings.get_nav_items(True) if int(vis.get(it["href"], 1)) == 1],
+        },
+        flags={
+            False: app_settings.get_dash_flags(False),
+            True: {k: int(v) for k, v in dev_flags.items()},
+        },
+        version=version,
+    )
+
+
+def current_config(force: bool = False) -> ConfigSnapshot:
+    """Aktueller Snapshot; liest die Datei nur nach einer Aenderung neu."""
+    global _snapshot, _file_key, _checked_at
+    now = time.monotonic()
+    snap = _snapshot
+    if snap is not None and not force and now - _checked_at < app_settings.DEV_CONFIG_POLL_SEC:
+        return snap
+
+    changed = None
+    with _lock:
+        _checked_at = now
+        path = Path(app_settings.DEV_CONFIG_PATH)
+        key = _stat_key(path)
+        if _snapshot is None or force or key != _file_key:
+            old = _snapshot
+            cfg = _read_file(path) if key is not None else None
+            if cfg is None:
+                # fehlt/defekt (evtl. halb geschrieben): alten Stand behalten,
+                # nur beim ersten Laden Default anlegen wie bisher
+                cfg = old.config if old is not None else load_config()
+                key = _stat_key(path) if old is None else key
+            if old is None or sanitize_config(cfg) != old.config:
+                _snapshot = _build(cfg, old.version + 1 if old else 1)
+                changed = _snapshot if old is not None else None
+            _file_key = key
+        snap = _snapshot
+
+    if changed is not None:
+        for fn in list(_subscribers):
+            try:
+                fn(changed)
+            except Exception:
+                pass
+    return snap
+
+
+def subscribe(fn: Callable[[ConfigSnapshot], None]) -> Callable[[], None]:
+    """Registriert fn(snapshot) fuer Config-Aenderungen; liefert eine Abmelde-Funktion."""
+    with _lock:
+        _subscribers.append(fn)
+
+    def _unsubscribe() -> None:
+        with _lock:
+            if fn in _subscribers:
+                _subscribers.remove(fn)
+    return _unsubscribe
+
+
 def effective_nav_items(dev: bool) -> List[dict]:
     """
     Liefert die Navigationspunkte unter Beruecksichtigung der DEV-Config (nur in DEV).
+    Vorberechnet im Snapshot; die Eintraege selbst nicht veraendern.
     """
-    items = app_settings.get_nav_items(dev)
-    if not dev:
-        return items
-    cfg = sanitize_config(load_config())
-    vis = cfg["header_visibility"]
-    return [it for it in items if int(vis.get(it["href"], 1)) == 1]
+    return list(current_config().nav[bool(dev)])
 
 
 def effective_dash_flags(dev: bool) -> Dict[str, int]:
     """
     Liefert die Dashboard-Flags unter Beruecksichtigung der DEV-Config (nur in DEV).
     """
-    base = app_settings.get_dash_flags(dev)
-    if not dev:
-        return base
-    cfg = sanitize_config(load_config())
-    out = dict(base)
-    out.update(cfg["dashboard_flags"])
-    return {k: int(v) for k, v in out.items()}
+    return dict(current_config().flags[bool(dev)])
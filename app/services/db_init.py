@@ -9,6 +9,7 @@ from app.models.base import Base, engine, SessionLocal
 import app.models.entities  # noqa: F401
 import app.models.user  # noqa: F401
 from app.services.auth import seed_users_if_empty
+from app.services.kunden_suche import ensure_kunden_fts
 
 
 def _ensure_sqlite_parent_dir() -> None:
@@ -28,6 +29,7 @@ def init_db(dev_seed: bool = True) -> None:
     """
     _ensure_sqlite_parent_dir()
     Base.metadata.create_all(bind=engine)
+    ensure_kunden_fts(engine)
 
     if dev_seed:
         with SessionLocal() as db:
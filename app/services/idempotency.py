@@ -0,0 +1,89 @@
+# kassensystem_basic/app/services/idempotency.py
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+# -----------------------------------------------------------------------------
+# Idempotente POST-Anfragen (Checkout-Wiederholungen nach Timeout/Doppelklick).
+# Der Client schickt je Vorgang einen Schluessel (Header Idempotency-Key). Pro
+# Prozess:
+# - ReplayCache.exclusive(key): gleichzeitige Anfragen mit demselben Schluessel
+#   laufen nacheinander; die Nachzuegler finden danach die gespeicherte Antwort
+#   (eine Ausfuehrung, alle bekommen dasselbe Ergebnis).
+# - ReplayCache.get/put: LRU der letzten Antworten mit TTL.
+# Massgeblich ueber Prozesse/Neustarts hinweg ist die Tabelle des Aufrufers
+# (main.py: checkout_keys, in derselben Transaktion wie der Verkauf).
+# -----------------------------------------------------------------------------
+HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+
+_KEY = re.compile(r"^[A-Za-z0-9._:\-]{8,64}$")
+
+Entry = Tuple[str, bytes]                 # (digest der Anfrage, Antwort-Body)
+
+
+def valid_key(key: str) -> bool:
+    """8-64 Zeichen aus [A-Za-z0-9._:-] (z. B. UUID)."""
+    return isinstance(key, str) and bool(_KEY.match(key))
+
+
+def request_digest(*parts) -> str:
+    """Fingerabdruck des Anfrage-Inhalts (gleicher Schluessel + anderer Inhalt = Fehler)."""
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ReplayCache:
+    """Begrenzter Antwort-Cache (LRU + TTL) plus Koaleszieren laufender Anfragen je Schluessel."""
+
+    def __init__(self, size: int = 1024, ttl: float = 24 * 3600.0):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Entry]]" = OrderedDict()
+        self._inflight: Dict[str, List] = {}   # key -> [asyncio.Lock, Wartende]; nur im Event-Loop
+
+    def get(self, key: str) -> Optional[Entry]:
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None:
+                return None
+            if now - hit[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return hit[1]
+
+    def put(self, key: str, digest: str, body: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), (digest, body))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @asynccontextmanager
+    async def exclusive(self, key: str) -> AsyncIterator[None]:
+        """Haelt den Schluessel fuer die Dauer einer Ausfuehrung (Duplikate warten davor)."""
+        entry = self._inflight.get(key)
+        if entry is None:
+            entry = self._inflight[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._inflight[key]
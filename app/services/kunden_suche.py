@@ -0,0 +1,203 @@
+# kassensystem_basic/app/services/kunden_suche.py
+from __future__ import annotations
+
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import inspect as sa_inspect, or_, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.models.entities import Kunde
+
+# -----------------------------------------------------------------------------
+# Kundensuche (Type-ahead an der Kasse) ueber einen SQLite-FTS5-Index.
+# kunden_fts ist eine External-Content-Tabelle auf der View kunden_fts_src,
+# die Telefonnummern normalisiert (nur Ziffern, +41/0041 -> 0, zusaetzlich ohne
+# fuehrende 0). Trigger auf kunden halten den Index synchron – auch bei Schreib-
+# zugriffen ausserhalb der App. Ohne FTS5 (oder andere DB) faellt die Suche auf
+# LIKE zurueck; fehlte kunden beim Start noch, legt die erste Suche den Index an.
+# -----------------------------------------------------------------------------
+FTS_TABLE = "kunden_fts"
+SOURCE_VIEW = "kunden_fts_src"
+# Gewichte je Spalte fuer bm25: name, telefon, email, bemerkungen
+RANK = "bm25(10.0, 6.0, 3.0, 1.0)"
+MAX_LIMIT = 50
+# Gerankt werden hoechstens die neuesten RANK_WINDOW Treffer. Bei weniger Treffern
+# ist das Ergebnis exakt; bei mehr ist die Eingabe fuer Type-ahead ohnehin zu
+# unspezifisch und bm25 ueber alle Treffer wuerde die Antwortzeit bestimmen.
+RANK_WINDOW = 1000
+MIN_TOKEN = 2            # Einzelbuchstaben ignorieren (Praefix-Index ab 2 Zeichen)
+FTS_RETRY_SEC = 60.0     # ohne Index: hoechstens so oft erneut anlegen versuchen (je DB)
+
+_PHONE_CHARS = " -/().+'"
+_PHONE_LIKE = re.compile(r"^[\d\s\-/().+']+$")
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def _phone_sql(expr: str) -> str:
+    """SQL-Ausdruck: Telefonnummer -> "0791234567 791234567" (erster Teil = normalize_phone)."""
+    d = f"coalesce({expr}, '')"
+    for ch in _PHONE_CHARS:
+        d = f"replace({d}, '{ch * 2 if ch == chr(39) else ch}', '')"
+    nat = (f"(CASE WHEN {d} LIKE '0041%' THEN '0' || substr({d}, 5)"
+           f" WHEN ltrim(coalesce({expr}, ''), ' ') LIKE '+41%'"
+           f" OR ({d} LIKE '41%' AND length({d}) = 11) THEN '0' || substr({d}, 3)"
+           f" ELSE {d} END)")
+    return f"({nat} || CASE WHEN {nat} LIKE '0%' THEN ' ' || substr({nat}, 2) ELSE '' END)"
+
+
+def normalize_phone(value: str) -> str:
+    """
+    Eingabe -> nationale Form (+41 79 / 0041 79 / 4179xxxxxxx -> 079), Regeln
+    wie _phone_sql: Trennzeichen aus _PHONE_CHARS entfernen, Vorwahl ersetzen.
+    """
+    raw = value or ""
+    digits = raw
+    for ch in _PHONE_CHARS:
+        digits = digits.replace(ch, "")
+    if digits.startswith("0041"):
+        return "0" + digits[4:]
+    if raw.lstrip(" ").startswith("+41") or (digits.startswith("41") and len(digits) == 11):
+        return "0" + digits[2:]
+    return digits
+
+
+def _ddl() -> List[str]:
+    cols = "name, telefon, email, bemerkungen"
+    new_vals = f"new.id, new.name, {_phone_sql('new.telefon')}, new.email, new.bemerkungen"
+    old_vals = f"old.id, old.name, {_phone_sql('old.telefon')}, old.email, old.bemerkungen"
+    return [
+        f"CREATE VIEW IF NOT EXISTS {SOURCE_VIEW} AS SELECT id, name, "
+        f"{_phone_sql('telefon')} AS telefon, email, bemerkungen FROM kunden",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({cols}, "
+        f"content='{SOURCE_VIEW}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS kunden_fts_ai AFTER INSERT ON kunden BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES ({new_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS kunden_fts_ad AFTER DELETE ON kunden BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', {old_vals}); END",
+        # punkte/kundenstatus aendern sich an der Kasse oft -> nur Suchspalten
+        f"CREATE TRIGGER IF NOT EXISTS kunden_fts_au AFTER UPDATE OF id, {cols} ON kunden BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', {old_vals}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES ({new_vals}); END",
+    ]
+
+
+def ensure_kunden_fts(engine: Engine) -> bool:
+    """
+    Legt Index, View und Trigger an (idempotent) und baut den Index beim ersten
+    Mal aus den bestehenden Kunden auf. Eine View aus einer aelteren Version
+    (andere Telefon-Normalisierung) wird samt Triggern ersetzt und der Index neu
+    aufgebaut. False, wenn kunden fehlt oder FTS5 nicht verfuegbar ist.
+    """
+    if engine.dialect.name != "sqlite" or not sa_inspect(engine).has_table(Kunde.__tablename__):
+        return False
+    ddl = _ddl()
+    try:
+        with engine.begin() as conn:
+            created = not sa_inspect(conn).has_table(FTS_TABLE)
+            view_sql = conn.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'view' AND name = ?", (SOURCE_VIEW,)).scalar()
+            outdated = view_sql is not None and view_sql != ddl[0].replace(" IF NOT EXISTS", "")
+            if outdated:
+                conn.exec_driver_sql(f"DROP VIEW {SOURCE_VIEW}")
+                for trigger in ("kunden_fts_ai", "kunden_fts_ad", "kunden_fts_au"):
+                    conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+            for stmt in ddl:
+                conn.exec_driver_sql(stmt)
+            if created or outdated:
+                rebuild_kunden_fts(conn)
+            if created:
+                conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', '{RANK}')")
+        return True
+    except OperationalError:
+        return False  # SQLite ohne FTS5
+
+
+_retry_lock = threading.Lock()
+_next_retry: Dict[str, float] = {}
+
+
+def _retry_fts(db: Session) -> bool:
+    """
+    Index nachtraeglich anlegen, wenn die Suche ihn nicht findet (z. B. kunden
+    beim Start von main noch nicht vorhanden). Hoechstens alle FTS_RETRY_SEC je DB.
+    """
+    bind = db.get_bind()
+    engine = getattr(bind, "engine", bind)
+    key, now = str(engine.url), time.monotonic()
+    with _retry_lock:
+        if _next_retry.get(key, 0.0) > now:
+            return False
+        _next_retry[key] = now + FTS_RETRY_SEC
+    return ensure_kunden_fts(engine)
+
+
+def rebuild_kunden_fts(conn: Connection) -> None:
+    """Index komplett neu aus kunden aufbauen (z. B. nach Import mit deaktivierten Triggern)."""
+    conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def match_query(q: str) -> Optional[str]:
+    """
+    Sucheingabe -> FTS5-MATCH-Ausdruck (alle Woerter ab MIN_TOKEN Zeichen als
+    Praefix, UND-verknuepft). Reine Telefon-Eingaben ("079 123 45", "+41 79")
+    werden zu einem Ziffern-Praefix.
+    """
+    q = (q or "").strip()
+    if not q:
+        return None
+    if _PHONE_LIKE.match(q) and sum(c.isdigit() for c in q) >= 3:
+        digits = normalize_phone(q)
+        return f'telefon : "{digits}"*' if digits else None
+    tokens = [t for t in _TOKEN.findall(q.lower()) if len(t) >= MIN_TOKEN]
+    return " ".join(f'"{t}"*' for t in tokens) or None
+
+
+def _row(r) -> dict:
+    return {"id": r.id, "name": r.name, "telefon": r.telefon, "email": r.email}
+
+
+def search_kunden(db: Session, q: str, limit: int = 10) -> List[dict]:
+    """Top-k Kunden zur Eingabe `q`, nach Relevanz (bm25, Name am staerksten gewichtet; siehe RANK_WINDOW)."""
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    expr = match_query(q)
+    if expr is None:
+        return []
+    try:
+        return _search_fts(db, expr, limit)
+    except OperationalError:
+        db.rollback()
+    if _retry_fts(db):
+        try:
+            return _search_fts(db, expr, limit)
+        except OperationalError:
+            db.rollback()
+    return _search_like(db, q, limit)
+
+
+def _search_fts(db: Session, expr: str, limit: int) -> List[dict]:
+    # erst ranken und kuerzen, dann nur die Top-k mit kunden verbinden
+    rows = db.execute(text(
+        f"SELECT k.id, k.name, k.telefon, k.email FROM "
+        f"(SELECT id, rank FROM (SELECT rowid AS id, rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q "
+        f"ORDER BY rowid DESC LIMIT :w) ORDER BY rank LIMIT :n) f "
+        f"JOIN kunden k ON k.id = f.id ORDER BY f.rank"
+    ), {"q": expr, "w": RANK_WINDOW, "n": limit}).all()
+    return [_row(r) for r in rows]
+
+
+def _search_like(db: Session, q: str, limit: int) -> List[dict]:
+    # Rueckfall ohne FTS5: linearer Scan wie bisher
+    pat = f"%{q.strip()}%"
+    rows = db.execute(
+        select(Kunde.id, Kunde.name, Kunde.telefon, Kunde.email)
+        .where(or_(Kunde.name.ilike(pat), Kunde.telefon.ilike(pat), Kunde.email.ilike(pat),
+                   Kunde.bemerkungen.ilike(pat)))
+        .order_by(Kunde.name).limit(limit)
+    ).all()
+    return [_row(r) for r in rows]
@@ -0,0 +1,131 @@
+# kassensystem_basic/app/services/money.py
+from __future__ import annotations
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import lru_cache
+from typing import List, Sequence, Tuple, Union
+
+# -----------------------------------------------------------------------------
+# Geldbetraege als ganze Rappen (int).
+# Summen, Vergleiche und Aufteilungen sind damit exakt und schnell; gerundet
+# wird nur an definierten Stellen (Menge x Preis, Prozent, Steueranteil) und
+# immer kaufmaennisch (halbe Rappen weg von 0). Float/Decimal nur an den
+# Raendern: Eingabe (to_rappen) und Anzeige/JSON (chf, fmt_chf).
+# -----------------------------------------------------------------------------
+Rappen = int
+Number = Union[int, float, str, Decimal]
+
+_Q = Decimal("0.01")
+
+
+def to_rappen(value: Number) -> Rappen:
+    """CHF-Betrag (int/float/str/Decimal) -> Rappen; ungueltig -> ValueError."""
+    if value is None or value == "":
+        return 0
+    if isinstance(value, bool):
+        raise ValueError(f"Ungueltiger Betrag: {value!r}")
+    if isinstance(value, int):
+        return value * 100
+    return int(_exact(value).quantize(_Q, rounding=ROUND_HALF_UP).scaleb(2))
+
+
+def _exact(value: Number) -> Decimal:
+    try:
+        # float ueber repr: 0.1 -> "0.1", nicht 0.1000000000000000055...
+        d = value if isinstance(value, Decimal) else Decimal(str(value).strip())
+        if not d.is_finite():
+            raise InvalidOperation
+        return d
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"Ungueltiger Betrag: {value!r}") from None
+
+
+def chf(rp: Rappen) -> float:
+    """Rappen -> CHF als float (Anzeige, JSON, Float-Spiegelspalten)."""
+    return rp / 100
+
+
+def to_decimal(rp: Rappen) -> Decimal:
+    return Decimal(rp).scaleb(-2)
+
+
+def fmt_chf(rp: Rappen) -> str:
+    """Rappen -> "1234.50" (ohne Float-Umweg)."""
+    sign = "-" if rp < 0 else ""
+    q, r = divmod(abs(rp), 100)
+    return f"{sign}{q}.{r:02d}"
+
+
+def div_round(num: int, den: int) -> int:
+    """Ganzzahl-Division, kaufmaennisch gerundet (.5 weg von 0)."""
+    if den == 0:
+        raise ZeroDivisionError("div_round: Nenner 0")
+    if den < 0:
+        num, den = -num, -den
+    q = (2 * abs(num) + den) // (2 * den)
+    return q if num >= 0 else -q
+
+
+@lru_cache(maxsize=256)
+def _ratio(x: Number) -> Tuple[int, int]:
+    # Saetze/Mengen als exakter Bruch; wiederkehrende Werte (MWST-Saetze) gecacht
+    if isinstance(x, int):
+        return x, 1
+    return Decimal(str(x)).as_integer_ratio()
+
+
+def mul_qty(rp: Rappen, qty: Number) -> Rappen:
+    """Preis x Menge (auch Bruchteile, z. B. 0.5) auf ganze Rappen."""
+    if isinstance(qty, int):
+        return rp * qty
+    n, d = _ratio(qty)
+    return div_round(rp * n, d)
+
+
+def percent_of(rp: Rappen, pct: Number) -> Rappen:
+    """pct Prozent von rp, gerundet."""
+    n, d = _ratio(pct)
+    return div_round(rp * n, d * 100)
+
+
+def split_gross(gross: Rappen, rate: Number) -> Tuple[Rappen, Rappen]:
+    """
+    Bruttobetrag -> (netto, steuer) fuer einen Satz als Anteil (0.081).
+    Netto wird gerundet, Steuer ist der Rest: netto + steuer == brutto.
+    """
+    n, d = _ratio(rate)
+    if n == 0:
+        return gross, 0
+    net = div_round(gross * d, d + n)
+    return net, gross - net
+
+
+def line_total(price: Number, qty: Number) -> Rappen:
+    """
+    Einzelpreis in CHF (auch mit mehr als zwei Stellen) x Menge, einmal auf
+    Rappen gerundet: 0.125 x 8 = 1.00, nicht 0.13 x 8 = 1.04.
+    """
+    if isinstance(price, bool):
+        raise ValueError(f"Ungueltiger Betrag: {price!r}")
+    pn, pd = (price, 1) if isinstance(price, int) else _exact(price).as_integer_ratio()
+    qn, qd = _ratio(qty)
+    return div_round(pn * qn * 100, pd * qd)
+
+
+def line_totals(prices: Sequence[Rappen], qtys: Sequence[Number]) -> List[Rappen]:
+    """Zeilensummen einer ganzen Liste (Preis x Menge je Position)."""
+    return [mul_qty(p, q) for p, q in zip(prices, qtys)]
+
+
+def allocate(total: Rappen, weights: Sequence[Rappen]) -> List[Rappen]:
+    """
+    Verteilt `total` proportional zu `weights` (z. B. Rabatt auf Positionen).
+    Jeder Anteil wird gerundet, der Rest geht auf die letzte Position –
+    die Teile ergeben immer exakt `total`.
+    """
+    base = sum(weights)
+    if not weights or base <= 0 or total <= 0:
+        return [0] * len(weights)
+    out = [div_round(w * total, base) for w in weights[:-1]]
+    out.append(total - sum(out))
+    return out
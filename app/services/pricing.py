@@ -3,7 +3,8 @@ from decimal import Decimal, ROUND_HALF_UP
 from typing import Dict, List, Tuple
 
 from sqlalchemy.orm import Session
-from app.models.entities import Konfig
+from app.services.money import allocate, chf, line_total, percent_of, split_gross, to_decimal, to_rappen
+from app.services.tax_rates import TaxRates, load_tax_rates as _load_tax_table
 
 Money = Decimal
 
@@ -18,35 +19,15 @@ def round2(x: Decimal) -> Decimal:
     return x.quantize(Q2, rounding=ROUND_HALF_UP)
 
 def load_tax_rates(db: Session) -> Dict[str, Decimal]:
-    """Liest MWST-Sätze aus Konfig ('taxes'). Fallback: CH-7.7."""
-    row = db.get(Konfig, "taxes")
-    if not row:
-        return {"CH-7.7": D("0.077")}
-    try:
-        import json
-        data = json.loads(row.value_json)
-        return {k: D(v) for k, v in data.items()}
-    except Exception:
-        return {"CH-7.7": D("0.077")}
+    """MWST-Sätze aus Konfig ('taxes') – gecacht, siehe app.services.tax_rates."""
+    return _load_tax_table(db).as_dict()
 
 def split_discount_proportional(line_gross: List[Decimal], discount_total: Decimal) -> List[Decimal]:
-    subtotal = sum(line_gross) if line_gross else D("0")
-    if subtotal <= 0 or discount_total <= 0:
-        return [D("0") for _ in line_gross]
-    # proportional nach Brutto-Anteil
-    out = []
-    acc = D("0")
-    for i, lg in enumerate(line_gross):
-        if i < len(line_gross) - 1:
-            part = (lg / subtotal) * discount_total
-            part = round2(part)
-            out.append(part)
-            acc += part
-        else:
-            out.append(round2(discount_total - acc))  # Rest auf letzte Position
-    return out
+    # proportional nach Brutto-Anteil, Rest auf letzte Position (siehe money.allocate)
+    parts = allocate(to_rappen(discount_total), [to_rappen(g) for g in line_gross])
+    return [to_decimal(p) for p in parts]
 
-def summarize_cart(cart: dict, db: Session) -> dict:
+def summarize_cart(cart: dict, db: Session, rates: TaxRates | None = None) -> dict:
     """
     Erwartet cart:
     {
@@ -56,57 +37,43 @@ def summarize_cart(cart: dict, db: Session) -> dict:
       "tip": 0                   # CHF
     }
     """
-    tax_rates = load_tax_rates(db)
+    tax_rates = rates or _load_tax_table(db)
 
+    # Rechnen in ganzen Rappen (app.services.money); Decimal/float nur an den Raendern
     items = cart.get("items", [])
-    line_gross = [D(i["unit_price"]) * D(i["qty"]) for i in items]
-    subtotal_gross = round2(sum(line_gross))
+    # Preis x Menge exakt, erst die Zeilensumme wird gerundet (Einzelpreise mit 3+ Stellen)
+    line_gross = [line_total(i["unit_price"], i["qty"]) for i in items]
+    subtotal_gross = sum(line_gross)
 
-    discount_amount = D(cart.get("discount_amount") or "0")
+    discount_amount = to_rappen(cart.get("discount_amount") or 0)
     discount_percent = D(cart.get("discount_percent") or "0")
     if discount_amount <= 0 and discount_percent > 0:
-        discount_amount = round2(subtotal_gross * (discount_percent / D("100")))
+        discount_amount = percent_of(subtotal_gross, discount_percent)
 
     discount_amount = min(discount_amount, subtotal_gross)  # nicht über Subtotal
 
-    # Rabatt proportional auf Positionen verteilen
-    discounts_per_line = split_discount_proportional(line_gross, discount_amount)
-    line_gross_after_discount: List[Decimal] = [
-        round2(g - d) for g, d in zip(line_gross, discounts_per_line)
-    ]
+    # Rabatt proportional auf Positionen verteilen (Rest auf letzte Position)
+    line_gross_after_discount = [g - d for g, d in zip(line_gross, allocate(discount_amount, line_gross))]
 
     # Steuer berechnen: Preise sind Brutto → Steuer = Brutto - Netto
-    tax_by_code: Dict[str, Decimal] = {}
-    line_tax: List[Decimal] = []
-    for i, it in enumerate(items):
+    tax_by_code: Dict[str, int] = {}
+    line_tax: List[int] = []
+    for it, gross in zip(items, line_gross_after_discount):
         code = it["steuer_code"]
-        rate = tax_rates.get(code, D("0"))
-        gross = line_gross_after_discount[i]
-        if rate > 0:
-            net = gross / (D("1") + rate)
-            tax = round2(gross - net)
-        else:
-            tax = D("0.00")
+        _net, tax = split_gross(gross, tax_rates.rate(code))
         line_tax.append(tax)
-        tax_by_code[code] = round2(tax_by_code.get(code, D("0")) + tax)
+        tax_by_code[code] = tax_by_code.get(code, 0) + tax
 
-    tax_total = round2(sum(line_tax))
-    tip = round2(D(cart.get("tip") or "0"))
-    total_gross = round2(sum(line_gross_after_discount) + tip)
+    tip = to_rappen(cart.get("tip") or 0)
+    total_gross = sum(line_gross_after_discount) + tip
 
     return {
-        "items": [
-            {
-                **it,
-                "line_gross": float(round2(D(it["unit_price"]) * D(it["qty"]))),
-            }
-            for it in items
-        ],
-        "subtotal_gross": float(subtotal_gross),
+        "items": [{**it, "line_gross": chf(g)} for it, g in zip(items, line_gross)],
+        "subtotal_gross": chf(subtotal_gross),
         "discount_percent": float(discount_percent),
-        "discount_amount": float(round2(discount_amount)),
-        "tax_by_code": {k: float(round2(v)) for k, v in tax_by_code.items()},
-        "tax_total": float(tax_total),
-        "tip": float(tip),
-        "total_gross": float(total_gross),
+        "discount_amount": chf(discount_amount),
+        "tax_by_code": {k: chf(v) for k, v in tax_by_code.items()},
+        "tax_total": chf(sum(line_tax)),
+        "tip": chf(tip),
+        "total_gross": chf(total_gross),
     }
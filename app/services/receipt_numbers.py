@@ -1,34 +1,158 @@
 from __future__ import annotations
-from typing import Tuple
-from sqlalchemy.orm import Session
-from app.models.entities import Konfig
 import json
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings as app_settings
+from app.models.entities import Beleg, BelegnummerBlock, BelegnummerSequenz, Konfig
 
 DEFAULT_CONF = {"prefix": "KS-", "next_number": 10001}
+SEQUENCE = "receipt"
 
-def _load_receipt_conf(db: Session) -> dict:
-    row = db.get(Konfig, "receipt")
-    if not row:
-        row = Konfig(key="receipt", value_json=json.dumps(DEFAULT_CONF))
-        db.add(row)
-        db.commit()
-        return DEFAULT_CONF
+# -----------------------------------------------------------------------------
+# Belegnummern aus einer Sequenz-Tabelle.
+# Vergabe per UPDATE ... RETURNING in einer eigenen, kurzen Transaktion: atomar
+# auch bei mehreren Kassen/Prozessen, unabhaengig vom Commit/Rollback des Belegs.
+# Jeder vergebene Block wird protokolliert (belegnummer_bloecke) -> Luecken und
+# Doppelte lassen sich mit audit_receipt_numbers() nachvollziehen.
+# -----------------------------------------------------------------------------
+
+
+def _load_receipt_conf(conn: Connection) -> dict:
+    """Startwert aus der alten Konfig 'receipt' (Migration), sonst Default."""
+    raw = conn.execute(select(Konfig.value_json).where(Konfig.key == "receipt")).scalar()
     try:
-        return json.loads(row.value_json)
+        conf = json.loads(raw) if raw else {}
     except Exception:
-        return DEFAULT_CONF
-
-def next_receipt_number(db: Session) -> str:
-    """Liest Konfig, inkrementiert next_number atomar und liefert string 'PREFIXNNNN'."""
-    conf = _load_receipt_conf(db)
-    prefix = conf.get("prefix", "KS-")
-    next_no = int(conf.get("next_number", 10001))
-    new_no = next_no + 1
-
-    # persistieren
-    row = db.get(Konfig, "receipt")
-    row.value_json = json.dumps({"prefix": prefix, "next_number": new_no})
-    db.add(row)
-    db.commit()
-
-    return f"{prefix}{next_no}"
+        conf = {}
+    return {**DEFAULT_CONF, **conf}
+
+
+def _ensure_tables(engine: Engine) -> None:
+    for model in (BelegnummerSequenz, BelegnummerBlock):
+        model.__table__.create(bind=engine, checkfirst=True)
+
+
+def _reserve(engine: Engine, kassen_id: str, count: int, sequence: str = SEQUENCE) -> Tuple[str, int, int]:
+    """Reserviert `count` fortlaufende Nummern; liefert (prefix, erste, letzte)."""
+    seq = BelegnummerSequenz
+    stmt = (
+        update(seq).where(seq.name == sequence)
+        .values(next_number=seq.next_number + count)
+        .returning(seq.prefix, seq.next_number)
+    )
+    for _ in range(2):
+        with engine.begin() as conn:
+            row = conn.execute(stmt).first()
+            if row is not None:
+                prefix, after = row
+                first, last = after - count, after - 1
+                conn.execute(BelegnummerBlock.__table__.insert().values(
+                    sequenz=sequence, kassen_id=kassen_id, von_nr=first, bis_nr=last))
+                return prefix, first, last
+        # Sequenz noch nicht angelegt: einmalig aus Konfig uebernehmen
+        try:
+            with engine.begin() as conn:
+                conf = _load_receipt_conf(conn)
+                conn.execute(seq.__table__.insert().values(
+                    name=sequence, prefix=conf.get("prefix", "KS-"),
+                    next_number=int(conf.get("next_number", 10001))))
+        except IntegrityError:
+            pass  # parallel angelegt
+    raise RuntimeError(f"Belegnummern-Sequenz '{sequence}' nicht verfuegbar.")
+
+
+class ReceiptNumberAllocator:
+    """
+    Vergibt Belegnummern je Kasse. Bei block_size > 1 wird ein Block im Speicher
+    reserviert; die Nummern daraus kosten keinen weiteren Schreibzugriff.
+    """
+
+    def __init__(self, block_size: Optional[int] = None, sequence: str = SEQUENCE):
+        self.block_size = max(1, int(block_size or app_settings.RECEIPT_BLOCK_SIZE))
+        self.sequence = sequence
+        self._lock = threading.Lock()
+        self._blocks: Dict[Tuple[str, str], list] = {}   # (db, kasse) -> [prefix, next, last]
+        self._ready: set = set()
+
+    def next(self, db: Session, kassen_id: str = "K1") -> str:
+        """
+        Naechste Nummer fuer `kassen_id`. Vor eigenen Schreibzugriffen der Session
+        aufrufen – die Reservierung laeuft ueber eine eigene Verbindung.
+        """
+        engine = db.get_bind()
+        key = (str(engine.url), kassen_id)
+        with self._lock:
+            if key[0] not in self._ready:
+                _ensure_tables(engine)
+                self._ready.add(key[0])
+            block = self._blocks.get(key)
+            if block is None or block[1] > block[2]:
+                block = self._blocks[key] = list(_reserve(engine, kassen_id, self.block_size, self.sequence))
+            number = block[1]
+            block[1] += 1
+        return f"{block[0]}{number}"
+
+    def release(self) -> None:
+        """Vergisst reservierte Bloecke (Restnummern bleiben als protokollierte Luecke)."""
+        with self._lock:
+            self._blocks.clear()
+
+
+_allocator = ReceiptNumberAllocator()
+
+
+def next_receipt_number(db: Session, kassen_id: str = "K1") -> str:
+    """Liefert die naechste Belegnummer 'PREFIXNNNN' (atomar, ohne Commit der Session)."""
+    return _allocator.next(db, kassen_id)
+
+
+def _ranges(numbers: List[int]) -> List[Tuple[int, int]]:
+    out: List[Tuple[int, int]] = []
+    for n in sorted(numbers):
+        if out and n == out[-1][1] + 1:
+            out[-1] = (out[-1][0], n)
+        else:
+            out.append((n, n))
+    return out
+
+
+def audit_receipt_numbers(db: Session, sequence: str = SEQUENCE) -> dict:
+    """
+    Prueft vergebene gegen verbuchte Nummern:
+    - doppelt: Nummer auf mehreren Belegen oder in ueberlappenden Bloecken
+    - reserviert_unbenutzt: vergeben, aber (noch) kein Beleg (z. B. Neustart, Rollback)
+    - nicht_vergeben: Beleg mit Nummer, die nie reserviert wurde
+    Nummernbereiche werden als [von, bis] zusammengefasst.
+    """
+    _ensure_tables(db.get_bind())
+    seq = db.get(BelegnummerSequenz, sequence)
+    prefix = seq.prefix if seq else DEFAULT_CONF["prefix"]
+
+    allocated: Counter = Counter()
+    for von, bis in db.execute(select(BelegnummerBlock.von_nr, BelegnummerBlock.bis_nr)
+                               .where(BelegnummerBlock.sequenz == sequence)):
+        allocated.update(range(von, bis + 1))
+
+    used: Counter = Counter()
+    for (nr,) in db.execute(select(Beleg.belegnr).where(Beleg.belegnr.like(f"{prefix}%"))):
+        try:
+            used[int(nr[len(prefix):])] += 1
+        except ValueError:
+            continue
+
+    doppelt = sorted({n for n, c in used.items() if c > 1} | {n for n, c in allocated.items() if c > 1})
+    return {
+        "prefix": prefix,
+        "vergeben": len(allocated),
+        "verbucht": sum(used.values()),
+        "doppelt": _ranges(doppelt),
+        "reserviert_unbenutzt": _ranges([n for n in allocated if n not in used]),
+        "nicht_vergeben": _ranges([n for n in used if n not in allocated]),
+    }
@@ -0,0 +1,269 @@
+# kassensystem_basic/app/services/report_jobs.py
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import (
+    Column, DateTime, Index, MetaData, String, Table, Text, delete, insert, inspect as sa_inspect,
+    select, update
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+# -----------------------------------------------------------------------------
+# Lokale Job-Queue fuer Berichte (ohne externen Broker).
+# Queue und Ergebnis-Index liegen in einer SQLite-Tabelle, die PDFs als
+# Dateien im Cache-Ordner (Dateiname = Inhalts-Hash).
+# -----------------------------------------------------------------------------
+_meta = MetaData()
+
+report_jobs_t = Table(
+    "report_jobs", _meta,
+    Column("id", String(32), primary_key=True),
+    Column("rtype", String(40), nullable=False),
+    Column("von", String(40), nullable=False, default=""),
+    Column("bis", String(40), nullable=False, default=""),
+    Column("kassen_id", String(20), nullable=False, default=""),
+    Column("fingerprint", String(200), nullable=False),   # Datenstand des Zeitraums
+    Column("status", String(10), nullable=False),         # queued|running|done|failed
+    Column("content_hash", String(64)),
+    Column("path", Text),
+    Column("error", Text),
+    Column("created_at", DateTime, nullable=False),
+    Column("finished_at", DateTime),
+)
+Index("ix_report_jobs_key", report_jobs_t.c.rtype, report_jobs_t.c.von, report_jobs_t.c.bis,
+      report_jobs_t.c.kassen_id, report_jobs_t.c.fingerprint)
+Index("ix_report_jobs_status", report_jobs_t.c.status, report_jobs_t.c.created_at)
+
+# Renderer: (db, von, bis, kassen_id) -> Pfad einer fertigen Temp-Datei
+Renderer = Callable[[Session, Optional[str], Optional[str], Optional[str]], str]
+# Fingerprint: (db, von, bis, kassen_id) -> String, aendert sich bei neuen Verkaeufen
+Fingerprint = Callable[[Session, Optional[str], Optional[str], Optional[str]], str]
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ReportJobQueue:
+    """
+    Job-Queue fuer Berichte je Schluessel (typ, von, bis, kassen_id).
+
+    - submit(): liefert sofort einen Job; ist fuer denselben Schluessel und
+      denselben Datenstand (Fingerprint) schon ein Ergebnis da, wird dieses
+      wiederverwendet, sonst wird ein neuer Job eingereiht.
+    - Worker-Threads holen eingereihte Jobs per bedingtem UPDATE (atomar,
+      auch mit mehreren Prozessen auf derselben DB).
+    - render_now(): wie submit(), rendert aber im aufrufenden Thread.
+    - Ausgelieferte Ergebnisse sind geleast (mtime der Datei, lease()): prune
+      loescht eine Datei erst lease_sec nach der letzten Verwendung – auch
+      wenn ein anderer Prozess sie gerade streamt.
+    """
+
+    def __init__(self, engine: Engine, cache_dir: str | Path, renderers: Dict[str, Renderer],
+                 fingerprint: Fingerprint, *, workers: int = 2, max_artifacts: int = 200,
+                 poll_interval: float = 2.0, lease_sec: float = 600.0):
+        self.engine = engine
+        self.cache_dir = Path(cache_dir)
+        self.renderers = dict(renderers)
+        self.fingerprint = fingerprint
+        self.workers = workers
+        self.max_artifacts = max_artifacts
+        self.poll_interval = poll_interval
+        self.lease_sec = lease_sec
+        self._session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+        self._wake = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._storage_ready = False
+
+    # ---------- Lebenszyklus ----------
+    def init_storage(self) -> None:
+        if self._storage_ready:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            _meta.create_all(bind=self.engine)
+        except OperationalError:
+            # anderer Worker-Prozess legt die Tabelle gerade an
+            if not sa_inspect(self.engine).has_table("report_jobs"):
+                raise
+        self._storage_ready = True
+
+    def start(self) -> None:
+        """Legt Tabelle/Ordner an und startet die Worker (idempotent)."""
+        if self._threads:
+            return
+        self.init_storage()
+        # Jobs, die bei einem Absturz mitten im Rendern liegen geblieben sind
+        with self._session() as db:
+            db.execute(update(report_jobs_t).where(report_jobs_t.c.status == "running")
+                       .values(status="queued"))
+            db.commit()
+        for n in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"report-jobs-{n}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    # ---------- API ----------
+    def submit(self, rtype: str, von: Optional[str] = None, bis: Optional[str] = None,
+               kassen_id: Optional[str] = None) -> dict:
+        key = self._key(rtype, von, bis, kassen_id)
+        self.init_storage()
+        with self._session() as db:
+            fp = self.fingerprint(db, *self._args(key))
+            job = self._find(db, key, fp)
+            if job is not None:
+                return job
+            jid = self._insert(db, key, fp, "queued")
+        self._wake.set()
+        return self.get(jid)
+
+    def render_now(self, rtype: str, von: Optional[str] = None, bis: Optional[str] = None,
+                   kassen_id: Optional[str] = None) -> dict:
+        key = self._key(rtype, von, bis, kassen_id)
+        self.init_storage()
+        with self._session() as db:
+            fp = self.fingerprint(db, *self._args(key))
+            job = self._find(db, key, fp, statuses=("done",))
+            if job is not None:
+                return job
+            jid = self._insert(db, key, fp, "running")
+        self._run(self.get(jid))
+        return self.get(jid)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        self.init_storage()
+        with self._session() as db:
+            row = db.execute(select(report_jobs_t).where(report_jobs_t.c.id == job_id)).mappings().first()
+            return dict(row) if row else None
+
+    def lease(self, job: dict) -> bool:
+        """
+        Markiert das Ergebnis eines fertigen Jobs als in Gebrauch (z. B. vor dem
+        Ausliefern). False, wenn die Datei nicht (mehr) da ist.
+        """
+        path = job.get("path") if job.get("status") == "done" else None
+        if not path:
+            return False
+        try:
+            os.utime(path)
+        except OSError:
+            return False
+        return True
+
+    # ---------- intern ----------
+    def _key(self, rtype, von, bis, kassen_id) -> tuple:
+        if rtype not in self.renderers:
+            raise ValueError(f"Unbekannter Berichtstyp: {rtype}")
+        return (rtype, von or "", bis or "", kassen_id or "")
+
+    @staticmethod
+    def _args(key: tuple) -> tuple:
+        return tuple(v or None for v in key[1:])
+
+    def _find(self, db: Session, key: tuple, fp: str,
+              statuses: tuple = ("queued", "running", "done")) -> Optional[dict]:
+        j = report_jobs_t.c
+        rows = db.execute(
+            select(report_jobs_t)
+            .where(j.rtype == key[0], j.von == key[1], j.bis == key[2], j.kassen_id == key[3],
+                   j.fingerprint == fp, j.status.in_(statuses))
+            .order_by(j.created_at.desc())
+        ).mappings()
+        for row in rows:
+            if row["status"] != "done" or self.lease(row):
+                return dict(row)
+        return None
+
+    def _insert(self, db: Session, key: tuple, fp: str, status: str) -> str:
+        jid = uuid.uuid4().hex
+        db.execute(insert(report_jobs_t).values(
+            id=jid, rtype=key[0], von=key[1], bis=key[2], kassen_id=key[3],
+            fingerprint=fp, status=status, created_at=datetime.utcnow(),
+        ))
+        db.commit()
+        return jid
+
+    def _claim(self) -> Optional[dict]:
+        j = report_jobs_t.c
+        with self._session() as db:
+            row = db.execute(select(report_jobs_t).where(j.status == "queued")
+                             .order_by(j.created_at).limit(1)).mappings().first()
+            if row is None:
+                return None
+            res = db.execute(update(report_jobs_t).where(j.id == row["id"], j.status == "queued")
+                             .values(status="running"))
+            db.commit()
+            return dict(row) if res.rowcount == 1 else None
+
+    def _worker(self) -> None:
+        while True:
+            try:
+                job = self._claim()
+            except Exception:
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: dict) -> None:
+        j = report_jobs_t.c
+        try:
+            with self._session() as db:
+                tmp = self.renderers[job["rtype"]](db, *self._args(
+                    (job["rtype"], job["von"], job["bis"], job["kassen_id"])))
+            digest = _file_sha256(tmp)
+            dest = self.cache_dir / f"{job['rtype']}-{digest}.pdf"
+            if dest.exists():
+                os.unlink(tmp)
+            else:
+                shutil.move(tmp, dest)
+            os.utime(dest)          # Lease bis zum Eintrag als "done"
+            values = dict(status="done", content_hash=digest, path=str(dest), error=None)
+        except Exception as e:
+            values = dict(status="failed", error=str(e) or e.__class__.__name__)
+        with self._session() as db:
+            db.execute(update(report_jobs_t).where(j.id == job["id"])
+                       .values(finished_at=datetime.utcnow(), **values))
+            db.commit()
+        self._prune()
+
+    def _prune(self) -> None:
+        """
+        Haelt hoechstens max_artifacts abgeschlossene Jobs. Dateien ohne Job
+        werden geloescht, sobald ihre Lease (lease_sec seit der letzten
+        Verwendung) abgelaufen ist – nie waehrend sie ausgeliefert werden.
+        """
+        j = report_jobs_t.c
+        with self._session() as db:
+            old = db.execute(
+                select(j.id).where(j.status.in_(("done", "failed")))
+                .order_by(j.created_at.desc()).offset(self.max_artifacts)
+            ).scalars().all()
+            if old:
+                db.execute(delete(report_jobs_t).where(j.id.in_(old)))
+                db.commit()
+            used = set(db.execute(select(j.path).where(j.path.is_not(None))).scalars())
+        cutoff = time.time() - self.lease_sec
+        for path in self.cache_dir.glob("*.pdf"):
+            try:
+                if str(path) not in used and path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
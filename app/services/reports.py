@@ -0,0 +1,527 @@
+# kassensystem_basic/app/services/reports.py
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Integer, MetaData, String, Table, case, column, delete,
+    distinct, func, inspect as sa_inspect, or_, select, table
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.services.money import Rappen, chf
+
+# -----------------------------------------------------------------------------
+# Verkaufsjournal (Charge 1) als leichte Tabellen-Definitionen.
+# Die ORM-Modelle liegen in main.py; hier reicht Core, damit kein Zirkelimport
+# entsteht und die Aggregation direkt als GROUP BY in der DB laeuft.
+# -----------------------------------------------------------------------------
+sales_t = table(
+    "sales",
+    column("id", Integer),
+    column("ts", DateTime),
+    column("kassen_id", String),
+    column("brutto_rp", Integer),     # Betraege in Rappen (Float-Spiegel wird nicht gelesen)
+    column("rabatt_rp", Integer),
+    column("storno", Boolean),
+)
+
+sale_items_t = table(
+    "sale_items",
+    column("sale_id", Integer),
+    column("menge", Integer),
+    column("vk_brutto_rp", Integer),
+    column("steuer_code", String),
+    column("warengruppe", String),
+)
+
+sale_payments_t = table(
+    "sale_payments",
+    column("id", Integer),
+    column("sale_id", Integer),
+    column("art", String),
+    column("betrag_rp", Integer),
+)
+
+
+@dataclass
+class ReportTotals:
+    """
+    Kennzahlen eines Zeitraums. Betraege als ganze Rappen (exakt summierbar);
+    brutto_sum, by_tax usw. liefern dieselben Werte in CHF fuer die Ansicht.
+    """
+    belege: int = 0
+    brutto_rp: Rappen = 0
+    rabatt_rp: Rappen = 0
+    rabatt_count: int = 0
+    storno_count: int = 0
+    storno_rp: Rappen = 0
+    payments_rp: Dict[str, Tuple[int, Rappen]] = field(default_factory=dict)  # art -> (#Belege, Summe)
+    tax_rp: Dict[str, Rappen] = field(default_factory=dict)                   # S1/S2 -> Brutto
+    group_rp: Dict[str, Rappen] = field(default_factory=dict)                 # DL/PR/TA -> Brutto
+
+    @property
+    def brutto_sum(self) -> float:
+        return chf(self.brutto_rp)
+
+    @property
+    def rabatt_sum(self) -> float:
+        return chf(self.rabatt_rp)
+
+    @property
+    def storno_sum(self) -> float:
+        return chf(self.storno_rp)
+
+    @property
+    def payments(self) -> Dict[str, Tuple[int, float]]:
+        return {art: (cnt, chf(rp)) for art, (cnt, rp) in self.payments_rp.items()}
+
+    @property
+    def by_tax(self) -> Dict[str, float]:
+        return {k: chf(v) for k, v in self.tax_rp.items()}
+
+    @property
+    def by_group(self) -> Dict[str, float]:
+        return {k: chf(v) for k, v in self.group_rp.items()}
+
+    def payment_rp(self, art: str) -> Rappen:
+        return self.payments_rp.get(art, (0, 0))[1]
+
+    def payment_sum(self, art: str) -> float:
+        return chf(self.payment_rp(art))
+
+    def payment_count(self, art: str) -> int:
+        return self.payments_rp.get(art, (0, 0))[0]
+
+    def add(self, other: "ReportTotals") -> "ReportTotals":
+        """Addiert Kennzahlen eines angrenzenden Zeitraums (in-place)."""
+        self.belege += other.belege
+        self.brutto_rp += other.brutto_rp
+        self.rabatt_rp += other.rabatt_rp
+        self.rabatt_count += other.rabatt_count
+        self.storno_count += other.storno_count
+        self.storno_rp += other.storno_rp
+        for art, (cnt, total) in other.payments_rp.items():
+            c0, t0 = self.payments_rp.get(art, (0, 0))
+            self.payments_rp[art] = (c0 + cnt, t0 + total)
+        for mine, theirs in ((self.tax_rp, other.tax_rp), (self.group_rp, other.group_rp)):
+            for k, v in theirs.items():
+                mine[k] = mine.get(k, 0) + v
+        return self
+
+
+def _in_period(stmt, von: Optional[datetime], bis: Optional[datetime], kassen_id: Optional[str]):
+    if von is not None:
+        stmt = stmt.where(sales_t.c.ts >= von)
+    if bis is not None:
+        stmt = stmt.where(sales_t.c.ts <= bis)
+    if kassen_id:
+        stmt = stmt.where(sales_t.c.kassen_id == kassen_id)
+    return stmt
+
+
+def _code(col, default: str):
+    # entspricht `(x or default)` in Python: NULL und "" fallen auf den Default
+    return func.coalesce(func.nullif(col, ""), default)
+
+
+def sale_totals(db: Session, von: Optional[datetime] = None, bis: Optional[datetime] = None,
+                kassen_id: Optional[str] = None) -> ReportTotals:
+    """Belegkoepfe: Anzahl, Brutto, Rabatte, Stornos – eine Abfrage."""
+    s = sales_t.c
+    brutto = func.coalesce(s.brutto_rp, 0)
+    rabatt = func.coalesce(s.rabatt_rp, 0)
+    storno = func.coalesce(s.storno, False)
+    stmt = _in_period(select(
+        func.count(s.id),
+        func.coalesce(func.sum(brutto), 0),
+        func.coalesce(func.sum(rabatt), 0),
+        func.coalesce(func.sum(case((rabatt > 0, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((storno, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((storno, brutto), else_=0)), 0),
+    ), von, bis, kassen_id)
+    row = db.execute(stmt).one()
+    return ReportTotals(
+        belege=int(row[0] or 0),
+        brutto_rp=int(row[1] or 0),
+        rabatt_rp=int(row[2] or 0),
+        rabatt_count=int(row[3] or 0),
+        storno_count=int(row[4] or 0),
+        storno_rp=int(row[5] or 0),
+    )
+
+
+def payment_totals(db: Session, von: Optional[datetime] = None, bis: Optional[datetime] = None,
+                   kassen_id: Optional[str] = None) -> Dict[str, Tuple[int, Rappen]]:
+    """Zahlungen je Art: (#Belege mit dieser Art, Summe in Rappen).
+
+    Die Art wird klein geschrieben gruppiert ("Bar" zaehlt als "bar"), wie im
+    MWST-Bericht und in daily_rollup. Frueher verglichen Kassenbuch/Zahlungsarten
+    exakt und liessen abweichend geschriebene Arten weg; der Checkout schreibt
+    die Arten ohnehin klein, fuer dessen Belege aendert sich nichts.
+    """
+    p = sale_payments_t.c
+    art = func.lower(func.coalesce(p.art, ""))
+    stmt = _in_period(
+        select(art, func.count(distinct(p.sale_id)), func.sum(func.coalesce(p.betrag_rp, 0)))
+        .select_from(sale_payments_t.join(sales_t, sales_t.c.id == p.sale_id)),
+        von, bis, kassen_id,
+    ).group_by(art)
+    return {k: (int(cnt or 0), int(total or 0)) for k, cnt, total in db.execute(stmt)}
+
+
+def item_totals(db: Session, von: Optional[datetime] = None, bis: Optional[datetime] = None,
+                kassen_id: Optional[str] = None) -> Tuple[Dict[str, Rappen], Dict[str, Rappen]]:
+    """Positionsumsatz (vk_brutto_rp * menge) je Steuercode und je Warengruppe, in Rappen."""
+    i = sale_items_t.c
+    code = func.upper(_code(i.steuer_code, "S1"))
+    grp = func.upper(_code(i.warengruppe, "DL"))
+    gross = func.coalesce(i.vk_brutto_rp, 0) * func.coalesce(i.menge, 0)
+    stmt = _in_period(
+        select(code, grp, func.sum(gross))
+        .select_from(sale_items_t.join(sales_t, sales_t.c.id == i.sale_id)),
+        von, bis, kassen_id,
+    ).group_by(code, grp)
+    by_tax: Dict[str, Rappen] = {}
+    by_group: Dict[str, Rappen] = {}
+    for c, g, total in db.execute(stmt):
+        by_tax[c] = by_tax.get(c, 0) + int(total or 0)
+        by_group[g] = by_group.get(g, 0) + int(total or 0)
+    return by_tax, by_group
+
+
+def journal_totals(db: Session, von: Optional[datetime] = None, bis: Optional[datetime] = None,
+                   kassen_id: Optional[str] = None) -> ReportTotals:
+    """
+    Alle Berichtskennzahlen eines Zeitraums direkt aus dem Journal, mit drei
+    GROUP-BY-Abfragen (Belege, Zahlungen, Positionen).
+    """
+    totals = sale_totals(db, von, bis, kassen_id)
+    totals.payments_rp = payment_totals(db, von, bis, kassen_id)
+    totals.tax_rp, totals.group_rp = item_totals(db, von, bis, kassen_id)
+    return totals
+
+
+def aggregate_period(db: Session, von: Optional[datetime] = None, bis: Optional[datetime] = None,
+                     kassen_id: Optional[str] = None) -> ReportTotals:
+    """
+    Berichtskennzahlen eines Zeitraums: ganze Tage aus daily_rollup,
+    angeschnittene Randtage (von/bis mitten im Tag) aus dem Journal.
+    """
+    lo, hi = _full_days(von, bis)
+    if lo is not None and hi is not None and lo > hi:
+        return journal_totals(db, von, bis, kassen_id)   # kein ganzer Tag im Zeitraum
+
+    totals = rollup_totals(db, lo, hi, kassen_id)
+    if von is not None and von < _midnight(lo):
+        totals.add(journal_totals(db, von, _midnight(lo) - _TICK, kassen_id))
+    if bis is not None and bis >= _midnight(hi + timedelta(days=1)):
+        totals.add(journal_totals(db, _midnight(hi + timedelta(days=1)), bis, kassen_id))
+    return totals
+
+
+# -----------------------------------------------------------------------------
+# Tages-Rollup: eine Zeile je (Tag, Kasse) mit allen Berichtskennzahlen.
+# Wird beim Checkout in derselben Transaktion fortgeschrieben und kann jederzeit
+# aus dem Journal neu aufgebaut werden (rebuild_daily_rollup).
+# -----------------------------------------------------------------------------
+ROLLUP_PAYMENT_ARTS = ("bar", "karte", "twint", "gutschein", "guthaben", "offen")
+ROLLUP_TAX_CODES = ("S1", "S2")
+ROLLUP_GROUPS = ("DL", "PR", "TA")
+
+# kleinster Zeitschritt (DateTime-Aufloesung), fuer "bis exklusiv"
+_TICK = timedelta(microseconds=1)
+
+_rollup_meta = MetaData()
+
+daily_rollup_t = Table(
+    "daily_rollup", _rollup_meta,
+    Column("tag", String(10), primary_key=True),          # YYYY-MM-DD (wie sales.ts)
+    Column("kassen_id", String(20), primary_key=True),
+    Column("belege", Integer, nullable=False, default=0),
+    Column("brutto_rp", Integer, nullable=False, default=0),      # Betraege in Rappen
+    Column("rabatt_rp", Integer, nullable=False, default=0),
+    Column("rabatt_count", Integer, nullable=False, default=0),
+    Column("storno_count", Integer, nullable=False, default=0),
+    Column("storno_rp", Integer, nullable=False, default=0),
+    *[Column(f"pay_{a}_count", Integer, nullable=False, default=0) for a in ROLLUP_PAYMENT_ARTS],
+    *[Column(f"pay_{a}_rp", Integer, nullable=False, default=0) for a in ROLLUP_PAYMENT_ARTS],
+    *[Column(f"tax_{c.lower()}_rp", Integer, nullable=False, default=0) for c in ROLLUP_TAX_CODES],
+    *[Column(f"grp_{g.lower()}_rp", Integer, nullable=False, default=0) for g in ROLLUP_GROUPS],
+)
+
+_ROLLUP_METRICS = [c.name for c in daily_rollup_t.columns if not c.primary_key]
+
+
+def _midnight(d: date) -> datetime:
+    return datetime.combine(d, time.min)
+
+
+def _full_days(von: Optional[datetime], bis: Optional[datetime]) -> Tuple[Optional[date], Optional[date]]:
+    """Erster/letzter Tag, der vollstaendig in [von, bis] liegt (None = offen)."""
+    lo = hi = None
+    if von is not None:
+        lo = von.date() if von == _midnight(von.date()) else von.date() + timedelta(days=1)
+    if bis is not None:
+        hi = bis.date() if bis >= datetime.combine(bis.date(), time.max) else bis.date() - timedelta(days=1)
+    return lo, hi
+
+
+def _rollup_select(*where):
+    """
+    Kennzahlen je (Tag, Kasse) aus dem Journal. Zahlungen und Positionen kommen
+    als korrelierte Unterabfragen je Beleg (Index auf sale_id), damit sich
+    sale_items und sale_payments nicht gegenseitig vervielfachen.
+    """
+    s = sales_t.c
+    p = sale_payments_t.c
+    i = sale_items_t.c
+    brutto = func.coalesce(s.brutto_rp, 0)
+    rabatt = func.coalesce(s.rabatt_rp, 0)
+    storno = func.coalesce(s.storno, False)
+
+    def _pay(art, what):
+        cond = (p.sale_id == s.id, func.lower(func.coalesce(p.art, "")) == art)
+        if what == "count":
+            return select(p.sale_id).where(*cond).exists()
+        return select(func.coalesce(func.sum(func.coalesce(p.betrag_rp, 0)), 0)).where(*cond).scalar_subquery()
+
+    def _items(expr, key):
+        gross = func.coalesce(i.vk_brutto_rp, 0) * func.coalesce(i.menge, 0)
+        return (select(func.coalesce(func.sum(gross), 0))
+                .where(i.sale_id == s.id, func.upper(expr) == key).scalar_subquery())
+
+    metrics = {
+        "belege": func.count(s.id),
+        "brutto_rp": func.sum(brutto),
+        "rabatt_rp": func.sum(rabatt),
+        "rabatt_count": func.sum(case((rabatt > 0, 1), else_=0)),
+        "storno_count": func.sum(case((storno, 1), else_=0)),
+        "storno_rp": func.sum(case((storno, brutto), else_=0)),
+    }
+    for a in ROLLUP_PAYMENT_ARTS:
+        metrics[f"pay_{a}_count"] = func.sum(case((_pay(a, "count"), 1), else_=0))
+        metrics[f"pay_{a}_rp"] = func.sum(_pay(a, "sum"))
+    for c in ROLLUP_TAX_CODES:
+        metrics[f"tax_{c.lower()}_rp"] = func.sum(_items(_code(i.steuer_code, "S1"), c))
+    for g in ROLLUP_GROUPS:
+        metrics[f"grp_{g.lower()}_rp"] = func.sum(_items(_code(i.warengruppe, "DL"), g))
+
+    tag = func.date(s.ts)
+    kasse = func.coalesce(s.kassen_id, "")
+    return (
+        select(tag.label("tag"), kasse.label("kassen_id"),
+               *[metrics[m].label(m) for m in _ROLLUP_METRICS])
+        .where(*where)
+        .group_by(tag, kasse)
+    )
+
+
+def ensure_daily_rollup(engine: Engine) -> None:
+    """
+    Legt daily_rollup an; eine leere Tabelle bei vorhandenem Journal wird einmalig
+    aufgebaut. Eine Tabelle im alten Format (CHF-Float-Spalten) wird verworfen und
+    in Rappen neu aufgebaut – sie ist vollstaendig aus dem Journal ableitbar.
+    """
+    insp = sa_inspect(engine)
+    if insp.has_table("daily_rollup"):
+        if not set(_ROLLUP_METRICS) <= {c["name"] for c in insp.get_columns("daily_rollup")}:
+            daily_rollup_t.drop(bind=engine)
+    _rollup_meta.create_all(bind=engine)
+    with Session(engine) as db:
+        empty = db.execute(select(daily_rollup_t.c.tag).limit(1)).first() is None
+        if empty and db.execute(select(sales_t.c.id).limit(1)).first() is not None:
+            rebuild_daily_rollup(db)
+            db.commit()
+
+
+def rollup_add_sale(db: Session, sale_id: int) -> None:
+    """
+    Schreibt einen frisch geschriebenen Beleg in daily_rollup fort (UPSERT).
+    Kein Commit – laeuft in der Transaktion des Checkouts.
+    """
+    sel = _rollup_select(sales_t.c.id == sale_id)
+    stmt = sqlite_insert(daily_rollup_t).from_select(["tag", "kassen_id", *_ROLLUP_METRICS], sel)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["tag", "kassen_id"],
+        set_={m: daily_rollup_t.c[m] + stmt.excluded[m] for m in _ROLLUP_METRICS},
+    )
+    db.execute(stmt)
+
+
+def rebuild_daily_rollup(db: Session, von: Optional[date] = None, bis: Optional[date] = None) -> int:
+    """
+    Baut daily_rollup fuer die Tage [von, bis] (None = alle) aus dem Journal neu auf.
+    Kein Commit. Liefert die Anzahl geschriebener Zeilen.
+    """
+    r = daily_rollup_t.c
+    tag = func.date(sales_t.c.ts)
+    del_stmt = delete(daily_rollup_t)
+    where = []
+    if von is not None:
+        del_stmt = del_stmt.where(r.tag >= von.isoformat())
+        where.append(sales_t.c.ts >= _midnight(von))
+    if bis is not None:
+        del_stmt = del_stmt.where(r.tag <= bis.isoformat())
+        where.append(sales_t.c.ts < _midnight(bis + timedelta(days=1)))
+    db.execute(del_stmt)
+    res = db.execute(daily_rollup_t.insert().from_select(
+        ["tag", "kassen_id", *_ROLLUP_METRICS], _rollup_select(*where)))
+    return res.rowcount
+
+
+def rollup_totals(db: Session, von: Optional[date] = None, bis: Optional[date] = None,
+                  kassen_id: Optional[str] = None) -> ReportTotals:
+    """Summe der Tageszeilen [von, bis] (ganze Tage)."""
+    r = daily_rollup_t.c
+    stmt = select(*[func.coalesce(func.sum(r[m]), 0) for m in _ROLLUP_METRICS])
+    if von is not None:
+        stmt = stmt.where(r.tag >= von.isoformat())
+    if bis is not None:
+        stmt = stmt.where(r.tag <= bis.isoformat())
+    if kassen_id:
+        stmt = stmt.where(r.kassen_id == kassen_id)
+    v = {m: int(x) for m, x in zip(_ROLLUP_METRICS, db.execute(stmt).one())}
+    # Schluessel ohne Umsatz weglassen, wie bei den GROUP-BY-Abfragen auf dem Journal
+    return ReportTotals(
+        belege=v["belege"],
+        brutto_rp=v["brutto_rp"],
+        rabatt_rp=v["rabatt_rp"],
+        rabatt_count=v["rabatt_count"],
+        storno_count=v["storno_count"],
+        storno_rp=v["storno_rp"],
+        payments_rp={a: (v[f"pay_{a}_count"], v[f"pay_{a}_rp"])
+                     for a in ROLLUP_PAYMENT_ARTS if v[f"pay_{a}_count"]},
+        tax_rp={c: v[f"tax_{c.lower()}_rp"] for c in ROLLUP_TAX_CODES if v[f"tax_{c.lower()}_rp"]},
+        group_rp={g: v[f"grp_{g.lower()}_rp"] for g in ROLLUP_GROUPS if v[f"grp_{g.lower()}_rp"]},
+    )
+
+
+def check_daily_rollup(db: Session, von: Optional[date] = None, bis: Optional[date] = None) -> List[dict]:
+    """
+    Vergleicht daily_rollup mit dem Journal je (Tag, Kasse) – exakt, alle
+    Kennzahlen sind ganze Zahlen. Liefert die Abweichungen als
+    [{tag, kassen_id, kennzahl, rollup, journal}] (Betraege in Rappen).
+    """
+    where = []
+    if von is not None:
+        where.append(sales_t.c.ts >= _midnight(von))
+    if bis is not None:
+        where.append(sales_t.c.ts < _midnight(bis + timedelta(days=1)))
+    expected = {(row.tag, row.kassen_id): row._mapping for row in db.execute(_rollup_select(*where))}
+
+    r = daily_rollup_t.c
+    stmt = select(daily_rollup_t)
+    if von is not None:
+        stmt = stmt.where(r.tag >= von.isoformat())
+    if bis is not None:
+        stmt = stmt.where(r.tag <= bis.isoformat())
+    actual = {(row.tag, row.kassen_id): row._mapping for row in db.execute(stmt)}
+
+    diffs = []
+    for key in sorted(set(expected) | set(actual)):
+        exp, act = expected.get(key), actual.get(key)
+        for m in _ROLLUP_METRICS:
+            e = int(exp[m] or 0) if exp is not None else 0
+            a = int(act[m] or 0) if act is not None else 0
+            if e != a:
+                diffs.append({"tag": key[0], "kassen_id": key[1], "kennzahl": m, "rollup": a, "journal": e})
+    return diffs
+
+
+def encode_cursor(ts: datetime, sale_id: int) -> str:
+    return f"{ts:%Y-%m-%dT%H:%M:%S.%f}_{sale_id}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Liest einen Keyset-Cursor "ts_id"; ungueltige Werte zaehlen als erste Seite."""
+    if not cursor:
+        return None
+    try:
+        ts, sid = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(ts), int(sid)
+    except ValueError:
+        return None
+
+
+def kassenbuch_page(db: Session, von: Optional[datetime] = None, bis: Optional[datetime] = None,
+                    kassen_id: Optional[str] = None, *, cursor: Optional[str] = None,
+                    limit: int = 50) -> Tuple[List[dict], Optional[str]]:
+    """
+    Eine Seite des Kassenbuchs, neuste zuerst, per Keyset auf (ts, id).
+    Liefert (Zeilen, next_cursor); Zahlungen der Seite kommen mit einer IN-Abfrage.
+    """
+    s = sales_t.c
+    stmt = _in_period(
+        select(s.id, s.ts, s.kassen_id, s.brutto_rp, s.rabatt_rp),
+        von, bis, kassen_id,
+    )
+    after = decode_cursor(cursor)
+    if after is not None:
+        cts, cid = after
+        stmt = stmt.where(s.ts <= cts, or_(s.ts < cts, s.id < cid))
+    stmt = stmt.order_by(s.ts.desc(), s.id.desc()).limit(limit + 1)
+
+    rows = [{"id": r.id, "ts": r.ts, "kassen_id": r.kassen_id,
+             "brutto_summe": chf(r.brutto_rp or 0), "rabatt_summe": chf(r.rabatt_rp or 0)}
+            for r in db.execute(stmt)]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    by_sale: Dict[int, List[dict]] = {r["id"]: [] for r in rows}
+    if by_sale:
+        p = sale_payments_t.c
+        pays = db.execute(
+            select(p.sale_id, p.art, p.betrag_rp).where(p.sale_id.in_(list(by_sale))).order_by(p.sale_id, p.id)
+        )
+        for sid, art, betrag in pays:
+            by_sale[sid].append({"art": art, "betrag": chf(betrag or 0)})
+    for r in rows:
+        r["payments"] = by_sale[r["id"]]
+
+    next_cursor = encode_cursor(rows[-1]["ts"], rows[-1]["id"]) if has_more else None
+    return rows, next_cursor
+
+
+def period_fingerprint(db: Session, von: Optional[datetime] = None, bis: Optional[datetime] = None,
+                       kassen_id: Optional[str] = None) -> str:
+    """
+    Kurzer Datenstand eines Zeitraums (Anzahl, hoechste ID, Brutto, Stornos).
+    Aendert sich, sobald im Zeitraum Verkaeufe dazukommen oder storniert werden.
+    """
+    s = sales_t.c
+    row = db.execute(_in_period(select(
+        func.count(s.id),
+        func.max(s.id),
+        func.sum(s.brutto_rp),
+        func.sum(case((s.storno, 1), else_=0)),
+    ), von, bis, kassen_id)).one()
+    return ":".join(str(v if v is not None else 0) for v in row)
+
+
+def kassenbuch_rows(db: Session, von: Optional[datetime] = None, bis: Optional[datetime] = None,
+                    kassen_id: Optional[str] = None, *, chunk: int = 1000) -> Iterator[tuple]:
+    """
+    Streamt die Kassenbuch-Zeilen (ts, kassen_id, brutto, rabatt, "art:betrag, ...")
+    chronologisch aufsteigend; Betraege in CHF, gerechnet aus den Rappen-Spalten. Zahlungen werden per group_concat in der DB
+    zusammengefasst; es werden keine ORM-Objekte aufgebaut.
+    """
+    p = sale_payments_t.c
+    s = sales_t.c
+    # korrelierte Unterabfrage je Beleg (nutzt den Index auf sale_payments.sale_id)
+    pays = (
+        select(func.group_concat(p.art + ":" + func.printf("%.2f", func.coalesce(p.betrag_rp, 0) / 100.0), ", "))
+        .where(p.sale_id == s.id)
+        .scalar_subquery()
+    )
+    stmt = _in_period(
+        select(s.ts, s.kassen_id, s.brutto_rp, s.rabatt_rp, pays),
+        von, bis, kassen_id,
+    ).order_by(s.ts.asc(), s.id.asc())
+    result = db.execute(stmt.execution_options(yield_per=chunk))
+    for ts, kasse, brutto, rabatt, zahlungen in result:
+        yield ts, kasse, chf(brutto or 0), chf(rabatt or 0), zahlungen
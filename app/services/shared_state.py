@@ -0,0 +1,54 @@
+# kassensystem_basic/app/services/shared_state.py
+from __future__ import annotations
+
+import itertools
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from app.config import settings as app_settings
+
+# -----------------------------------------------------------------------------
+# Cache-Invalidierung ueber Prozessgrenzen (Server-Modus mit mehreren Workern).
+# Jeder Namensraum hat eine kleine Stempel-Datei; wer Daten aendert, ruft
+# bump(name) auf, Caches vergleichen vor der Nutzung stamp(name) mit dem Stand
+# beim Befuellen. Der Stempel ist der Dateiinhalt, ein eindeutiges Token
+# "pid:ns:zaehler" – Inode/mtime reichen nicht (Inodes werden wiederverwendet,
+# mtime ist je nach Dateisystem grob).
+# -----------------------------------------------------------------------------
+Stamp = Optional[str]
+
+_counter = itertools.count(1)
+
+
+def _path(name: str) -> Path:
+    return Path(app_settings.SHARED_STATE_DIR) / f"{name}.stamp"
+
+
+def stamp(name: str) -> Stamp:
+    """Aktueller Stand des Namensraums (None = noch nie geaendert)."""
+    try:
+        return _path(name).read_text(encoding="ascii") or None
+    except OSError:
+        return None
+
+
+def bump(name: str) -> Stamp:
+    """
+    Markiert den Namensraum als geaendert – alle Prozesse verwerfen ihren Cache.
+    Liefert den eigenen neuen Stempel: wer die Aenderung lokal schon nachgefuehrt
+    hat, kann ihn als gesehen merken (jeder spaetere bump schreibt ein anderes Token).
+    """
+    path = _path(name)
+    n = next(_counter)
+    token = f"{os.getpid()}:{time.time_ns()}:{n}"
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # per replace: Leser sehen immer ein vollstaendiges Token, nie eine halbe Datei
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{n}.tmp")
+        tmp.write_text(token, encoding="ascii")
+        os.replace(tmp, path)
+        return token
+    except OSError:
+        return None  # ohne Schreibrecht bleibt es bei der lokalen Invalidierung
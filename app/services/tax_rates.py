@@ -0,0 +1,133 @@
+# kassensystem_basic/app/services/tax_rates.py
+from __future__ import annotations
+
+import json
+import threading
+from dataclasses import dataclass
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.entities import Konfig
+from app.services import shared_state
+
+# -----------------------------------------------------------------------------
+# Zentrale MWST-Saetze.
+# Quellen: Konfig 'taxes' (app/-Modelle, Codes wie "CH-8.1") bzw. settings.json
+# vat.rate1/rate2 (main.py, Codes S1/S2). Saetze werden einmal als Decimal
+# aufbereitet und prozessweit gecacht; Schreiben invalidiert den Cache (auch in
+# anderen Worker-Prozessen, siehe shared_state).
+# -----------------------------------------------------------------------------
+KONFIG_KEY = "taxes"
+STATE_NAME = "tax_rates"
+
+# Fallback ohne Konfig-Eintrag (Anteil, nicht Prozent): Schweizer Saetze ab 2024
+DEFAULT_RATES: Dict[str, str] = {"CH-8.1": "0.081", "CH-2.6": "0.026", "CH-3.8": "0.038", "CH-0": "0"}
+DEFAULT_CODE = "CH-8.1"   # Normalsatz fuer Positionen ohne Steuercode
+
+_ZERO = Decimal("0")
+_ONE = Decimal("1")
+
+
+@dataclass(frozen=True)
+class TaxRates:
+    """Unveraenderliche Satztabelle: Code -> Anteil (0.081) und Divisor (1.081)."""
+    rates: Mapping[str, Decimal]
+    divisors: Mapping[str, Decimal]
+
+    @classmethod
+    def build(cls, rates: Mapping[str, object]) -> "TaxRates":
+        r = {str(k): Decimal(str(v)) for k, v in rates.items()}
+        return cls(MappingProxyType(r), MappingProxyType({k: _ONE + v for k, v in r.items()}))
+
+    def rate(self, code: Optional[str]) -> Decimal:
+        """Anteil fuer den Code; unbekannte Codes = 0."""
+        return self.rates.get(code or "", _ZERO)
+
+    def divisor(self, code: Optional[str]) -> Decimal:
+        return self.divisors.get(code or "", _ONE)
+
+    def percent(self, code: Optional[str]) -> float:
+        """Satz in Prozent (Anzeige, float-Berichte)."""
+        return float(self.rate(code) * 100)
+
+    def as_dict(self) -> Dict[str, Decimal]:
+        return dict(self.rates)
+
+
+_lock = threading.Lock()
+_konfig_cache: Dict[str, Tuple[shared_state.Stamp, TaxRates]] = {}   # DB-URL -> (Stempel, Tabelle)
+_settings_cache: Dict[Tuple[float, float], TaxRates] = {}
+_DEFAULT = TaxRates.build(DEFAULT_RATES)
+
+
+def _parse_konfig(raw: Optional[str]) -> TaxRates:
+    if not raw:
+        return _DEFAULT
+    try:
+        return TaxRates.build(json.loads(raw))
+    except Exception:
+        return _DEFAULT
+
+
+def load_tax_rates(db: Session) -> TaxRates:
+    """Saetze aus Konfig 'taxes'; nur der erste Aufruf je DB liest die Zeile."""
+    key = str(db.get_bind().url)
+    current = shared_state.stamp(STATE_NAME)
+    cached = _konfig_cache.get(key)
+    if cached is not None and cached[0] == current:
+        return cached[1]
+    row = db.get(Konfig, KONFIG_KEY)
+    table = _parse_konfig(row.value_json if row else None)
+    with _lock:
+        _konfig_cache[key] = (current, table)
+    return table
+
+
+def save_tax_rates(db: Session, rates: Mapping[str, object]) -> TaxRates:
+    """Schreibt Konfig 'taxes' (Anteile, z. B. {"CH-8.1": "0.081"}) und committet."""
+    table = TaxRates.build(rates)
+    value = json.dumps({k: str(v) for k, v in table.rates.items()})
+    row = db.get(Konfig, KONFIG_KEY)
+    if row is None:
+        db.add(Konfig(key=KONFIG_KEY, value_json=value))
+    else:
+        row.value_json = value
+    db.commit()
+    invalidate_tax_rates()
+    return table
+
+
+def invalidate_tax_rates() -> None:
+    with _lock:
+        _konfig_cache.clear()
+    shared_state.bump(STATE_NAME)
+
+
+@event.listens_for(Konfig, "after_insert")
+@event.listens_for(Konfig, "after_update")
+@event.listens_for(Konfig, "after_delete")
+def _konfig_changed(_mapper, _conn, target: Konfig) -> None:
+    # auch direkte Schreibzugriffe auf Konfig('taxes') invalidieren
+    if target.key == KONFIG_KEY:
+        invalidate_tax_rates()
+
+
+def rates_from_settings(vat: Mapping) -> TaxRates:
+    """
+    Saetze S1/S2 aus settings.json (Prozentwerte). Gecacht je Wertepaar –
+    geaenderte Einstellungen ergeben automatisch einen neuen Eintrag.
+    """
+    key = (float(vat.get("rate1", 0.0) or 0.0), float(vat.get("rate2", 0.0) or 0.0))
+    table = _settings_cache.get(key)
+    if table is None:
+        table = TaxRates.build({
+            "S1": Decimal(str(key[0])) / 100,
+            "S2": Decimal(str(key[1])) / 100,
+        })
+        with _lock:
+            _settings_cache[key] = table
+    return table
@@ -0,0 +1,210 @@
+# kassensystem_basic/app/services/termine.py
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, event, inspect as sa_inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.models.entities import Kunde, Mitarbeiter, Service, Termin, TerminService
+from app.services import shared_state
+
+# -----------------------------------------------------------------------------
+# Kalender-Abfragen (Tag/Woche) fuer die Termin-Ansicht.
+# Ein Zeitraum kostet immer genau zwei Abfragen (Termine mit Kunde/Mitarbeiter,
+# dann alle Service-Zeilen derselben Termine), gestuetzt auf die Intervall-Indizes
+# in entities.Termin. Ergebnisse werden je (Tag, Mitarbeiter) gecacht; jeder
+# Commit mit geaenderten Terminen (oder umbenannten Kunden, Mitarbeitern,
+# Services) leert den Cache, andere Worker-Prozesse
+# erkennen das am shared_state-Stempel.
+# -----------------------------------------------------------------------------
+STATE_NAME = "termine"
+CACHE_SIZE = 512                          # (Tag, Mitarbeiter)-Eintraege je Prozess
+
+# Laengster erwarteter Termin. Die Abfrage grenzt start_ts damit beidseitig ein
+# (Index-Range statt Scan bis zum Tabellenanfang); laengere Termine wuerden an
+# Folgetagen nicht angezeigt.
+MAX_TERMIN_DAUER = timedelta(hours=24)
+
+CacheKey = Tuple[date, Optional[int]]
+
+_lock = threading.Lock()
+_cache: "OrderedDict[CacheKey, List[dict]]" = OrderedDict()
+_cache_stamp: shared_state.Stamp = None
+_generation = 0                           # steigt bei jeder Invalidierung
+
+
+def ensure_indexes(engine: Engine) -> None:
+    """Legt die Termin-Indizes in bestehenden DBs nach (create_all tut das nur fuer neue Tabellen)."""
+    if not sa_inspect(engine).has_table(Termin.__tablename__):
+        return
+    for ix in Termin.__table__.indexes:
+        ix.create(bind=engine, checkfirst=True)
+
+
+def overlap_filter(von: datetime, bis: datetime, mitarbeiter_id: Optional[int]):
+    """WHERE-Bedingung: Termine, die [von, bis) ueberschneiden (nutzt die Intervall-Indizes)."""
+    cond = [Termin.start_ts >= von - MAX_TERMIN_DAUER, Termin.start_ts < bis, Termin.ende_ts > von]
+    if mitarbeiter_id is not None:
+        cond.append(Termin.mitarbeiter_id == mitarbeiter_id)
+    return and_(*cond)
+
+
+def _load(db: Session, von: datetime, bis: datetime, mitarbeiter_id: Optional[int]) -> List[dict]:
+    """Alle Termine, die [von, bis) ueberschneiden, nach Beginn sortiert (2 Abfragen)."""
+    where = overlap_filter(von, bis, mitarbeiter_id)
+    rows = db.execute(
+        select(Termin.id, Termin.start_ts, Termin.ende_ts, Termin.zustand, Termin.bemerkung,
+               Termin.kunde_id, Kunde.name, Termin.mitarbeiter_id, Mitarbeiter.name)
+        .outerjoin(Kunde, Kunde.id == Termin.kunde_id)
+        .outerjoin(Mitarbeiter, Mitarbeiter.id == Termin.mitarbeiter_id)
+        .where(where)
+        .order_by(Termin.start_ts, Termin.id)
+    ).all()
+    items: Dict[int, dict] = {}
+    for tid, start, ende, zustand, bemerkung, kid, kunde, mid, mitarbeiter in rows:
+        items[tid] = {
+            "id": tid, "start": start.isoformat(), "ende": ende.isoformat(),
+            "zustand": zustand, "bemerkung": bemerkung,
+            "kunde_id": kid, "kunde": kunde, "mitarbeiter_id": mid, "mitarbeiter": mitarbeiter,
+            "services": [], "positionen": [],
+            "_start": start, "_ende": ende,
+        }
+    if items:
+        lines = db.execute(
+            select(TerminService.termin_id, TerminService.service_id, Service.name,
+                   Service.dauer_min, TerminService.preis_override, Service.basispreis)
+            .join(Termin, Termin.id == TerminService.termin_id)
+            .join(Service, Service.id == TerminService.service_id)
+            .where(where)
+            .order_by(TerminService.termin_id, Service.name)
+        ).all()
+        for tid, sid, name, dauer, override, basis in lines:
+            it = items.get(tid)
+            if it is None:
+                continue
+            preis = override if override is not None else basis
+            it["services"].append(name)
+            it["positionen"].append({
+                "service_id": sid, "name": name, "dauer_min": dauer,
+                "preis": float(preis) if preis is not None else None,
+            })
+    return list(items.values())
+
+
+def _check_stamp() -> int:
+    """Leert den Cache, wenn ein anderer Prozess Termine geaendert hat; liefert die Generation."""
+    global _cache_stamp, _generation
+    current = shared_state.stamp(STATE_NAME)
+    with _lock:
+        if current != _cache_stamp:
+            _cache.clear()
+            _cache_stamp = current
+            _generation += 1
+        return _generation
+
+
+def termine_range(db: Session, von: date, bis: date, mitarbeiter_id: Optional[int] = None) -> List[dict]:
+    """
+    Termine der Tage von..bis (bis exklusiv), optional eines Mitarbeiters.
+    Fehlende Tage werden gemeinsam in einer Abfrage-Runde geladen. Die Eintraege
+    stammen aus dem Cache und duerfen vom Aufrufer nicht veraendert werden.
+    """
+    days = [von + timedelta(days=i) for i in range((bis - von).days)]
+    gen = _check_stamp()
+    with _lock:
+        cached = {d: _cache.get((d, mitarbeiter_id)) for d in days}
+    missing = [d for d, v in cached.items() if v is None]
+    if missing:
+        lo = datetime.combine(missing[0], time.min)
+        hi = datetime.combine(missing[-1] + timedelta(days=1), time.min)
+        loaded = _load(db, lo, hi, mitarbeiter_id)
+        for d in missing:
+            d0 = datetime.combine(d, time.min)
+            d1 = d0 + timedelta(days=1)
+            cached[d] = [it for it in loaded if it["_start"] < d1 and it["_ende"] > d0]
+        with _lock:
+            if gen == _generation:            # waehrenddessen nichts geaendert
+                for d in missing:
+                    _cache[(d, mitarbeiter_id)] = cached[d]
+                    _cache.move_to_end((d, mitarbeiter_id))
+                while len(_cache) > CACHE_SIZE:
+                    _cache.popitem(last=False)
+    out: List[dict] = []
+    seen = set()
+    for d in days:
+        for it in cached[d]:
+            if it["id"] not in seen:          # Termine ueber Mitternacht nur einmal
+                seen.add(it["id"])
+                out.append(it)
+    if len(days) > 1:
+        out.sort(key=lambda it: (it["_start"], it["id"]))
+    return out
+
+
+def termine_day(db: Session, tag: date, mitarbeiter_id: Optional[int] = None) -> List[dict]:
+    return termine_range(db, tag, tag + timedelta(days=1), mitarbeiter_id)
+
+
+def termine_week(db: Session, tag: date, mitarbeiter_id: Optional[int] = None) -> List[dict]:
+    """Woche (Montag bis Sonntag), die `tag` enthaelt."""
+    monday = tag - timedelta(days=tag.weekday())
+    return termine_range(db, monday, monday + timedelta(days=7), mitarbeiter_id)
+
+
+def public(items: List[dict]) -> List[dict]:
+    """Eintraege ohne interne Felder (fuer JSON)."""
+    return [{k: v for k, v in it.items() if not k.startswith("_")} for it in items]
+
+
+def invalidate_termine() -> None:
+    """Nach Termin-Aenderungen ausserhalb des ORM (Core-UPDATE, Import) aufrufen."""
+    global _generation
+    with _lock:
+        _cache.clear()
+        _generation += 1
+    shared_state.bump(STATE_NAME)
+
+
+# Schreibzugriffe ueber das ORM: beim Flush merken, nach Commit invalidieren.
+# Termine und Service-Zeilen bei jeder Aenderung; die mitgeladenen Stammdaten nur,
+# wenn ein Feld der Kalender-Antwort betroffen ist (Kunde.punkte aendert sich bei
+# jedem Checkout). Neue Stammdaten kommen in keinem gecachten Termin vor.
+_TRACKED = (Termin, TerminService)
+_JOINED_FIELDS = {
+    Kunde: ("name",),
+    Mitarbeiter: ("name",),
+    Service: ("name", "dauer_min", "basispreis"),
+}
+
+
+def _joined_changed(obj) -> bool:
+    fields = _JOINED_FIELDS.get(type(obj), ())
+    attrs = sa_inspect(obj).attrs
+    return any(attrs[f].history.has_changes() for f in fields)
+
+
+@event.listens_for(Session, "after_flush")
+def _termine_flushed(session: Session, _ctx) -> None:
+    changed = (
+        any(isinstance(obj, _TRACKED) for obj in session.new)
+        or any(isinstance(obj, _TRACKED) or type(obj) in _JOINED_FIELDS for obj in session.deleted)
+        or any(isinstance(obj, _TRACKED) or _joined_changed(obj) for obj in session.dirty)
+    )
+    if changed:
+        session.info["termine_geaendert"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _termine_committed(session: Session) -> None:
+    if session.info.pop("termine_geaendert", False):
+        invalidate_termine()
+
+
+@event.listens_for(Session, "after_rollback")
+def _termine_rolled_back(session: Session) -> None:
+    session.info.pop("termine_geaendert", None)
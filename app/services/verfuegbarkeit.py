@@ -0,0 +1,307 @@
+# kassensystem_basic/app/services/verfuegbarkeit.py
+from __future__ import annotations
+
+import json
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+from sqlalchemy import event, func, inspect as sa_inspect, select
+from sqlalchemy.orm import Session
+
+from app.config import settings as app_settings
+from app.models.entities import Mitarbeiter, Termin
+from app.services import shared_state
+from app.services.termine import overlap_filter
+
+# -----------------------------------------------------------------------------
+# Freie Termine.
+# Ein Tag ist eine Bitmap (int) aus Bloecken zu TERMIN_RASTER_MIN Minuten:
+# Bit i = Block i frei. Je Mitarbeiter wird die Verfuegbarkeit (Wochenplan +
+# Ausnahmen) einmal kompiliert, die Belegung durch Termine je (Tag, Mitarbeiter)
+# einmal geladen. Freie Startzeiten fuer k Bloecke sind dann reine Bit-Operationen
+# (verfuegbar & ~belegt, k-fach verschoben und verundet).
+# Buchungen werden nach Commit direkt in die Bitmaps eingetragen, Aenderungen und
+# Stornos laden nur die betroffenen Tage neu. Andere Worker-Prozesse erkennen
+# Aenderungen am shared_state-Stempel und beginnen neu.
+# -----------------------------------------------------------------------------
+STATE_NAME = "verfuegbarkeit"
+FREIE_ZUSTAENDE = frozenset({"storniert", "abgesagt"})   # blockieren keinen Slot
+
+RASTER = app_settings.TERMIN_RASTER_MIN
+BLOECKE = 24 * 60 // RASTER
+_SCHRITT = max(1, app_settings.TERMIN_SLOT_SCHRITT_MIN // RASTER)
+_STARTRASTER = sum(1 << i for i in range(0, BLOECKE, _SCHRITT))
+
+_WOCHENTAGE = {"mo": 0, "di": 1, "mi": 2, "do": 3, "fr": 4, "sa": 5, "so": 6}
+
+
+def _bits(lo: int, hi: int) -> int:
+    """Bloecke lo..hi-1 gesetzt."""
+    lo, hi = max(0, lo), min(BLOECKE, hi)
+    return ((1 << (hi - lo)) - 1) << lo if hi > lo else 0
+
+
+def _minutes(hhmm: str) -> int:
+    h, _, m = str(hhmm).strip().partition(":")
+    return int(h) * 60 + int(m or 0)
+
+
+def _spans_to_bits(spans) -> int:
+    """[["08:00", "12:00"], "13:00-18:00", ...] -> Bitmap (nach innen auf das Raster gerundet)."""
+    out = 0
+    for span in spans or ():
+        von, bis = span.split("-") if isinstance(span, str) else span
+        out |= _bits(-(-_minutes(von) // RASTER), _minutes(bis) // RASTER)
+    return out
+
+
+@dataclass(frozen=True)
+class Wochenplan:
+    """Kompilierte Verfuegbarkeit: Bitmap je Wochentag (Mo=0) plus Ausnahmen je Datum."""
+    tage: Tuple[int, ...]
+    ausnahmen: Mapping[date, int]
+
+    def bits(self, tag: date) -> int:
+        b = self.ausnahmen.get(tag)
+        return self.tage[tag.weekday()] if b is None else b
+
+
+def _compile(data: Mapping) -> Wochenplan:
+    tage = [0] * 7
+    ausnahmen: Dict[date, int] = {}
+    for key, spans in data.items():
+        k = str(key).strip().lower()
+        if k == "ausnahmen":
+            for tag, sp in (spans or {}).items():
+                ausnahmen[date.fromisoformat(tag)] = _spans_to_bits(sp)
+        elif k[:2] in _WOCHENTAGE:            # "mo", "montag", ...
+            tage[_WOCHENTAGE[k[:2]]] = _spans_to_bits(spans)
+        elif k.isdigit() and int(k) < 7:      # 0 = Montag
+            tage[int(k)] = _spans_to_bits(spans)
+    return Wochenplan(tuple(tage), MappingProxyType(ausnahmen))
+
+
+_STANDARD = _compile(app_settings.VERFUEGBARKEIT_STANDARD)
+
+
+def parse_verfuegbarkeit(raw) -> Wochenplan:
+    """
+    Mitarbeiter.verfuegbarkeit (JSON-Text oder dict) -> Wochenplan.
+    Format: {"mo": [["08:00", "12:00"], ["13:00", "18:00"]], ..., "so": [],
+             "ausnahmen": {"2025-12-24": [["08:00", "12:00"]], "2025-12-25": []}}
+    Leer oder ungueltig -> VERFUEGBARKEIT_STANDARD.
+    """
+    data = raw
+    if isinstance(raw, (str, bytes)):
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            data = None
+    if not isinstance(data, dict) or not data:
+        return _STANDARD
+    try:
+        return _compile(data)
+    except (TypeError, ValueError, AttributeError):
+        return _STANDARD
+
+
+def _run_starts(free: int, k: int) -> int:
+    """Bit i gesetzt, wenn die Bloecke i..i+k-1 alle frei sind (Verdopplung: O(log k))."""
+    run = 1
+    while run < k and free:
+        step = min(run, k - run)
+        free &= free >> step
+        run += step
+    return free
+
+
+def _days(start: datetime, ende: datetime) -> Iterator[date]:
+    d = start.date()
+    while datetime.combine(d, time.min) < ende:
+        yield d
+        d += timedelta(days=1)
+
+
+def _busy_bits(start: datetime, ende: datetime, tag: date) -> int:
+    """Belegung eines Termins an `tag` (nach aussen auf das Raster gerundet)."""
+    d0 = datetime.combine(tag, time.min)
+    lo = (start - d0) // timedelta(minutes=RASTER)
+    hi = -(-(ende - d0) // timedelta(minutes=RASTER))
+    return _bits(lo, hi)
+
+
+# --------------------------- Prozess-Zustand ---------------------------------
+_lock = threading.Lock()
+_plaene: Optional[Dict[int, Tuple[str, Wochenplan]]] = None   # aktive Mitarbeiter
+_belegt: Dict[date, Dict[int, int]] = {}                       # Tag -> {Mitarbeiter: Bitmap}
+_seen: shared_state.Stamp = None
+
+
+def _reset() -> None:
+    global _plaene
+    _plaene = None
+    _belegt.clear()
+
+
+def _sync() -> None:
+    # unter _lock: fremde Aenderung (anderer Prozess) -> alles neu
+    global _seen
+    current = shared_state.stamp(STATE_NAME)
+    if current != _seen:
+        _reset()
+        _seen = current
+
+
+def _load_plaene(db: Session) -> Dict[int, Tuple[str, Wochenplan]]:
+    rows = db.execute(
+        select(Mitarbeiter.id, Mitarbeiter.name, Mitarbeiter.verfuegbarkeit)
+        .where(func.coalesce(Mitarbeiter.aktiv, 1) == 1)
+    )
+    return {mid: (name, parse_verfuegbarkeit(raw)) for mid, name, raw in rows}
+
+
+def _load_belegt(db: Session, tage: List[date]) -> None:
+    """Belegung aller Mitarbeiter fuer `tage` in einer Abfrage."""
+    wanted = set(tage)
+    fresh: Dict[date, Dict[int, int]] = {d: {} for d in tage}
+    von = datetime.combine(min(tage), time.min)
+    bis = datetime.combine(max(tage) + timedelta(days=1), time.min)
+    rows = db.execute(
+        select(Termin.mitarbeiter_id, Termin.start_ts, Termin.ende_ts)
+        .where(overlap_filter(von, bis, None),
+               Termin.mitarbeiter_id.is_not(None),
+               Termin.zustand.not_in(FREIE_ZUSTAENDE))
+    )
+    for mid, start, ende in rows:
+        for d in _days(start, ende):
+            if d in wanted:
+                day = fresh[d]
+                day[mid] = day.get(mid, 0) | _busy_bits(start, ende, d)
+    _belegt.update(fresh)
+
+
+def freie_slots(db: Session, dauer_min: int, anzahl: int = 10, ab: Optional[datetime] = None,
+                tage: Optional[int] = None, mitarbeiter_id: Optional[int] = None) -> List[dict]:
+    """
+    Die ersten `anzahl` freien Startzeiten fuer `dauer_min` Minuten ab `ab`
+    (Standard: jetzt) in den naechsten `tage` Tagen, ueber alle aktiven
+    Mitarbeiter (oder nur `mitarbeiter_id`), chronologisch sortiert.
+    """
+    global _plaene
+    ab = ab or datetime.now()
+    tage = app_settings.TERMIN_SUCHE_TAGE if tage is None else tage
+    k = max(1, -(-int(dauer_min) // RASTER))
+    days = [ab.date() + timedelta(days=i) for i in range(max(0, tage))]
+    out: List[dict] = []
+    if not days or anzahl <= 0:
+        return out
+    with _lock:
+        _sync()
+        if _plaene is None:
+            _plaene = _load_plaene(db)
+        missing = [d for d in days if d not in _belegt]
+        if missing:
+            for d in [d for d in _belegt if d < days[0]]:
+                del _belegt[d]                 # Vergangenes nicht ewig halten
+            _load_belegt(db, missing)
+        plaene = _plaene
+        belegt = {d: dict(_belegt[d]) for d in days}
+    first_block = -(-(ab - datetime.combine(ab.date(), time.min)) // timedelta(minutes=RASTER))
+    for d in days:
+        not_before = ~_bits(0, first_block) if d == ab.date() else -1
+        kandidaten: List[Tuple[int, int]] = []
+        for mid, (_name, plan) in plaene.items():
+            if mitarbeiter_id is not None and mid != mitarbeiter_id:
+                continue
+            free = plan.bits(d) & ~belegt[d].get(mid, 0)
+            starts = _run_starts(free, k) & _STARTRASTER & not_before if free else 0
+            while starts:
+                low = starts & -starts
+                kandidaten.append((low.bit_length() - 1, mid))
+                starts ^= low
+        kandidaten.sort()
+        d0 = datetime.combine(d, time.min)
+        for block, mid in kandidaten:
+            start = d0 + timedelta(minutes=block * RASTER)
+            out.append({
+                "start": start.isoformat(), "ende": (start + timedelta(minutes=int(dauer_min))).isoformat(),
+                "mitarbeiter_id": mid, "mitarbeiter": plaene[mid][0],
+            })
+            if len(out) >= anzahl:
+                return out
+    return out
+
+
+def invalidate_verfuegbarkeit() -> None:
+    """Nach Aenderungen ausserhalb des ORM (Core-UPDATE, Import) aufrufen."""
+    global _seen
+    with _lock:
+        _reset()
+        _seen = shared_state.bump(STATE_NAME)
+
+
+def _apply(ops: List[tuple]) -> None:
+    """Nach Commit: Buchungen eintragen, geaenderte Tage/Mitarbeiter verwerfen."""
+    global _seen, _plaene
+    with _lock:
+        if shared_state.stamp(STATE_NAME) != _seen:
+            _reset()                           # fremde Aenderung verpasst -> neu
+        else:
+            for op in ops:
+                if op[0] == "neu":
+                    _, mid, start, ende = op
+                    for d in _days(start, ende):
+                        day = _belegt.get(d)
+                        if day is not None:
+                            day[mid] = day.get(mid, 0) | _busy_bits(start, ende, d)
+                elif op[0] == "tage":
+                    for d in op[1]:
+                        _belegt.pop(d, None)
+                else:                          # Mitarbeiter geaendert
+                    _plaene = None
+        _seen = shared_state.bump(STATE_NAME)
+
+
+def _changed_days(obj: Termin) -> set:
+    # alte und neue Werte (Verschieben, Storno, Loeschen)
+    state = sa_inspect(obj)
+    starts, enden = [], []
+    for attr, vals in (("start_ts", starts), ("ende_ts", enden)):
+        h = state.attrs[attr].history
+        vals.extend(v for v in (*h.added, *h.unchanged, *h.deleted) if v is not None)
+    if not starts or not enden:
+        return set()
+    return set(_days(min(starts), max(enden)))
+
+
+@event.listens_for(Session, "after_flush")
+def _verfuegbarkeit_flushed(session: Session, _ctx) -> None:
+    ops = []
+    for obj in session.new:
+        if isinstance(obj, Termin):
+            if obj.mitarbeiter_id is not None and obj.zustand not in FREIE_ZUSTAENDE:
+                ops.append(("neu", obj.mitarbeiter_id, obj.start_ts, obj.ende_ts))
+        elif isinstance(obj, Mitarbeiter):
+            ops.append(("mitarbeiter",))
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, Termin):
+            ops.append(("tage", _changed_days(obj)))
+        elif isinstance(obj, Mitarbeiter):
+            ops.append(("mitarbeiter",))
+    if ops:
+        session.info.setdefault("verfuegbarkeit", []).extend(ops)
+
+
+@event.listens_for(Session, "after_commit")
+def _verfuegbarkeit_committed(session: Session) -> None:
+    ops = session.info.pop("verfuegbarkeit", None)
+    if ops:
+        _apply(ops)
+
+
+@event.listens_for(Session, "after_rollback")
+def _verfuegbarkeit_rolled_back(session: Session) -> None:
+    session.info.pop("verfuegbarkeit", None)
@@ -0,0 +1,122 @@
+# bench_auth.py
+"""
+Auth-Benchmarks fuer app/services/auth.py (Temp-DB, siehe bench_common.workdir).
+
+    python bench_auth.py login                       # Login-Durchsatz, Event-Loop-Verzoegerung
+    python bench_auth.py login --logins 4
+    python bench_auth.py request -n 20000            # Auth-Overhead je Request
+
+login: N gleichzeitige Logins (PBKDF2, 310'000 Iterationen) in einem Event-Loop,
+daneben ein Takt alle 5 ms, dessen Verspaetung zeigt, wie lange der Loop
+blockiert war. "vorher" prueft das Passwort direkt im Handler
+(authenticate_user), "nachher" im Hash-Pool (verify_password_async,
+AUTH_HASH_WORKERS Threads).
+
+request: get_current_user je Request; "vorher" mit einer users-Abfrage je
+Aufruf (AUTH_USER_CACHE_TTL = 0), "nachher" aus dem Benutzer-Cache.
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+import bench_common
+
+PASSWORD = "bench1234"
+
+
+def _setup(users: int):
+    from app.models import base
+    import app.models.user  # noqa: F401
+    from app.models.user import User
+    from app.services import auth
+    base.Base.metadata.create_all(bind=base.engine)
+    stored = auth.hash_password(PASSWORD)
+    with base.SessionLocal() as db:
+        db.add_all([User(email=f"user{i}@example.com", full_name=f"User {i}", password_hash=stored,
+                         role="Mitarbeiter", is_active=True) for i in range(users)])
+        db.commit()
+        ids = [u.id for u in db.query(User).order_by(User.id)]
+    return base, auth, ids
+
+
+async def _login_round(base, login, n: int):
+    lag, done = [], asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag.append(max(0.0, time.perf_counter() - t0 - 0.005))
+
+    async def one(i: int):
+        with base.SessionLocal() as db:
+            user = await login(db, f"user{i}@example.com", PASSWORD)
+            assert user is not None
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.02)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    wall = time.perf_counter() - t0
+    done.set()
+    await tick
+    return wall, lag
+
+
+def cmd_login(args) -> None:
+    from app.config import settings as app_settings
+    base, auth, _ = _setup(args.logins)
+
+    from app.models.user import User
+
+    async def inline(db, email, password):
+        return auth.authenticate_user(db, email, password)
+
+    async def pooled(db, email, password):
+        user = db.query(User).filter(User.email == email, User.is_active == True).first()  # noqa: E712
+        if user and await auth.verify_password_async(password, user.password_hash):
+            return user
+        return None
+
+    print(f"{args.logins} gleichzeitige Logins, Hash-Pool: {app_settings.AUTH_HASH_WORKERS} Threads")
+    for label, login in (("vorher (im Handler)", inline), ("nachher (Hash-Pool)", pooled)):
+        wall, lag = asyncio.run(_login_round(base, login, args.logins))
+        print(f"{label:<24} {args.logins / wall:6.2f} Logins/s   "
+              f"Loop-Verzoegerung max {max(lag) * 1e3:8.1f} ms")
+
+
+def cmd_request(args) -> None:
+    from app.config import settings as app_settings
+    base, auth, ids = _setup(50)
+    requests = [SimpleNamespace(session={auth.SESSION_USER_ID: uid}) for uid in ids]
+    it = iter(range(1 << 62))
+
+    def call():
+        req = requests[next(it) % len(requests)]
+        with base.SessionLocal() as db:
+            assert auth.get_current_user(req, db) is not None
+
+    ttl = app_settings.AUTH_USER_CACHE_TTL or 30
+    for label, value in (("vorher (Abfrage je Request)", 0), ("nachher (Cache)", ttl)):
+        app_settings.AUTH_USER_CACHE_TTL = value
+        print(bench_common.fmt(label, bench_common.summary(bench_common.measure(call, args.requests, 100)), 30))
+
+
+def main(argv=None) -> None:
+    p = argparse.ArgumentParser(description="Auth-Benchmarks (Temp-DB)")
+    p.add_argument("--workdir", help="Arbeitsverzeichnis (Standard: neues Temp-Verzeichnis)")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    login = sub.add_parser("login", help="Login-Durchsatz und Loop-Verzoegerung")
+    login.add_argument("--logins", type=int, default=12, help="max. 15 (Pool-Groesse der Engine)")
+    login.set_defaults(fn=cmd_login)
+    req = sub.add_parser("request", help="Auth-Overhead je Request")
+    req.add_argument("-n", "--requests", type=int, default=20000)
+    req.set_defaults(fn=cmd_request)
+    args = p.parse_args(argv)
+    bench_common.workdir(args.workdir)
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+# bench_checkout.py
+"""
+Checkout-Benchmarks fuer /pos/checkout (main.py), in einem Temp-Verzeichnis
+mit geseedetem Katalog (siehe bench_common.workdir).
+
+    python bench_checkout.py latency                 # Latenz je Warenkorbgroesse, vorher/nachher
+    python bench_checkout.py latency --sizes 1 20 50 -n 300
+    python bench_checkout.py load                    # N parallele Kassen, p99 vorher/nachher
+    python bench_checkout.py load --tills 32 --per-till 20
+    python bench_checkout.py service                 # process_checkout (app/services/checkout.py), vorher/nachher
+    python bench_checkout.py service --sizes 1 10 50 100 -n 300
+
+latency: misst je Warenkorbgroesse das Aufloesen des Warenkorbs allein und den
+ganzen _checkout_sync (Aufloesen, Validieren, Schreiben, Commit). "vorher" loest
+wie frueher jede Zeile mit einem eigenen get() auf, "nachher" mit _load_catalog
+(eine IN-Abfrage je Typ).
+
+load: N Kassen schicken gleichzeitig Checkouts per HTTP an einen uvicorn-Worker
+(Hintergrund-Thread, 127.0.0.1); daneben fragt ein Client laufend /pos/katalog ab. "vorher" fuehrt die DB-Arbeit der async-Handler wie frueher
+direkt im Event-Loop aus, "nachher" ueber run_db im begrenzten Threadpool.
+
+service: process_checkout der app/-Modelle (db/kassensystem.db) mit 1/10/50
+Zeilen. "vorher" bildet den frueheren Ablauf nach: db.get() je Zeile zum
+Pruefen, Felder je Position/Zahlung per hasattr() zuordnen, ORM-Objekte einzeln
+anlegen, db.get() je Produktzeile fuer den Lagerabzug. Anders als damals
+(Spaltennamen passten nicht zum Schema, nichts wurde gespeichert) verbucht er
+den Beleg vollstaendig, damit beide Varianten dieselbe Arbeit tun. "nachher"
+ist process_checkout: Katalog mit einer IN-Abfrage je Typ, Sammel-INSERTs, ein
+bedingtes UPDATE je Produkt. SQL/Beleg zaehlt die Statements je Checkout.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import bench_common
+
+
+def _seed(main, services: int, produkte: int) -> None:
+    with main.SessionLocal() as db:
+        db.add_all([main.Service(name=f"Service {i}", basispreis_rp=1000 + i * 5, basispreis=0.0,
+                                 steuer_code="S1", warengruppe="DL", aktiv=1) for i in range(services)])
+        db.add_all([main.Produkt(name=f"Produkt {i}", verkaufspreis_rp=500 + i * 5, verkaufspreis=0.0,
+                                 steuer_code="S1", warengruppe="PR", aktiv=1, lagerbestand=None)
+                    for i in range(produkte)])
+        db.commit()
+
+
+def _load_catalog_per_row(db, rows):
+    # frueheres Verhalten: eine Abfrage je Warenkorbzeile
+    main = _load_catalog_per_row.main
+    services, produkte = {}, {}
+    for t, iid, _ in rows:
+        if t == "service":
+            services[iid] = db.query(main.Service).get(iid)
+        else:
+            produkte[iid] = db.query(main.Produkt).get(iid)
+    return services, produkte
+
+
+def _cart(main, size: int, rnd: random.Random):
+    with main.SessionLocal() as db:
+        sids = [r for (r,) in db.query(main.Service.id)]
+        pids = [r for (r,) in db.query(main.Produkt.id)]
+    picked = [("service", i) for i in rnd.sample(sids, size // 2)] + \
+             [("produkt", i) for i in rnd.sample(pids, size - size // 2)]
+    items = [{"type": t, "id": i, "qty": 1} for t, i in picked]
+    with main.SessionLocal() as db:
+        services, produkte = main._load_catalog(db, [(t, i, 1) for t, i in picked])
+    total = sum((services[i].basispreis_rp if t == "service" else produkte[i].verkaufspreis_rp) for t, i in picked)
+    return items, {"method": "bar", "amounts": {"bar": total / 100}}
+
+
+def cmd_latency(args) -> None:
+    import main
+    _seed(main, args.catalog, args.catalog)
+    _load_catalog_per_row.main = main
+    rnd = random.Random(1)
+    current = main._load_catalog
+    print(f"Katalog: {args.catalog} Services + {args.catalog} Produkte, je Groesse {args.requests} Checkouts")
+    for size in args.sizes:
+        items, pay = _cart(main, size, rnd)
+        rows = [(it["type"], it["id"], it["qty"]) for it in items]
+
+        def resolve(loader):
+            with main.SessionLocal() as db:
+                loader(db, rows)
+
+        for label, loader in (("vorher (get je Zeile)", _load_catalog_per_row), ("nachher (IN je Typ)", current)):
+            s = bench_common.summary(bench_common.measure(lambda: resolve(loader), args.requests))
+            print(bench_common.fmt(f"{size:>3} Zeilen aufloesen {label}", s, 46))
+
+        def run():
+            with main.SessionLocal() as db:
+                resp = main._checkout_sync(db, items, pay)
+                assert resp.status_code == 200, resp.body
+
+        res = {}
+        for label, loader in (("vorher (get je Zeile)", _load_catalog_per_row), ("nachher (IN je Typ)", current)):
+            main._load_catalog = loader
+            try:
+                res[label] = bench_common.summary(bench_common.measure(run, args.requests))
+            finally:
+                main._load_catalog = current
+            print(bench_common.fmt(f"{size:>3} Zeilen Checkout  {label}", res[label], 46))
+
+
+async def _run_db_inline(fn, *args, pool: str = "db"):
+    # frueheres Verhalten: synchrone DB-Arbeit direkt im async-Handler
+    import main
+    with main.SessionLocal() as db:
+        return fn(db, *args)
+
+
+class _Server:
+    """uvicorn mit einem Worker in einem Hintergrund-Thread (eigener Event-Loop, echtes HTTP)."""
+
+    def __init__(self, app, port: int):
+        import threading
+        import uvicorn
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                                    lifespan="off"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.url = f"http://127.0.0.1:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+async def _load_round(url: str, carts, tills: int, per_till: int):
+    import httpx
+    checkout_lat, probe_lat = [], []
+    done = asyncio.Event()
+    limits = httpx.Limits(max_connections=tills + 1)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        async def till(n: int):
+            for i in range(per_till):
+                items, pay = carts[(n + i) % len(carts)]
+                t0 = time.perf_counter()
+                r = await client.post("/pos/checkout", json={"items": items, "payment": pay})
+                checkout_lat.append(time.perf_counter() - t0)
+                assert r.status_code == 200, r.text
+
+        async def probe():
+            while not done.is_set():
+                t0 = time.perf_counter()
+                r = await client.get("/pos/katalog")
+                probe_lat.append(time.perf_counter() - t0)
+                assert r.status_code == 200
+                await asyncio.sleep(0.005)
+
+        prober = asyncio.create_task(probe())
+        t0 = time.perf_counter()
+        await asyncio.gather(*(till(n) for n in range(tills)))
+        wall = time.perf_counter() - t0
+        done.set()
+        await prober
+    return checkout_lat, probe_lat, wall
+
+
+def cmd_load(args) -> None:
+    import main
+    _seed(main, args.catalog, args.catalog)
+    rnd = random.Random(5)
+    carts = [_cart(main, args.lines, rnd) for _ in range(16)]
+    current = main.run_db
+    total = args.tills * args.per_till
+    print(f"{args.tills} Kassen x {args.per_till} Checkouts ({args.lines} Zeilen), "
+          f"daneben laufend GET /pos/katalog")
+    for label, runner in (("vorher (im Event-Loop)", _run_db_inline), ("nachher (run_db/Threadpool)", current)):
+        main.run_db = runner
+        try:
+            with _Server(main.app, args.port) as srv:
+                asyncio.run(_load_round(srv.url, carts[:2], 2, 2))      # Aufwaermen
+                checkout_lat, probe_lat, wall = asyncio.run(_load_round(srv.url, carts, args.tills, args.per_till))
+        finally:
+            main.run_db = current
+        print(bench_common.fmt(f"Checkout {label}", bench_common.summary(checkout_lat), 44))
+        print(bench_common.fmt(f"Katalog  {label}", bench_common.summary(probe_lat), 44))
+        print(f"{'':<44} {total / wall:8.1f} Checkouts/s")
+
+
+TAX = "CH-8.1"
+
+
+def _first(obj, names, value) -> None:
+    for name in names:
+        if hasattr(obj, name):
+            setattr(obj, name, value)
+            return
+
+
+def _per_row_checkout(db, payload, current_user):
+    """Frueherer Ablauf von process_checkout (siehe Modul-Docstring), gekuerzt auf den Persistenzpfad."""
+    from datetime import datetime
+    from decimal import Decimal
+    from app.models.entities import Beleg, BelegPosition, Lagerbewegung, Produkt, Service, Zahlung
+    from app.services.checkout import _get_receipt_number
+    from app.services.tax_rates import load_tax_rates
+
+    rates = load_tax_rates(db)
+    lines = []
+    for row in payload["items"]:
+        kind, ref_id = ("service" if row["id"].startswith("s-") else "produkt"), int(row["id"][2:])
+        obj = db.get(Service if kind == "service" else Produkt, ref_id)
+        if not obj or (hasattr(obj, "aktiv") and not obj.aktiv):
+            raise ValueError("nicht (mehr) verfuegbar")
+        price, qty, code = Decimal(row["price"]), int(row["qty"]), obj.steuer_code
+        tax = (price * qty * rates.rate(code) / rates.divisor(code)).quantize(Decimal("0.01"))
+        lines.append((kind, ref_id, row["name"], price, qty, code, tax))
+    number = _get_receipt_number(db, payload.get("kassen_id") or "K1")
+
+    receipt = Beleg()
+    _first(receipt, ("belegnr", "nummer"), number)
+    _first(receipt, ("timestamp", "datum", "created_at"), datetime.now())
+    _first(receipt, ("summe_brutto", "brutto"), sum(l[3] * l[4] for l in lines))
+    _first(receipt, ("steuer_summe",), sum(l[6] for l in lines))
+    _first(receipt, ("steuer_json",), "{}")
+    _first(receipt, ("user_id",), getattr(current_user, "id", None))
+    db.add(receipt)
+    db.flush()
+
+    for kind, ref_id, name, price, qty, code, tax in lines:
+        pos = BelegPosition()
+        _first(pos, ("beleg_id",), receipt.id)
+        _first(pos, ("typ",), kind)
+        _first(pos, ("ref_id",), ref_id)
+        _first(pos, ("produkt_id" if kind == "produkt" else "service_id",), ref_id)
+        _first(pos, ("name",), name)
+        _first(pos, ("menge",), qty)
+        _first(pos, ("einzelpreis", "preis", "betrag"), price)
+        _first(pos, ("steuer_code",), code)
+        _first(pos, ("steuer_betrag",), tax)
+        _first(pos, ("gesamtpreis", "brutto"), price * qty)
+        db.add(pos)
+        if kind == "produkt":
+            p = db.get(Produkt, ref_id)
+            if p is not None and p.lagerbestand is not None:
+                p.lagerbestand = max(0, p.lagerbestand - qty)
+                db.add(Lagerbewegung(produkt_id=p.id, beleg_id=receipt.id, menge=-qty,
+                                     bestand_nach=p.lagerbestand, grund="verkauf"))
+
+    for pay in payload.get("payment") or []:
+        z = Zahlung()
+        _first(z, ("beleg_id",), receipt.id)
+        _first(z, ("art", "methode"), (pay.get("method") or "BAR").lower())
+        _first(z, ("betrag", "amount", "wert"), Decimal(pay.get("amount")))
+        db.add(z)
+    db.commit()
+    return {"ok": True, "receipt_number": number, "receipt_id": receipt.id}
+
+
+def cmd_service(args) -> None:
+    from decimal import Decimal
+    from types import SimpleNamespace
+    from sqlalchemy import event, func, select
+    from app.models import base
+    from app.models.entities import Beleg, Produkt, Service
+    import app.models.user  # noqa: F401  (FK-Ziele fuer create_all)
+    from app.services.checkout import process_checkout
+
+    base.Base.metadata.create_all(bind=base.engine)
+    catalog = max(60, max(args.sizes))
+    with base.SessionLocal() as db:
+        db.add_all([Service(name=f"Service {i}", dauer_min=30, basispreis=Decimal("45.00") + i,
+                            steuer_code=TAX, aktiv=1) for i in range(catalog)])
+        db.add_all([Produkt(name=f"Produkt {i}", verkaufspreis=Decimal("12.50") + i, steuer_code=TAX,
+                            lagerbestand=10 ** 7, aktiv=1) for i in range(catalog)])
+        db.commit()
+
+    statements = [0]
+    event.listen(base.engine, "before_cursor_execute", lambda *a: statements.__setitem__(0, statements[0] + 1))
+    user = SimpleNamespace(id=None, role="kasse")
+    for size in args.sizes:
+        with base.SessionLocal() as db:
+            services = db.scalars(select(Service).order_by(Service.id).limit(size - size // 2)).all()
+            produkte = db.scalars(select(Produkt).order_by(Produkt.id).limit(size // 2)).all()
+        items = [{"type": "service", "id": f"s-{x.id}", "name": x.name, "price": str(x.basispreis), "qty": 1,
+                  "tax": TAX} for x in services]
+        items += [{"type": "produkt", "id": f"p-{x.id}", "name": x.name, "price": str(x.verkaufspreis), "qty": 2,
+                   "tax": TAX} for x in produkte]
+        total = sum(Decimal(it["price"]) * it["qty"] for it in items)
+        payload = {"items": items, "payment": [{"method": "bar", "amount": str(total)}], "kassen_id": "K1"}
+
+        for label, fn in (("vorher (je Zeile)", _per_row_checkout), ("nachher (process_checkout)", process_checkout)):
+            def run():
+                with base.SessionLocal() as db:
+                    assert fn(db, payload, user)["receipt_id"] is not None
+
+            with base.SessionLocal() as db:
+                before = db.scalar(select(func.count(Beleg.id)))
+            statements[0] = 0
+            lat = bench_common.measure(run, args.requests)
+            per_receipt = statements[0] / (args.requests + 3)
+            with base.SessionLocal() as db:
+                stored = db.scalar(select(func.count(Beleg.id))) - before
+            print(bench_common.fmt(f"{size:>3} Zeilen {label}", bench_common.summary(lat), 40)
+                  + f"  SQL/Beleg {per_receipt:5.1f}  verbucht {stored}/{args.requests + 3}")
+
+
+def main(argv=None) -> None:
+    p = argparse.ArgumentParser(description="Checkout-Benchmarks (Temp-DB)")
+    p.add_argument("--workdir", help="Arbeitsverzeichnis (Standard: neues Temp-Verzeichnis)")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    lat = sub.add_parser("latency", help="Latenz je Warenkorbgroesse, vorher/nachher")
+    lat.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 10, 20, 50])
+    lat.add_argument("--catalog", type=int, default=200, help="Services und Produkte je")
+    lat.add_argument("-n", "--requests", type=int, default=200)
+    lat.set_defaults(fn=cmd_latency)
+    load = sub.add_parser("load", help="N parallele Kassen, p99 vorher/nachher")
+    load.add_argument("--tills", type=int, default=16, help="gleichzeitige Kassen")
+    load.add_argument("--per-till", type=int, default=25, help="Checkouts je Kasse")
+    load.add_argument("--lines", type=int, default=10, help="Zeilen je Warenkorb")
+    load.add_argument("--catalog", type=int, default=200, help="Services und Produkte je")
+    load.add_argument("--port", type=int, default=8765)
+    load.set_defaults(fn=cmd_load)
+    svc = sub.add_parser("service", help="process_checkout (app/-Modelle) mit 1/10/50 Zeilen, vorher/nachher")
+    svc.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50])
+    svc.add_argument("-n", "--requests", type=int, default=200)
+    svc.set_defaults(fn=cmd_service)
+    args = p.parse_args(argv)
+    bench_common.workdir(args.workdir)
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# bench_common.py
+"""
+Gemeinsame Hilfen fuer die bench_*.py-Skripte.
+
+Die Benchmarks laufen in einem eigenen Arbeitsverzeichnis mit frischen DBs
+(app/data/app.db, db/kassensystem.db), damit geseedete Daten nie in der echten
+Kasse landen. workdir() muss vor dem ersten Import von main bzw.
+app.models.base aufgerufen werden – beide legen ihre Engines relativ zum
+Arbeitsverzeichnis an.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent
+
+
+def workdir(path: Optional[str] = None) -> Path:
+    """Wechselt in `path` (Standard: neues Temp-Verzeichnis); static/templates werden verlinkt."""
+    base = Path(path) if path else Path(tempfile.mkdtemp(prefix="ksb-bench-"))
+    (base / "app" / "data").mkdir(parents=True, exist_ok=True)
+    (base / "db").mkdir(exist_ok=True)
+    for sub in ("static", "templates"):
+        link = base / "app" / sub
+        if not link.exists():
+            link.symlink_to(ROOT / "app" / sub, target_is_directory=True)
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    os.chdir(base)
+    return base
+
+
+def measure(fn: Callable[[], object], n: int, warmup: int = 3) -> List[float]:
+    """n Aufrufe von fn, Laufzeiten in Sekunden (sortiert)."""
+    for _ in range(warmup):
+        fn()
+    out = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    out.sort()
+    return out
+
+
+def summary(latencies: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 in Millisekunden."""
+    lat = sorted(latencies)
+    pick = lambda q: lat[min(len(lat) - 1, int(len(lat) * q))] * 1e3
+    return {"p50": statistics.median(lat) * 1e3, "p95": pick(0.95), "p99": pick(0.99), "n": len(lat)}
+
+
+def fmt(label: str, s: Dict[str, float], width: int = 28) -> str:
+    return (f"{label:<{width}} p50 {s['p50']:8.3f} ms  p95 {s['p95']:8.3f} ms  "
+            f"p99 {s['p99']:8.3f} ms  (n={s['n']})")
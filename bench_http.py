@@ -0,0 +1,142 @@
+# bench_http.py
+"""
+HTTP-Mikrobenchmark fuer die App – ruft die ASGI-App direkt im Prozess auf
+(ohne Socket/uvicorn), misst also Routing, Middleware und Handler.
+
+Beispiele:
+    python bench_http.py                                  # /pos und /static/css/main.css
+    python bench_http.py /pos /katalog -n 5000 -c 8
+    python bench_http.py --compare CatalogAliasMiddleware # Overhead einer Middleware
+
+--compare NAME misst jeden Pfad einmal mit dem normalen Middleware-Stack und
+einmal ohne die genannte Middleware und gibt die Differenz pro Request aus.
+Mit --rounds laufen die Varianten abwechselnd mehrfach; gemeldet wird jeweils
+die beste Runde (weniger Rauschen durch Reihenfolge/GC).
+Startup-Events laufen nicht; benoetigt nur importierbares main.py + DB.
+"""
+import argparse
+import asyncio
+import importlib
+import statistics
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_PATHS = ("/pos", "/static/css/main.css")
+
+
+def _load_app(spec: str):
+    mod, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(mod), attr or "app")
+
+
+def _scope(path: str, headers: Iterable[Tuple[str, str]]) -> dict:
+    path, _, query = path.partition("?")
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": query.encode(),
+        "headers": [(b"host", b"bench")] + [(k.lower().encode(), v.encode()) for k, v in headers],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+
+
+async def _one(app, scope: dict) -> Tuple[int, float]:
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    t0 = time.perf_counter()
+    await app(dict(scope), receive, send)
+    return status, time.perf_counter() - t0
+
+
+async def _run(app, path: str, n: int, concurrency: int, warmup: int,
+               headers: List[Tuple[str, str]]) -> Dict[str, object]:
+    scope = _scope(path, headers)
+    for _ in range(warmup):
+        await _one(app, scope)
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    per_worker = [n // concurrency + (1 if i < n % concurrency else 0) for i in range(concurrency)]
+
+    async def worker(count: int):
+        for _ in range(count):
+            st, dt = await _one(app, scope)
+            statuses[st] += 1
+            latencies.append(dt)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(c) for c in per_worker))
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "path": path, "n": n, "rps": n / wall if wall else 0.0,
+        "p50_us": statistics.median(latencies) * 1e6,
+        "p99_us": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6,
+        "status": dict(statuses),
+    }
+
+
+def _without_middleware(app, name: str):
+    """Dieselbe App mit neu aufgebautem Stack ohne die Middleware `name`."""
+    kept = [m for m in app.user_middleware if getattr(m.cls, "__name__", "") != name]
+    if len(kept) == len(app.user_middleware):
+        raise SystemExit(f"Middleware {name!r} nicht gefunden")
+    original, app.user_middleware = app.user_middleware, kept
+    app.middleware_stack = None
+    stack = app.build_middleware_stack()
+    app.user_middleware = original
+    app.middleware_stack = None
+    return stack
+
+
+def _print(label: str, r: Dict[str, object]) -> None:
+    print(f"{label:<10} {r['path']:<28} {r['rps']:>9.0f} req/s  "
+          f"p50 {r['p50_us']:>7.1f} us  p99 {r['p99_us']:>7.1f} us  status {r['status']}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="In-Process HTTP-Mikrobenchmark (ASGI)")
+    p.add_argument("paths", nargs="*", default=list(DEFAULT_PATHS))
+    p.add_argument("--app", default="main:app", help="ASGI-App als modul:attribut")
+    p.add_argument("-n", "--requests", type=int, default=2000)
+    p.add_argument("-c", "--concurrency", type=int, default=1)
+    p.add_argument("--warmup", type=int, default=100)
+    p.add_argument("--rounds", type=int, default=3, help="Runden je Variante (beste zaehlt)")
+    p.add_argument("-H", "--header", action="append", default=[], help="'Name: Wert' (mehrfach)")
+    p.add_argument("--compare", metavar="MIDDLEWARE", help="zusaetzlich ohne diese Middleware messen")
+    args = p.parse_args(argv)
+
+    headers = [tuple(x.strip() for x in h.split(":", 1)) for h in args.header]
+    app = _load_app(args.app)
+    bare = _without_middleware(app, args.compare) if args.compare else None
+
+    async def best(target, path):
+        runs = []
+        for _ in range(args.rounds):
+            for label, a in target:
+                runs.append((label, await _run(a, path, args.requests, args.concurrency, args.warmup, headers)))
+        return {label: max((r for l, r in runs if l == label), key=lambda r: r["rps"]) for label, _ in target}
+
+    async def go():
+        target = [("app", app)] + ([("ohne", bare)] if bare is not None else [])
+        for path in args.paths:
+            res = await best(target, path)
+            for label, r in res.items():
+                _print(label, r)
+            if bare is not None:
+                delta = 1e6 / res["app"]["rps"] - 1e6 / res["ohne"]["rps"]
+                print(f"{'':<10} {args.compare}: {delta:+.1f} us/Request")
+
+    asyncio.run(go())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench_kunden.py
+"""
+Kundensuche (app/services/kunden_suche.py) auf einem grossen Kundenstamm
+(Temp-DB, siehe bench_common.workdir).
+
+    python bench_kunden.py                           # 200k Kunden
+    python bench_kunden.py --kunden 500000 -n 500
+
+Gemessen wird search_kunden (Top 10) fuer typische Type-ahead-Eingaben:
+Namens-Praefix, Vor- und Nachname, Telefon (national und +41), E-Mail und
+ein Wort aus den Bemerkungen. "vorher" ist der LIKE-Scan ueber
+name/telefon/email/bemerkungen (Stand vor user-023, heute der Rueckfall ohne
+FTS5), "nachher" der FTS5-Index mit bm25-Ranking.
+"""
+import argparse
+import random
+
+import bench_common
+
+VORNAMEN = ("Anna", "Beat", "Claudia", "Daniel", "Elena", "Fabian", "Gabriela", "Hans", "Ines", "Jonas",
+            "Karin", "Luca", "Marco", "Nina", "Oliver", "Petra", "Reto", "Sandra", "Thomas", "Ursula")
+NACHNAMEN = ("Meier", "Müller", "Schmid", "Keller", "Weber", "Huber", "Schneider", "Meyer", "Steiner",
+             "Fischer", "Gerber", "Brunner", "Baumann", "Frei", "Zimmermann", "Moser", "Widmer", "Wyss")
+NOTIZEN = ("Balayage", "Allergie", "Stammkundin", "Dauerwelle", "Bart", "Kinder", "Farbe", "Gutschein")
+
+
+def _seed(base, n: int, rnd: random.Random) -> list:
+    rows = []
+    for i in range(1, n + 1):
+        vor, nach = rnd.choice(VORNAMEN), rnd.choice(NACHNAMEN)
+        tel = f"07{rnd.randint(5, 9)} {rnd.randint(100, 999)} {rnd.randint(10, 99)} {rnd.randint(10, 99)}"
+        if rnd.random() < 0.3:
+            tel = "+41 " + tel[1:]
+        rows.append((i, f"{vor} {nach} {i}", tel, f"{vor.lower()}.{nach.lower()}{i}@example.ch",
+                     rnd.choice(NOTIZEN) if rnd.random() < 0.4 else None))
+    with base.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO kunden (id, name, telefon, email, bemerkungen) VALUES (?, ?, ?, ?, ?)", rows)
+        conn.exec_driver_sql("ANALYZE")
+    return rows
+
+
+def main(argv=None) -> None:
+    p = argparse.ArgumentParser(description="Kundensuche LIKE vs. FTS5 (Temp-DB)")
+    p.add_argument("--workdir", help="Arbeitsverzeichnis (Standard: neues Temp-Verzeichnis)")
+    p.add_argument("--kunden", type=int, default=200_000)
+    p.add_argument("-n", "--requests", type=int, default=200)
+    p.add_argument("--seed", type=int, default=23)
+    args = p.parse_args(argv)
+    bench_common.workdir(args.workdir)
+
+    from app.models import base
+    import app.models.entities  # noqa: F401
+    import app.models.user  # noqa: F401
+    from app.services import kunden_suche
+
+    base.Base.metadata.create_all(bind=base.engine)
+    rnd = random.Random(args.seed)
+    rows = _seed(base, args.kunden, rnd)
+    if not kunden_suche.ensure_kunden_fts(base.engine):
+        raise SystemExit("SQLite ohne FTS5 – nur LIKE moeglich")
+    email = rows[len(rows) // 2][3]
+    queries = (("Name-Praefix", "Zimm"), ("Vor- und Nachname", "claudia web"), ("Telefon national", "079 123"),
+               ("Telefon +41", "+41 78 55"), ("E-Mail", email.split("@")[0]), ("Bemerkung", "balay"))
+    print(f"{args.kunden} Kunden")
+    for label, q in queries:
+        for variant, search in (("vorher (LIKE)", kunden_suche._search_like),
+                                ("nachher (FTS5)", kunden_suche.search_kunden)):
+            def run():
+                with base.SessionLocal() as db:
+                    search(db, q, 10)
+            with base.SessionLocal() as db:
+                hits = len(search(db, q, 10))
+            stats = bench_common.summary(bench_common.measure(run, args.requests))
+            print(bench_common.fmt(f"{label} / {variant}", stats, 38) + f"  Treffer {hits}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# bench_money.py
+"""
+Durchsatz der Geldrechnung (app/services/money.py) gegen Decimal und float.
+
+    python bench_money.py                    # alle Messungen
+    python bench_money.py -n 200000 --carts 20000
+
+lines:  Zeilensummen Preis x Menge, je Variante dieselben Zufallsdaten
+split:  Brutto -> Netto/Steuer (split_gross gegen Decimal mit Quantisierung)
+alloc:  Rabatt proportional verteilen (allocate)
+carts:  pricing.summarize_cart mit 1-10 Positionen, Warenkoerbe pro Sekunde
+
+Zu jeder Variante wird mitgezaehlt, wie oft sie vom exakten Decimal-Ergebnis
+abweicht (float: Summen in CHF, am Ende auf Rappen gerundet).
+"""
+import argparse
+import random
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+import bench_common
+
+Q = Decimal("0.01")
+
+
+def _rate(label: str, n: int, seconds: float, drift: int = 0) -> None:
+    print(f"{label:<34} {n / seconds / 1e6:8.2f} M/s   Abweichungen {drift}")
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def cmd_lines(n: int, rnd: random.Random) -> None:
+    from app.services import money
+    prices = [rnd.randint(5, 50_000) for _ in range(n)]
+    qtys = [rnd.randint(1, 6) for _ in range(n)]
+    dec = [money.to_decimal(p) for p in prices]
+    flt = [money.chf(p) for p in prices]
+
+    exact, t_rp = _timed(lambda: sum(money.line_totals(prices, qtys)))
+    ref, t_dec = _timed(lambda: sum((p * q).quantize(Q, rounding=ROUND_HALF_UP) for p, q in zip(dec, qtys)))
+    approx, t_flt = _timed(lambda: sum(p * q for p, q in zip(flt, qtys)))
+    _rate("Zeilen Rappen (int)", n, t_rp, int(money.to_decimal(exact) != ref))
+    _rate("Zeilen Decimal", n, t_dec)
+    _rate("Zeilen float", n, t_flt, int(money.to_rappen(round(approx, 2)) != exact))
+
+
+def cmd_split(n: int, rnd: random.Random) -> None:
+    from app.services import money
+    from app.services.tax_rates import DEFAULT_RATES
+    rates = list(DEFAULT_RATES.values())
+    cases = [(rnd.randint(1, 10 ** 6), rnd.choice(rates)) for _ in range(n)]
+    dcases = [(money.to_decimal(g), Decimal(r)) for g, r in cases]
+
+    nets, t_rp = _timed(lambda: [money.split_gross(g, r)[0] for g, r in cases])
+    ref, t_dec = _timed(lambda: [(g / (1 + r)).quantize(Q, rounding=ROUND_HALF_UP) for g, r in dcases])
+    drift = sum(money.to_decimal(a) != b for a, b in zip(nets, ref))
+    _rate("split_gross Rappen", n, t_rp, drift)
+    _rate("split_gross Decimal", n, t_dec)
+
+
+def cmd_alloc(n: int, rnd: random.Random) -> None:
+    from app.services import money
+    cases = [(rnd.randint(0, 20_000), [rnd.randint(100, 30_000) for _ in range(rnd.randint(1, 10))])
+             for _ in range(n // 10)]
+    parts, t = _timed(lambda: [money.allocate(total, w) for total, w in cases])
+    drift = sum(sum(p) != total for p, (total, _) in zip(parts, cases))
+    _rate("allocate (Warenkoerbe)", len(cases), t, drift)
+
+
+def cmd_carts(n: int, rnd: random.Random) -> None:
+    from app.services import money, pricing
+    from app.services.tax_rates import DEFAULT_RATES, TaxRates
+    table = TaxRates.build(DEFAULT_RATES)
+    carts = []
+    for _ in range(n):
+        items = [{"line_id": i, "typ": "service", "ref_id": i, "name": f"Pos {i}", "qty": rnd.randint(1, 3),
+                  "unit_price": money.fmt_chf(rnd.randint(500, 40_000)), "steuer_code": rnd.choice(list(DEFAULT_RATES))}
+                 for i in range(rnd.randint(1, 10))]
+        carts.append({"items": items, "discount_percent": rnd.choice([0, 0, 5, 10]), "tip": "2.50"})
+    out, t = _timed(lambda: [pricing.summarize_cart(c, None, rates=table) for c in carts])
+    drift = 0
+    for c, o in zip(carts, out):
+        rp = money.to_rappen
+        expect = rp(o["subtotal_gross"]) - rp(o["discount_amount"]) + rp(c["tip"])
+        drift += rp(o["total_gross"]) != expect or sum(map(rp, o["tax_by_code"].values())) != rp(o["tax_total"])
+    print(f"{'summarize_cart':<34} {n / t:8.0f} Warenkoerbe/s   Abweichungen {drift}")
+
+
+def main(argv=None) -> None:
+    p = argparse.ArgumentParser(description="Durchsatz Geldrechnung (Rappen/Decimal/float)")
+    p.add_argument("--workdir", help="Arbeitsverzeichnis (Standard: neues Temp-Verzeichnis)")
+    p.add_argument("-n", type=int, default=500_000, help="Betraege je Messung")
+    p.add_argument("--carts", type=int, default=20_000)
+    p.add_argument("--seed", type=int, default=16)
+    args = p.parse_args(argv)
+    bench_common.workdir(args.workdir)
+    rnd = random.Random(args.seed)
+    cmd_lines(args.n, rnd)
+    cmd_split(args.n, rnd)
+    cmd_alloc(args.n, rnd)
+    cmd_carts(args.carts, rnd)
+
+
+if __name__ == "__main__":
+    main()
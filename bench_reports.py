@@ -0,0 +1,174 @@
+# bench_reports.py
+"""
+Berichts-Benchmarks auf einem grossen geseedeten Journal (Temp-DB, siehe
+bench_common.workdir).
+
+    python bench_reports.py ranges                   # 500k Belege, Zeitraum-Abfragen vorher/nachher
+    python bench_reports.py ranges --sales 100000 -n 20
+    python bench_reports.py pdf                      # Kassenbuch-PDF: Speicherspitze je Anzahl Belege
+    python bench_reports.py pdf --rows 5000 40000
+
+ranges: misst Zeitraum-Abfragen der Berichte direkt auf dem Journal
+(reports.journal_totals: Belege, Zahlungen, Positionen; reports.kassenbuch_page:
+erste Seite). "vorher" ohne die Indizes auf sales.ts, (sales.kassen_id, ts),
+sale_items.sale_id und sale_payments.sale_id (Stand vor user-003, Full Scan),
+"nachher" mit den Indizes, wie main._ensure_indexes() sie anlegt.
+
+pdf: rendert das Kassenbuch-PDF (main._render_kassenbuch_pdf) fuer Zeitraeume
+mit wachsender Anzahl Belege und misst die Speicherspitze (tracemalloc) und die
+Laufzeit (inkl. tracemalloc-Overhead). "vorher" baut die ganze Story vor
+doc.build() auf und laesst ReportLab die Seiten unkomprimiert halten,
+"nachher" laedt die Journal-Tabellen waehrend doc.build() nach (_LazyStory) und
+komprimiert jede fertige Seite sofort (_pdf_canvas).
+"""
+import argparse
+import os
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import bench_common
+
+INDEXES = ("ix_sales_ts", "ix_sales_kassen_id_ts", "ix_sale_items_sale_id", "ix_sale_payments_sale_id")
+ARTS = ("bar", "karte", "twint", "gutschein")
+DAY0 = datetime(2022, 1, 1)
+
+
+def _seed(main, n: int, days: int, rnd: random.Random, batch: int = 20000) -> None:
+    """n Belege gleichmaessig ueber `days` Tage, je 1-4 Positionen und 1-2 Zahlungen (executemany)."""
+    step = days * 86400 / n
+    item_id = pay_id = 0
+    with main.engine.begin() as conn:
+        for start in range(0, n, batch):
+            sales, items, pays = [], [], []
+            for sid in range(start + 1, min(n, start + batch) + 1):
+                ts = DAY0 + timedelta(seconds=sid * step)
+                total = 0
+                for _ in range(rnd.randint(1, 4)):
+                    rp, menge = rnd.randint(500, 12000), rnd.randint(1, 2)
+                    total += rp * menge
+                    item_id += 1
+                    items.append((item_id, sid, "service", 1, "x", menge, rp / 100, rp,
+                                  rnd.choice(("S1", "S2")), rnd.choice(("DL", "PR"))))
+                first = total if rnd.random() < 0.8 else total // 2
+                for art, rp in ((rnd.choice(ARTS), first), (rnd.choice(ARTS), total - first)):
+                    if rp:
+                        pay_id += 1
+                        pays.append((pay_id, sid, art, rp / 100, rp))
+                sales.append((sid, ts, rnd.choice(("K1", "K2", "K3")), total / 100, 0.0, total, 0, 0))
+            conn.exec_driver_sql(
+                "INSERT INTO sales (id, ts, kassen_id, brutto_summe, rabatt_summe, brutto_rp, rabatt_rp, storno) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [(*s[:1], s[1].isoformat(sep=" "), *s[2:]) for s in sales])
+            conn.exec_driver_sql(
+                "INSERT INTO sale_items (id, sale_id, typ, ref_id, name_snapshot, menge, vk_brutto, vk_brutto_rp, "
+                "steuer_code, warengruppe) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", items)
+            conn.exec_driver_sql(
+                "INSERT INTO sale_payments (id, sale_id, art, betrag, betrag_rp) VALUES (?, ?, ?, ?, ?)", pays)
+        conn.exec_driver_sql("ANALYZE")
+
+
+def _queries(main, days: int):
+    from app.services import reports
+    mid = DAY0 + timedelta(days=days // 2)
+
+    def totals(von, bis, kasse=None):
+        def run():
+            with main.SessionLocal() as db:
+                reports.journal_totals(db, von, bis, kasse)
+        return run
+
+    def page(von, bis):
+        def run():
+            with main.SessionLocal() as db:
+                reports.kassenbuch_page(db, von, bis, limit=50)
+        return run
+
+    return [
+        ("Summen 1 Tag", totals(mid, mid + timedelta(days=1))),
+        ("Summen 1 Tag, Kasse K2", totals(mid, mid + timedelta(days=1), "K2")),
+        ("Summen 7 Tage", totals(mid, mid + timedelta(days=7))),
+        ("Summen 31 Tage", totals(mid, mid + timedelta(days=31))),
+        ("Kassenbuch 1. Seite, 1 Tag", page(mid, mid + timedelta(days=1))),
+    ]
+
+
+def cmd_ranges(args) -> None:
+    import main
+    print(f"Seed: {args.sales} Belege ueber {args.days} Tage ...", flush=True)
+    _seed(main, args.sales, args.days, random.Random(3))
+    queries = _queries(main, args.days)
+
+    with main.engine.begin() as conn:
+        for name in INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        conn.exec_driver_sql("ANALYZE")
+    before = {label: bench_common.summary(bench_common.measure(fn, args.requests, warmup=1))
+              for label, fn in queries}
+
+    main._ensure_indexes()
+    with main.engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    after = {label: bench_common.summary(bench_common.measure(fn, args.requests, warmup=1))
+             for label, fn in queries}
+
+    for label, _ in queries:
+        print(bench_common.fmt(f"{label} vorher (ohne Index)", before[label], 48))
+        print(bench_common.fmt(f"{label} nachher (Index)", after[label], 48))
+
+
+def cmd_pdf(args) -> None:
+    import main
+    from reportlab.pdfgen.canvas import Canvas
+    from app.services import reports
+    per_day = 1000
+    days = -(-max(args.rows) // per_day)
+    print(f"Seed: {days * per_day} Belege ({per_day} je Tag) ...", flush=True)
+    _seed(main, days * per_day, days, random.Random(4))
+
+    lazy, canvas = main._LazyStory, main._pdf_canvas
+    variants = (
+        ("vorher (ganze Story, Seiten roh)", lambda head, more: list(head) + list(more), lambda: Canvas),
+        ("nachher (Story nachladen, Seiten komprimiert)", lazy, canvas),
+    )
+    for n in args.rows:
+        von, bis = DAY0.strftime("%Y-%m-%d"), (DAY0 + timedelta(days=-(-n // per_day))).strftime("%Y-%m-%d")
+        with main.SessionLocal() as db:
+            belege = reports.sale_totals(db, *main._parse_dates(von, bis)).belege
+        for label, story_cls, canvas_fn in variants:
+            main._LazyStory, main._pdf_canvas = story_cls, canvas_fn
+            try:
+                tracemalloc.start()
+                t0 = time.perf_counter()
+                with main.SessionLocal() as db:
+                    path = main._render_kassenbuch_pdf(db, von, bis)
+                secs = time.perf_counter() - t0
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+                main._LazyStory, main._pdf_canvas = lazy, canvas
+            size = os.path.getsize(path)
+            os.unlink(path)
+            print(f"{belege:>7} Belege {label:<46} Spitze {peak / 1e6:7.1f} MB  "
+                  f"{secs:6.1f} s  PDF {size / 1e6:5.1f} MB", flush=True)
+
+
+def main(argv=None) -> None:
+    p = argparse.ArgumentParser(description="Berichts-Benchmarks (Temp-DB)")
+    p.add_argument("--workdir", help="Arbeitsverzeichnis (Standard: neues Temp-Verzeichnis)")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    rng = sub.add_parser("ranges", help="Zeitraum-Abfragen mit/ohne Indizes")
+    rng.add_argument("--sales", type=int, default=500000)
+    rng.add_argument("--days", type=int, default=730, help="Zeitraum des Journals in Tagen")
+    rng.add_argument("-n", "--requests", type=int, default=30)
+    rng.set_defaults(fn=cmd_ranges)
+    pdf = sub.add_parser("pdf", help="Kassenbuch-PDF: Speicherspitze vorher/nachher")
+    pdf.add_argument("--rows", type=int, nargs="+", default=[2000, 8000, 20000], help="Belege je Bericht")
+    pdf.set_defaults(fn=cmd_pdf)
+    args = p.parse_args(argv)
+    bench_common.workdir(args.workdir)
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# bench_termine.py
+"""
+Kalender-Benchmark fuer app/services/termine.py auf einem geseedeten
+Terminbuch (Temp-DB, siehe bench_common.workdir).
+
+    python bench_termine.py                          # 3 Jahre, 10 Mitarbeitende
+    python bench_termine.py --years 5 --staff 10 -n 500
+
+Geseedet werden je Mitarbeiter/in und Arbeitstag (Mo-Sa) 6-10 Termine mit je
+1-2 Service-Zeilen. Gemessen werden Tag (alle), Tag je Mitarbeiter/in und
+Woche je Mitarbeiter/in an zufaelligen Tagen im ganzen Zeitraum:
+
+  ohne Index   Intervall-Indizes entfernt (Stand vor user-021), ohne Cache
+  Index, kalt  mit ix_termine_start_ende / ix_termine_mitarbeiter_start_ende, Cache je Aufruf geleert
+  Index, Cache wiederkehrende Tage (eine Woche), aus dem (Tag, Mitarbeiter)-Cache
+
+SQL/Aufruf zaehlt die Abfragen je Aufruf: hoechstens 2 unabhaengig von der
+Terminanzahl (1 an Tagen ohne Termine), aus dem Cache 0.
+"""
+import argparse
+import random
+from datetime import date, datetime, timedelta
+
+import bench_common
+
+DAY0 = date(2023, 1, 2)
+
+
+def _seed(base, years: int, staff: int, rnd: random.Random) -> int:
+    from app.models.entities import Kunde, Mitarbeiter, Service
+    with base.SessionLocal() as db:
+        db.add_all([Kunde(name=f"Kunde {i}", telefon=f"079 {i:07d}") for i in range(5000)])
+        db.add_all([Mitarbeiter(name=f"Mitarbeiter {i}", rollen="mitarbeiter") for i in range(staff)])
+        db.add_all([Service(name=f"Service {i}", dauer_min=rnd.choice((15, 30, 45, 60)), basispreis=30 + i,
+                            steuer_code="CH-8.1") for i in range(25)])
+        db.commit()
+    termine, lines, tid = [], [], 0
+    for day in range(years * 365):
+        tag = DAY0 + timedelta(days=day)
+        if tag.weekday() == 6:
+            continue
+        for mid in range(1, staff + 1):
+            t = datetime.combine(tag, datetime.min.time()) + timedelta(hours=8)
+            for _ in range(rnd.randint(6, 10)):
+                dauer = timedelta(minutes=rnd.choice((30, 45, 60)))
+                tid += 1
+                termine.append((tid, rnd.randint(1, 5000), mid, t.isoformat(sep=" "),
+                                (t + dauer).isoformat(sep=" "), "gebucht"))
+                for sid in rnd.sample(range(1, 26), rnd.randint(1, 2)):
+                    lines.append((tid, sid))
+                t += dauer + timedelta(minutes=rnd.choice((0, 0, 15)))
+    with base.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO termine (id, kunde_id, mitarbeiter_id, start_ts, ende_ts, zustand) "
+            "VALUES (?, ?, ?, ?, ?, ?)", termine)
+        conn.exec_driver_sql("INSERT INTO termine_services (termin_id, service_id) VALUES (?, ?)", lines)
+        conn.exec_driver_sql("ANALYZE")
+    return tid
+
+
+def main(argv=None) -> None:
+    p = argparse.ArgumentParser(description="Kalender Tag/Woche (Temp-DB)")
+    p.add_argument("--workdir", help="Arbeitsverzeichnis (Standard: neues Temp-Verzeichnis)")
+    p.add_argument("--years", type=int, default=3)
+    p.add_argument("--staff", type=int, default=10)
+    p.add_argument("-n", "--requests", type=int, default=300)
+    p.add_argument("--seed", type=int, default=21)
+    args = p.parse_args(argv)
+    bench_common.workdir(args.workdir)
+
+    from sqlalchemy import event
+    from app.models import base
+    from app.models.entities import Termin
+    import app.models.user  # noqa: F401
+    from app.services import termine
+
+    base.Base.metadata.create_all(bind=base.engine)
+    rnd = random.Random(args.seed)
+    total = _seed(base, args.years, args.staff, rnd)
+    print(f"{total} Termine, {args.years} Jahre, {args.staff} Mitarbeitende")
+
+    statements = [0]
+    event.listen(base.engine, "before_cursor_execute", lambda *a: statements.__setitem__(0, statements[0] + 1))
+    span = args.years * 365 - 7
+    warm_days = [DAY0 + timedelta(days=span // 2 + i) for i in range(7)]
+
+    def call(fetch, staff_wide: bool, days, cold: bool):
+        def run():
+            if cold:
+                termine._cache.clear()
+            tag = rnd.choice(days) if days else DAY0 + timedelta(days=rnd.randrange(span))
+            mid = None if staff_wide else rnd.randint(1, args.staff)
+            with base.SessionLocal() as db:
+                fetch(db, tag, mid)
+        return run
+
+    cases = (("Tag, alle", termine.termine_day, True),
+             ("Tag je Mitarbeiter/in", termine.termine_day, False),
+             ("Woche je Mitarbeiter/in", termine.termine_week, False))
+    indexes = list(Termin.__table__.indexes)
+    for label, fetch, wide in cases:
+        for variant in ("ohne Index", "Index, kalt", "Index, Cache"):
+            if variant == "ohne Index":
+                for ix in indexes:
+                    ix.drop(bind=base.engine, checkfirst=True)
+            else:
+                termine.ensure_indexes(base.engine)
+            run = call(fetch, wide, warm_days if variant == "Index, Cache" else None, variant != "Index, Cache")
+            statements[0] = 0
+            lat = bench_common.measure(run, args.requests)
+            per_call = statements[0] / (args.requests + 3)
+            print(bench_common.fmt(f"{label} / {variant}", bench_common.summary(lat), 38)
+                  + f"  SQL/Aufruf {per_call:.1f}")
+
+
+if __name__ == "__main__":
+    main()
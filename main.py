@@ -13,38 +13,61 @@ from __future__ import annotations
 # - Berichte (PDF): /berichte/kassenbuch.pdf, /berichte/zahlungsarten.pdf, /berichte/mwst.pdf
 # - DEV-Toggle, Sessions, Static Mount, Templates
 #
-# PDF-Export benötigt "reportlab":
-#   pip install reportlab
+# PDF-Export benötigt "reportlab" (Version siehe requirements.txt):
+#   pip install -r requirements.txt
 # =============================================================================
 
-from datetime import datetime
-from decimal import Decimal, InvalidOperation
-from io import BytesIO
+from datetime import datetime, timedelta
 from pathlib import Path
+import hashlib
 import json
-from typing import Optional
-
-from fastapi import FastAPI, Request, Depends, Form
+import os
+import tempfile
+import threading
+from time import monotonic
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+import anyio
+import anyio.to_thread
+from fastapi import FastAPI, Request, Depends, Form, Query
 from fastapi.responses import (
-    HTMLResponse, RedirectResponse, JSONResponse, Response, PlainTextResponse
+    FileResponse, HTMLResponse, RedirectResponse, JSONResponse, Response, PlainTextResponse
 )
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import URL
 from starlette.responses import RedirectResponse as StarletteRedirectResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from sqlalchemy import (
-    Column, Integer, Float, String, DateTime, Boolean, ForeignKey, create_engine
+    Column, Integer, Float, String, Text, DateTime, Boolean, ForeignKey, Index, create_engine, func, or_, select,
+    update, inspect as sa_inspect,
 )
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, relationship, sessionmaker, declarative_base
 
+from app.config import settings as app_settings
+from app.models import base as app_db
+from app.models.base import apply_sqlite_profile, start_wal_checkpointer
+from app.models.entities import Service as AppService
+from app.services import config_store, idempotency, kunden_suche, shared_state, termine, verfuegbarkeit
+from app.services.catalog_index import CatalogIndex, normalize_code
+from app.services.money import chf, div_round, fmt_chf, split_gross, to_rappen
+from app.services.report_jobs import ReportJobQueue
+from app.services.reports import (
+    aggregate_period, check_daily_rollup, ensure_daily_rollup, kassenbuch_page, kassenbuch_rows,
+    period_fingerprint, rebuild_daily_rollup, rollup_add_sale,
+)
+from app.services.tax_rates import TaxRates, rates_from_settings
+
 # -----------------------------------------------------------------------------
 # DB-Basis
 # -----------------------------------------------------------------------------
 Base = declarative_base()
 DB_PATH = "sqlite:///app/data/app.db"
-engine = create_engine(DB_PATH, connect_args={"check_same_thread": False})
+engine = apply_sqlite_profile(create_engine(DB_PATH, connect_args={"check_same_thread": False}))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # -----------------------------------------------------------------------------
@@ -54,20 +77,24 @@ class Service(Base):
     __tablename__ = "services"
     id = Column(Integer, primary_key=True)
     name = Column(String(200), nullable=False)
-    basispreis = Column(Float, default=0.0)               # CHF brutto
+    basispreis = Column(Float, default=0.0)               # CHF brutto (Anzeige, Spiegel von basispreis_rp)
+    basispreis_rp = Column(Integer)                       # Rappen brutto – massgeblich
     steuer_code = Column(String(10), default="S1")        # S1=8.1%, S2=2.6%
     aktiv = Column(Boolean, default=True)
     warengruppe = Column(String(4), default="DL")         # DL/PR/TA
+    barcode = Column(String(64), unique=True, index=True) # Barcode/SKU (normalisiert, optional)
 
 class Produkt(Base):
     __tablename__ = "produkte"
     id = Column(Integer, primary_key=True)
     name = Column(String(200), nullable=False)
-    verkaufspreis = Column(Float, default=0.0)            # CHF brutto
+    verkaufspreis = Column(Float, default=0.0)            # CHF brutto (Anzeige, Spiegel von verkaufspreis_rp)
+    verkaufspreis_rp = Column(Integer)                    # Rappen brutto – massgeblich
     steuer_code = Column(String(10), default="S1")
-    lagerbestand = Column(Integer, default=0)
+    lagerbestand = Column(Integer)                        # NULL = ohne Lagerführung
     aktiv = Column(Boolean, default=True)
     warengruppe = Column(String(4), default="PR")         # DL/PR/TA
+    barcode = Column(String(64), unique=True, index=True) # Barcode/SKU (normalisiert, optional)
 
 # -----------------------------------------------------------------------------
 # Entities – Verkaufsjournal (Charge 1)
@@ -75,25 +102,31 @@ class Produkt(Base):
 class Sale(Base):
     __tablename__ = "sales"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    ts = Column(DateTime, nullable=False, default=datetime.utcnow)
+    ts = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
     kassen_id = Column(String(20), default="K1")
-    brutto_summe = Column(Float, default=0.0)
+    brutto_summe = Column(Float, default=0.0)             # CHF (Spiegel der _rp-Spalten)
     rabatt_summe = Column(Float, default=0.0)
+    brutto_rp = Column(Integer)                           # Rappen – Berichte rechnen hiermit
+    rabatt_rp = Column(Integer)
     storno = Column(Boolean, default=False)
     storno_grund = Column(String(250), nullable=True)
 
     items = relationship("SaleItem", back_populates="sale", cascade="all, delete-orphan")
     payments = relationship("SalePayment", back_populates="sale", cascade="all, delete-orphan")
 
+# Berichte filtern je Kasse über einen Zeitraum
+Index("ix_sales_kassen_id_ts", Sale.kassen_id, Sale.ts)
+
 class SaleItem(Base):
     __tablename__ = "sale_items"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False)
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False, index=True)
     typ = Column(String(10), nullable=False)              # 'service'|'produkt'
     ref_id = Column(Integer, nullable=False)              # ID im Katalog
     name_snapshot = Column(String(250), nullable=False)   # Name zum Zeitpunkt des Verkaufs
     menge = Column(Integer, default=1)
-    vk_brutto = Column(Float, default=0.0)                # Einzelpreis brutto
+    vk_brutto = Column(Float, default=0.0)                # Einzelpreis brutto (CHF)
+    vk_brutto_rp = Column(Integer)                        # Einzelpreis brutto (Rappen)
     steuer_code = Column(String(10), default="S1")        # S1/S2
     warengruppe = Column(String(4), default="DL")         # DL/PR/TA
 
@@ -102,28 +135,65 @@ class SaleItem(Base):
 class SalePayment(Base):
     __tablename__ = "sale_payments"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False)
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False, index=True)
     art = Column(String(12), nullable=False)              # bar/karte/twint/gutschein/guthaben/offen
     betrag = Column(Float, default=0.0)
+    betrag_rp = Column(Integer)
 
     sale = relationship("Sale", back_populates="payments")
 
+class CheckoutKey(Base):
+    """Idempotency-Key eines Checkouts -> gespeicherte Antwort (gleiche Transaktion wie der Verkauf)."""
+    __tablename__ = "checkout_keys"
+    key = Column(String(64), primary_key=True)
+    digest = Column(String(64), nullable=False)           # sha256 von Positionen + Zahlung
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False)
+    response = Column(Text, nullable=False)               # JSON-Body der ersten Antwort
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+# -----------------------------------------------------------------------------
+# Entities – Lager (Bewegungsjournal; produkte.lagerbestand ist der laufende Saldo)
+# Eigener Tabellenname: "lagerbewegungen" gehört den app/-Modellen (anderes Schema).
+# -----------------------------------------------------------------------------
+class LagerJournal(Base):
+    __tablename__ = "lager_journal"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    produkt_id = Column(Integer, ForeignKey("produkte.id"), nullable=False, index=True)
+    ts = Column(DateTime, nullable=False, default=datetime.utcnow)
+    menge = Column(Integer, nullable=False)               # +Zugang / -Abgang
+    bestand_nach = Column(Integer)                        # Saldo nach der Buchung (NULL = ohne Lagerführung)
+    grund = Column(String(20), nullable=False)            # verkauf|korrektur
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=True, index=True)
+
 # -----------------------------------------------------------------------------
 # App / Templates / Middleware
 # -----------------------------------------------------------------------------
 APP_VERSION = "v0.44 + charge1 (PDF, POS-Fallback)"
 app = FastAPI(title="Kassensystem Basic")
-app.add_middleware(SessionMiddleware, secret_key="dev-secret", session_cookie="ksb_session")
+app.add_middleware(SessionMiddleware, secret_key=app_settings.session_secret(), session_cookie="ksb_session")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
-class CatalogAliasMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        p = request.url.path
-        if p.startswith("/catalog"):
-            new_p = "/katalog" + p[len("/catalog"):]
-            return StarletteRedirectResponse(str(request.url.replace(path=new_p)), status_code=307)
-        return await call_next(request)
+class CatalogAliasMiddleware:
+    """
+    /catalog und /catalog/* -> 307 auf /katalog... (Query bleibt erhalten).
+    Reine ASGI-Middleware: andere Pfade kosten nur den startswith-Vergleich,
+    ohne Task-/Stream-Umweg wie bei BaseHTTPMiddleware.
+    """
+    PREFIX = "/catalog"
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope["path"] if scope["type"] == "http" else ""
+        if path.startswith(self.PREFIX) and (len(path) == len(self.PREFIX) or path[len(self.PREFIX)] == "/"):
+            url = URL(scope=scope)
+            new_p = "/katalog" + scope["path"][len(self.PREFIX):]
+            response = StarletteRedirectResponse(str(url.replace(path=new_p)), status_code=307)
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
 
 app.add_middleware(CatalogAliasMiddleware)
 
@@ -140,7 +210,7 @@ DEFAULT_SETTINGS = {
     "kasse": {"id": "K1"}
 }
 
-def load_settings() -> dict:
+def _read_settings() -> dict:
     try:
         if SETTINGS_PATH.exists():
             with SETTINGS_PATH.open("r", encoding="utf-8") as f:
@@ -154,34 +224,202 @@ def load_settings() -> dict:
         pass
     return json.loads(json.dumps(DEFAULT_SETTINGS))
 
+# Cache: (Datei-Schlüssel, eingefrorener Snapshot); neu gelesen nur bei geänderter Inode/mtime/Grösse
+# – so sehen auch mehrere Worker-Prozesse Änderungen der anderen sofort
+_settings_lock = threading.Lock()
+_settings_cache: tuple = (None, None)
+_settings_stats = {"hits": 0, "misses": 0}
+
+def _settings_file_key():
+    try:
+        st = SETTINGS_PATH.stat()
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def _freeze(obj):
+    if isinstance(obj, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+def _thaw(obj):
+    if isinstance(obj, MappingProxyType):
+        return {k: _thaw(v) for k, v in obj.items()}
+    if isinstance(obj, tuple):
+        return [_thaw(v) for v in obj]
+    return obj
+
+def settings_snapshot() -> Mapping:
+    """Read-only Settings aus dem Speicher (nicht verändern – dafür load_settings())."""
+    global _settings_cache
+    key = _settings_file_key()
+    cached_key, snap = _settings_cache
+    if snap is not None and cached_key == key:
+        with _settings_lock:
+            _settings_stats["hits"] += 1
+        return snap
+    with _settings_lock:
+        cached_key, snap = _settings_cache
+        if snap is None or cached_key != key:
+            snap = _freeze(_read_settings())
+            _settings_cache = (key, snap)
+            _settings_stats["misses"] += 1
+        else:
+            _settings_stats["hits"] += 1
+        return snap
+
+def settings_cache_stats() -> dict:
+    with _settings_lock:
+        return dict(_settings_stats)
+
+def load_settings() -> dict:
+    """Veränderbare Kopie der Settings (z. B. zum Bearbeiten und Speichern)."""
+    return _thaw(settings_snapshot())
+
 def save_settings(data: dict):
+    global _settings_cache
     SETTINGS_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with SETTINGS_PATH.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    with _settings_lock:
+        # atomar ersetzen: andere Worker-Prozesse lesen nie eine halb geschriebene Datei
+        fd, tmp = tempfile.mkstemp(prefix=".settings-", suffix=".json", dir=SETTINGS_PATH.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, SETTINGS_PATH)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        _settings_cache = (None, None)
+
+def vat_rates(cfg: Optional[Mapping] = None) -> TaxRates:
+    """MWST-Sätze S1/S2 als vorbereitete Decimal-Tabelle (gecacht je Wertepaar)."""
+    cfg = settings_snapshot() if cfg is None else cfg
+    return rates_from_settings(cfg.get("vat") or {})
+
+def vat_split(gross_rp: int, vat: TaxRates, code: str) -> tuple[float, float, float]:
+    """Brutto (Rappen) -> (netto, steuer, brutto) in CHF; netto + steuer == brutto."""
+    net, tax = split_gross(gross_rp, vat.rate(code))
+    return chf(net), chf(tax), chf(gross_rp)
 
 def vat_choices() -> list[tuple[str, str]]:
-    cfg = load_settings()
-    r1 = float(cfg["vat"].get("rate1", 0.0))
-    r2 = float(cfg["vat"].get("rate2", 0.0))
+    vat = vat_rates()
+    r1, r2 = vat.percent("S1"), vat.percent("S2")
     return [("S1", f"Satz 1 ({r1:.1f}%)"), ("S2", f"Satz 2 ({r2:.1f}%)")]
 
 # -----------------------------------------------------------------------------
 # Hilfen
 # -----------------------------------------------------------------------------
-def _to_cents(val):
-    if val in (None, ""): return 0
+def _to_cents(val) -> int:
     try:
-        return int(Decimal(str(val)).scaleb(2).quantize(Decimal("1")))
-    except (InvalidOperation, ValueError):
+        return to_rappen(val)
+    except ValueError:
         return 0
 
 def _to_float(val) -> float:
-    return float(_to_cents(val)) / 100.0
+    return chf(_to_cents(val))
 
 # -----------------------------------------------------------------------------
 # DB-Setup
 # -----------------------------------------------------------------------------
-Base.metadata.create_all(bind=engine)
+# Server-Modus: run_server._prepare_schema legt Schema und Migrationen einmal im
+# Master-Prozess an und setzt diese Variable; die Worker importieren main erneut
+# und überspringen _setup_schema() (sonst liefen ALTER TABLE / Rollup-Aufbau
+# parallel in jedem Worker). Schemaänderungen brauchen daher einen Neustart des
+# Masters, ein Worker-Neuladen per SIGHUP reicht nicht.
+SCHEMA_READY_ENV = "KSB_SCHEMA_READY"
+
+def _ensure_indexes():
+    """
+    create_all() legt Indizes nur für neue Tabellen an. Bestehende app.db-Dateien
+    erhalten fehlende Indizes hier nachträglich (CREATE INDEX, Daten bleiben unverändert).
+    """
+    for table in Base.metadata.sorted_tables:
+        for ix in table.indexes:
+            ix.create(bind=engine, checkfirst=True)
+
+def _ensure_barcode_triggers():
+    """
+    UNIQUE auf barcode gilt nur je Tabelle. Die Trigger sperren eine Barcode/SKU,
+    die in der jeweils anderen Tabelle schon vergeben ist – auch wenn zwei
+    Requests gleichzeitig an _barcode_taken vorbeikommen (IntegrityError beim Commit).
+    """
+    with engine.begin() as conn:
+        for tbl, other in (("services", "produkte"), ("produkte", "services")):
+            for op, name in (("INSERT", "ins"), ("UPDATE OF barcode", "upd")):
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER IF NOT EXISTS {tbl}_barcode_{name} BEFORE {op} ON {tbl} "
+                    f"WHEN NEW.barcode IS NOT NULL AND EXISTS (SELECT 1 FROM {other} WHERE barcode = NEW.barcode) "
+                    f"BEGIN SELECT RAISE(ABORT, 'barcode bereits vergeben'); END")
+
+# Geldspalten in Rappen: (Tabelle, Float-Spalte, Integer-Spalte)
+MONEY_COLUMNS = (
+    ("services", "basispreis", "basispreis_rp"),
+    ("produkte", "verkaufspreis", "verkaufspreis_rp"),
+    ("sales", "brutto_summe", "brutto_rp"),
+    ("sales", "rabatt_summe", "rabatt_rp"),
+    ("sale_items", "vk_brutto", "vk_brutto_rp"),
+    ("sale_payments", "betrag", "betrag_rp"),
+)
+
+def _migrate_money_columns():
+    """
+    Ergänzt bestehende app.db-Dateien um die Rappen-Spalten (ALTER TABLE) und
+    füllt fehlende Werte aus den alten Float-Spalten. Idempotent; die
+    Float-Spalten bleiben als Anzeige-Spiegel erhalten.
+    """
+    with engine.begin() as conn:
+        for tbl, old, new in MONEY_COLUMNS:
+            cols = {c["name"] for c in sa_inspect(conn).get_columns(tbl)}
+            if new not in cols:
+                conn.exec_driver_sql(f"ALTER TABLE {tbl} ADD COLUMN {new} INTEGER")
+            conn.exec_driver_sql(
+                f"UPDATE {tbl} SET {new} = CAST(ROUND(COALESCE({old}, 0) * 100) AS INTEGER) WHERE {new} IS NULL")
+
+# Nachträglich ergänzte Spalten: (Tabelle, Spalte, SQL-Typ)
+ADDED_COLUMNS = (
+    ("services", "barcode", "VARCHAR(64)"),
+    ("produkte", "barcode", "VARCHAR(64)"),
+)
+
+def _migrate_added_columns():
+    """Ergänzt bestehende app.db-Dateien um ADDED_COLUMNS (ALTER TABLE, Werte bleiben NULL)."""
+    with engine.begin() as conn:
+        for tbl, col, typ in ADDED_COLUMNS:
+            if col not in {c["name"] for c in sa_inspect(conn).get_columns(tbl)}:
+                conn.exec_driver_sql(f"ALTER TABLE {tbl} ADD COLUMN {col} {typ}")
+
+def _migrate_untracked_stock(journal_new: bool):
+    """
+    Einmalig beim ersten Start mit lager_journal (Datenbank von vor der
+    Lagerführung): Produkte, deren Bestand nie gezählt wurde (keine Korrektur
+    im Journal), laufen ohne Lagerführung (lagerbestand NULL). Ihr alter Wert
+    war nie geprüft worden und würde sonst Verkäufe blockieren; die erste
+    Zählung (_correct_stock) startet die Lagerführung.
+    """
+    if not journal_new:
+        return
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "UPDATE produkte SET lagerbestand = NULL WHERE id NOT IN "
+            "(SELECT produkt_id FROM lager_journal WHERE grund = 'korrektur')")
+
+def _setup_schema():
+    """Tabellen anlegen, Migrationen, Indizes, Rollup und Suchindex (idempotent)."""
+    journal_new = not sa_inspect(engine).has_table("lager_journal")
+    Base.metadata.create_all(bind=engine)
+    _migrate_money_columns()
+    _migrate_added_columns()
+    _migrate_untracked_stock(journal_new)
+    _ensure_indexes()
+    _ensure_barcode_triggers()
+    ensure_daily_rollup(engine)
+    termine.ensure_indexes(app_db.engine)
+    kunden_suche.ensure_kunden_fts(app_db.engine)
+
+if os.environ.get(SCHEMA_READY_ENV) != "1":
+    _setup_schema()
 
 def get_db():
     db = SessionLocal()
@@ -190,9 +428,99 @@ def get_db():
     finally:
         db.close()
 
+# Begrenzte Threadpools für synchrone Arbeit aus async-Handlern
+# ("db": Lesen & Co., "pdf": Exporte – damit Exporte keine Kassen ausbremsen,
+#  "checkout": Verkäufe buchen – SQLite hat ohnehin nur einen Schreiber; mehrere
+#  Threads würden sich per busy_timeout gegenseitig ausbremsen, p99 steigt)
+WORKER_POOLS = {"db": 8, "checkout": 1, "pdf": 2}
+_limiters: dict = {}
+
+def _limiter(pool: str):
+    lim = _limiters.get(pool)
+    if lim is None:
+        lim = _limiters[pool] = anyio.CapacityLimiter(WORKER_POOLS[pool])
+    return lim
+
+async def run_db(fn, *args, pool: str = "db"):
+    """
+    Führt fn(db, *args) mit eigener Session in einem Worker-Thread aus.
+    Async-Handler blockieren so den Event-Loop nicht während SQLite arbeitet.
+    """
+    def _call():
+        with SessionLocal() as db:
+            return fn(db, *args)
+    return await anyio.to_thread.run_sync(_call, limiter=_limiter(pool))
+
+# Lager: Buchung = bedingtes UPDATE auf den Saldo + Bewegung in derselben Transaktion.
+# Das UPDATE prüft den Bestand selbst (WHERE lagerbestand >= menge); zwei Kassen,
+# die das letzte Stück verkaufen, serialisiert damit SQLite – eine gewinnt, die
+# andere bekommt sofort "nicht an Lager" statt eines Retry-Sturms. Produkte ohne
+# Lagerführung (lagerbestand NULL) werden ohne Prüfung verkauft und bleiben NULL.
+# Die POS-Anzeige (/pos/lager) liest aus einem Cache, den Buchungen per
+# shared_state-Stempel auch in anderen Workern verwerfen.
+STOCK_STATE = "lager"
+
+_stock_lock = threading.Lock()
+_stock_cache: tuple = (None, None)   # (stempel, {produkt_id: bestand})
+
+def _book_stock(db: Session, pid: int, delta: int, grund: str, *,
+                sale_id: int|None = None, enforce: bool = True) -> tuple[bool, int|None]:
+    """
+    Bucht delta auf den Lagerbestand und schreibt die Bewegung (ohne Commit).
+    enforce (Verkauf): ein Abgang greift nur, wenn der Bestand reicht; NULL
+    bleibt NULL. Ohne enforce (Inventur) wird ab 0 gezählt, das Produkt ist
+    danach lagergeführt. Liefert (gebucht, neuer Bestand).
+    """
+    stock = Produkt.lagerbestand
+    stmt = update(Produkt).where(Produkt.id == pid)
+    if enforce:
+        if delta < 0:
+            stmt = stmt.where(or_(stock.is_(None), stock >= -delta))
+        new = stock + delta
+    else:
+        new = func.coalesce(stock, 0) + delta
+    row = db.execute(
+        stmt.values(lagerbestand=new).returning(Produkt.id, Produkt.lagerbestand),
+        execution_options={"synchronize_session": False},
+    ).first()
+    if row is None:
+        return False, None
+    db.add(LagerJournal(produkt_id=pid, menge=delta, bestand_nach=row[1], grund=grund, sale_id=sale_id))
+    return True, row[1]
+
+def stock_levels(db: Session) -> dict:
+    """Bestand je lagergeführtem Produkt (neu gelesen nur nach Buchungen, auch anderer Worker)."""
+    global _stock_cache
+    current = shared_state.stamp(STOCK_STATE)
+    with _stock_lock:
+        stamp, levels = _stock_cache
+        if levels is None or stamp != current:
+            levels = {pid: int(n) for pid, n in db.execute(
+                select(Produkt.id, Produkt.lagerbestand).where(Produkt.lagerbestand.is_not(None)))}
+            _stock_cache = (current, levels)
+        return dict(levels)
+
+def _stock_changed(levels: dict) -> None:
+    # nach Commit: eigenen Cache gezielt nachführen (falls er bis hierhin aktuell
+    # war), andere Worker per Stempel
+    global _stock_cache
+    levels = {pid: n for pid, n in levels.items() if n is not None}
+    if not levels:
+        return
+    with _stock_lock:
+        stamp, cached = _stock_cache
+        current = shared_state.stamp(STOCK_STATE)
+        written = shared_state.bump(STOCK_STATE)
+        if cached is not None and stamp == current:
+            cached.update(levels)
+            _stock_cache = (written, cached)
+
 @app.on_event("startup")
 def _startup():
     Path("app/data").mkdir(parents=True, exist_ok=True)
+    start_wal_checkpointer(engine)
+    start_wal_checkpointer(app_db.engine)
+    report_jobs.start()
 
 # -----------------------------------------------------------------------------
 # DEV Toggle & Template-Kontext
@@ -219,7 +547,9 @@ def _ctx(request: Request, extra: Optional[dict] = None):
 # -----------------------------------------------------------------------------
 @app.get("/", response_class=HTMLResponse)
 def dashboard(request: Request):
-    return templates.TemplateResponse("dashboard.html", _ctx(request))
+    # Kacheln: im DEV per dev_ui_config.json abschaltbar (Snapshot, siehe config_store)
+    dash = config_store.effective_dash_flags(_dev(request))
+    return templates.TemplateResponse("dashboard.html", _ctx(request, {"dash": dash}))
 
 # -----------------------------------------------------------------------------
 # Katalog
@@ -230,6 +560,27 @@ def katalog(request: Request, db: Session = Depends(get_db)):
     produkte = db.query(Produkt).order_by(Produkt.name.asc()).all()
     return templates.TemplateResponse("katalog.html", _ctx(request, {"services": services, "produkte": produkte}))
 
+def _barcode_taken(db: Session, code: Optional[str], own=None) -> Optional[HTMLResponse]:
+    """Barcode/SKU muss über Services und Produkte hinweg eindeutig sein (Scanner-Treffer)."""
+    if code is None:
+        return None
+    for model in (Service, Produkt):
+        other = db.query(model).filter(model.barcode == code).first()
+        if other is not None and other is not own:
+            return HTMLResponse(f"Barcode/SKU {code} bereits vergeben ({other.name})", status_code=400)
+    return None
+
+def _barcode_conflict(db: Session, exc: IntegrityError, code: Optional[str], own=None) -> HTMLResponse:
+    """
+    IntegrityError beim Speichern: ein paralleler Request hat die Barcode/SKU
+    zwischen _barcode_taken und Commit vergeben (UNIQUE bzw. Trigger).
+    Gleiche Meldung wie _barcode_taken; andere Verletzungen werden weitergereicht.
+    """
+    db.rollback()
+    if code is None or "barcode" not in str(exc.orig).lower():
+        raise exc
+    return _barcode_taken(db, code, own) or HTMLResponse(f"Barcode/SKU {code} bereits vergeben", status_code=400)
+
 # -- Service Neu/Bearbeiten
 @app.get("/katalog/service/neu", response_class=HTMLResponse)
 def service_new_form(request: Request):
@@ -244,16 +595,25 @@ def service_new_post(
     tax_code: str = Form("S1"),
     warengruppe: str = Form("DL"),
     aktiv: bool = Form(False),
+    barcode: str = Form(""),
     db: Session = Depends(get_db),
 ):
+    code = normalize_code(barcode)
+    if (err := _barcode_taken(db, code)): return err
     item = Service(
         name=name.strip(),
+        basispreis_rp=_to_cents(preis_chf),
         basispreis=_to_float(preis_chf),
         steuer_code=tax_code,
         warengruppe=warengruppe,
-        aktiv=1 if aktiv else 0
+        aktiv=1 if aktiv else 0,
+        barcode=code,
     )
-    db.add(item); db.commit()
+    try:
+        db.add(item); db.commit()
+    except IntegrityError as exc:
+        return _barcode_conflict(db, exc, code)
+    _catalog_changed(item)
     return RedirectResponse("/katalog", status_code=302)
 
 @app.get("/katalog/service/{sid}", response_class=HTMLResponse)
@@ -272,16 +632,25 @@ def service_edit_post(
     tax_code: str = Form("S1"),
     warengruppe: str = Form("DL"),
     aktiv: bool = Form(False),
+    barcode: str = Form(""),
     db: Session = Depends(get_db),
 ):
     item = db.query(Service).get(sid)
     if not item: return HTMLResponse("Not found", status_code=404)
+    code = normalize_code(barcode)
+    if (err := _barcode_taken(db, code, item)): return err
     item.name = name.strip()
-    item.basispreis = _to_float(preis_chf)
+    item.basispreis_rp = _to_cents(preis_chf)
+    item.basispreis = chf(item.basispreis_rp)
     item.steuer_code = tax_code
     item.warengruppe = warengruppe
     item.aktiv = 1 if aktiv else 0
-    db.commit()
+    item.barcode = code
+    try:
+        db.commit()
+    except IntegrityError as exc:
+        return _barcode_conflict(db, exc, code, item)
+    _catalog_changed(item)
     return RedirectResponse("/katalog", status_code=302)
 
 # -- Produkt Neu/Bearbeiten
@@ -298,18 +667,48 @@ def produkt_new_post(
     tax_code: str = Form("S1"),
     warengruppe: str = Form("PR"),
     aktiv: bool = Form(False),
+    lagerbestand: str = Form(""),
+    barcode: str = Form(""),
     db: Session = Depends(get_db),
 ):
+    code = normalize_code(barcode)
+    if (err := _barcode_taken(db, code)): return err
     item = Produkt(
         name=name.strip(),
+        verkaufspreis_rp=_to_cents(preis_chf),
         verkaufspreis=_to_float(preis_chf),
         steuer_code=tax_code,
         warengruppe=warengruppe,
-        aktiv=1 if aktiv else 0
+        aktiv=1 if aktiv else 0,
+        lagerbestand=None,
+        barcode=code,
     )
-    db.add(item); db.commit()
+    try:
+        db.add(item); db.flush()
+        stock = _correct_stock(db, item, lagerbestand)
+        db.commit()
+    except IntegrityError as exc:
+        return _barcode_conflict(db, exc, code)
+    _stock_changed(stock)
+    _catalog_changed(item)
     return RedirectResponse("/katalog", status_code=302)
 
+def _correct_stock(db: Session, item: Produkt, value: str) -> dict:
+    """
+    Inventur-Korrektur aus dem Formular: Differenz zum gezählten Bestand buchen.
+    Ein Wert bei einem Produkt ohne Lagerführung startet die Lagerführung.
+    Liefert {produkt_id: bestand} für _stock_changed nach dem Commit.
+    """
+    try:
+        target = int(str(value).strip())
+    except ValueError:
+        return {}  # leer/ungültig = unverändert
+    delta = target - int(item.lagerbestand or 0)
+    if not delta and item.lagerbestand is not None:
+        return {}
+    _, left = _book_stock(db, item.id, delta, "korrektur", enforce=False)
+    return {item.id: left}
+
 @app.get("/katalog/produkt/{pid}", response_class=HTMLResponse)
 def produkt_edit_form(pid: int, request: Request, db: Session = Depends(get_db)):
     item = db.query(Produkt).get(pid)
@@ -326,43 +725,197 @@ def produkt_edit_post(
     tax_code: str = Form("S1"),
     warengruppe: str = Form("PR"),
     aktiv: bool = Form(False),
+    lagerbestand: str = Form(""),
+    barcode: str = Form(""),
     db: Session = Depends(get_db),
 ):
     item = db.query(Produkt).get(pid)
     if not item: return HTMLResponse("Not found", status_code=404)
+    code = normalize_code(barcode)
+    if (err := _barcode_taken(db, code, item)): return err
     item.name = name.strip()
-    item.verkaufspreis = _to_float(preis_chf)
+    item.verkaufspreis_rp = _to_cents(preis_chf)
+    item.verkaufspreis = chf(item.verkaufspreis_rp)
     item.steuer_code = tax_code
     item.warengruppe = warengruppe
     item.aktiv = 1 if aktiv else 0
-    db.commit()
+    item.barcode = code
+    try:
+        stock = _correct_stock(db, item, lagerbestand)
+        db.commit()
+    except IntegrityError as exc:
+        return _barcode_conflict(db, exc, code, item)
+    _stock_changed(stock)
+    _catalog_changed(item)
     return RedirectResponse("/katalog", status_code=302)
 
 # -----------------------------------------------------------------------------
 # POS
 # -----------------------------------------------------------------------------
+# Die Kasse lädt ein statisches HTML-Gerüst und den Katalog als JSON-Snapshot.
+# Beides trägt einen ETag (Hash des Inhalts, in allen Workern gleich); ein Reload
+# der Kasse kostet damit zwei 304 statt zweier Abfragen und eines Template-Renders.
+# Der Snapshot wird nur nach Änderungen über die /katalog-Routen neu aufgebaut
+# (_catalog_changed); andere Worker erkennen das am shared_state-Stempel.
+# Suche und Scanner (/pos/suche, /pos/scan) laufen über einen In-Memory-Index
+# (app/services/catalog_index.py), der eigene Änderungen einzeln nachführt und
+# nur bei Änderungen anderer Worker neu aufgebaut wird.
+CATALOG_STATE = "pos_catalog"
+SEARCH_LIMIT = 50
+
+_catalog_lock = threading.Lock()
+_catalog_snapshot: tuple = (None, None)   # (stempel, (etag, body))
+_catalog_index: tuple = (None, None)      # (stempel, CatalogIndex)
+_pos_shell: dict = {}                     # DEV_MODE -> (etag, body)
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+def _cached_response(request: Request, etag: str, body: bytes, media_type: str) -> Response:
+    """Antwort mit ETag; passt If-None-Match, nur 304 ohne Body."""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Cookie"}
+    inm = request.headers.get("if-none-match", "")
+    if any(t.strip().removeprefix("W/") in (etag, "*") for t in inm.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+def _catalog_item(row, price_rp: int|None, grp: str) -> dict:
+    return {"id": row.id, "name": row.name, "price": fmt_chf(price_rp or 0),
+            "tax": row.steuer_code or "S1", "grp": row.warengruppe or grp}
+
+def catalog_snapshot() -> tuple[str, bytes]:
+    """(etag, JSON) der aktiven Services/Produkte – ohne Lagerbestand (siehe /pos/lager)."""
+    global _catalog_snapshot
+    current = shared_state.stamp(CATALOG_STATE)
+    stamp, snap = _catalog_snapshot
+    if snap is not None and stamp == current:
+        return snap
+    with _catalog_lock:
+        stamp, snap = _catalog_snapshot
+        if snap is None or stamp != current:
+            with SessionLocal() as db:   # Session nur beim Neuaufbau
+                services = db.query(Service).filter(Service.aktiv == 1).order_by(Service.name.asc()).all()
+                produkte = db.query(Produkt).filter(Produkt.aktiv == 1).order_by(Produkt.name.asc()).all()
+            body = json.dumps({
+                "services": [_catalog_item(s, s.basispreis_rp, "DL") for s in services],
+                "produkte": [_catalog_item(p, p.verkaufspreis_rp, "PR") for p in produkte],
+            }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            snap = (_etag(body), body)
+            _catalog_snapshot = (current, snap)
+        return snap
+
+def _index_entry(row) -> dict:
+    if isinstance(row, Service):
+        it = _catalog_item(row, row.basispreis_rp, "DL") | {"type": "service"}
+    else:
+        it = _catalog_item(row, row.verkaufspreis_rp, "PR") | {"type": "produkt"}
+    return it | {"barcode": row.barcode, "aktiv": bool(row.aktiv)}
+
+def catalog_index() -> CatalogIndex:
+    """Such-/Scanner-Index der aktiven Services/Produkte (Neuaufbau nur bei fremdem Stempel)."""
+    global _catalog_index
+    current = shared_state.stamp(CATALOG_STATE)
+    stamp, index = _catalog_index
+    if index is not None and stamp == current:
+        return index
+    with _catalog_lock:
+        stamp, index = _catalog_index
+        if index is None or stamp != current:
+            with SessionLocal() as db:
+                rows = [*db.query(Service).filter(Service.aktiv == 1), *db.query(Produkt).filter(Produkt.aktiv == 1)]
+                index = CatalogIndex(_index_entry(r) for r in rows)
+            _catalog_index = (current, index)
+        return index
+
+def _catalog_changed(item=None) -> None:
+    # nach Commit in den /katalog-Routen: Snapshot lokal verwerfen, Index um `item`
+    # nachführen (falls er bis hierhin aktuell war), andere Worker per Stempel
+    global _catalog_snapshot, _catalog_index
+    entry = _index_entry(item) if item is not None else None
+    with _catalog_lock:
+        _catalog_snapshot = (None, None)
+        stamp, index = _catalog_index
+        current = shared_state.stamp(CATALOG_STATE)
+        written = shared_state.bump(CATALOG_STATE)
+        if index is not None and entry is not None and stamp == current:
+            index.upsert(entry)
+            _catalog_index = (written, index)
+
 @app.get("/pos", response_class=HTMLResponse)
-def pos_page(request: Request, db: Session = Depends(get_db)):
-    services = db.query(Service).filter(Service.aktiv == 1).order_by(Service.name.asc()).all()
-    produkte = db.query(Produkt).filter(Produkt.aktiv == 1).order_by(Produkt.name.asc()).all()
-
-    # <<< WICHTIG: EK-Feld ist im aktuellen Modell nicht vorhanden.
-    # Damit das alte pos.html (v0.44) nicht crasht, setzen wir es zur Laufzeit auf None.
-    for p in produkte:
-        if not hasattr(p, "einkaufspreis"):
-            setattr(p, "einkaufspreis", None)
-    # >>>
-
-    return templates.TemplateResponse(
-        "pos.html",
-        {"request": request, "services": services, "produkte": produkte, "DEV_MODE": _dev(request), "APP_VERSION": APP_VERSION}
-    )
+def pos_page(request: Request):
+    dev = _dev(request)
+    shell = _pos_shell.get(dev)
+    if shell is None:
+        body = templates.get_template("pos.html").render(DEV_MODE=dev, APP_VERSION=APP_VERSION).encode("utf-8")
+        shell = _pos_shell[dev] = (_etag(body), body)
+    return _cached_response(request, *shell, "text/html; charset=utf-8")
+
+@app.get("/pos/katalog")
+def pos_catalog(request: Request):
+    """Aktiver Katalog als JSON-Snapshot (ETag/If-None-Match)."""
+    return _cached_response(request, *catalog_snapshot(), "application/json")
+
+@app.get("/pos/suche")
+def pos_suche(q: str = "", limit: int = Query(20, ge=1, le=SEARCH_LIMIT)):
+    """Type-ahead: Artikel, deren Namenswörter mit den eingegebenen Wörtern beginnen."""
+    return JSONResponse(catalog_index().search(q, limit))
+
+@app.get("/pos/scan")
+def pos_scan(code: str = ""):
+    """Scanner/SKU-Eingabe -> Warenkorbzeile (ein Dict-Zugriff)."""
+    line = catalog_index().by_code(code)
+    if line is None:
+        return JSONResponse({"ok": False, "error": f"Unbekannter Code: {code.strip()}"}, status_code=404)
+    return JSONResponse(line)
+
+def _load_catalog(db: Session, rows: list[tuple[str, int, int]]) -> tuple[dict, dict]:
+    """
+    Löst alle Warenkorb-IDs mit höchstens einer IN-Abfrage je Typ auf.
+    rows: [(typ, id, menge)] – liefert ({id: Service}, {id: Produkt}).
+    """
+    sids = {iid for t, iid, _ in rows if t == "service"}
+    pids = {iid for t, iid, _ in rows if t != "service"}
+    services = {s.id: s for s in db.query(Service).filter(Service.id.in_(sids))} if sids else {}
+    produkte = {p.id: p for p in db.query(Produkt).filter(Produkt.id.in_(pids))} if pids else {}
+    return services, produkte
+
+# Idempotenter Checkout: Mit Idempotency-Key (Header oder Feld idempotency_key)
+# bucht eine Wiederholung (Timeout, zweiter Klick, Retry) nicht erneut, sondern
+# erhält die erste Antwort mit derselben sale_id. Schlüssel + Antwort landen in
+# checkout_keys in derselben Transaktion wie der Verkauf (gilt über Worker und
+# Neustarts); davor liegt ein LRU je Prozess, gleichzeitige Duplikate warten auf
+# die laufende Ausführung. Gespeichert werden nur erfolgreiche Buchungen –
+# abgelehnte Checkouts haben nichts geschrieben und dürfen neu laufen.
+CHECKOUT_KEY_TTL = timedelta(hours=24)   # Mindest-Aufbewahrung in checkout_keys
+CHECKOUT_KEY_PRUNE_S = 60.0              # höchstens so oft alte Schlüssel löschen
+
+_checkout_replay = idempotency.ReplayCache(size=1024, ttl=CHECKOUT_KEY_TTL.total_seconds())
+_checkout_keys_pruned = 0.0
+
+def _stored_checkout(db: Session, key: str) -> Optional[idempotency.Entry]:
+    row = db.get(CheckoutKey, key)
+    return (row.digest, row.response.encode("utf-8")) if row is not None else None
+
+def _replay_checkout(stored: idempotency.Entry, digest: str) -> Response:
+    if stored[0] != digest:
+        return JSONResponse({"ok": False, "error": "Idempotency-Key wurde für einen anderen Checkout verwendet."},
+                            status_code=422)
+    return Response(stored[1], media_type="application/json", headers={idempotency.REPLAY_HEADER: "true"})
+
+def _prune_checkout_keys(db: Session) -> None:
+    global _checkout_keys_pruned
+    if monotonic() - _checkout_keys_pruned < CHECKOUT_KEY_PRUNE_S:
+        return
+    _checkout_keys_pruned = monotonic()
+    db.query(CheckoutKey).filter(CheckoutKey.created_at < datetime.utcnow() - CHECKOUT_KEY_TTL) \
+        .delete(synchronize_session=False)
 
 @app.post("/pos/checkout")
-async def pos_checkout(request: Request, db: Session = Depends(get_db)):
+async def pos_checkout(request: Request):
     """
     Nimmt JSON entgegen (Content-Type: application/json).
     Fallback: Form-POST mit Feldern 'items' (JSON-String) und 'payment' (JSON-String).
+    Optional: Header Idempotency-Key bzw. Feld 'idempotency_key' (siehe oben).
     """
     items, pay = None, None
     ctype = request.headers.get("content-type", "").lower()
@@ -370,6 +923,7 @@ async def pos_checkout(request: Request, db: Session = Depends(get_db)):
         payload = await request.json()
         items = list(payload.get("items") or [])
         pay = payload.get("payment") or {}
+        key = payload.get("idempotency_key")
     else:
         form = await request.form()
         try:
@@ -377,116 +931,236 @@ async def pos_checkout(request: Request, db: Session = Depends(get_db)):
             pay = json.loads(form.get("payment") or "{}")
         except Exception:
             return JSONResponse({"ok": False, "error": "Ungültige Daten (Form/JSON)."}, status_code=400)
+        key = form.get("idempotency_key")
 
     if not items:
         return JSONResponse({"ok": False, "error": "Warenkorb ist leer."}, status_code=400)
 
-    cfg = load_settings()
+    # DB-Arbeit im DB-Threadpool, damit andere Kassen nicht blockiert werden
+    key = request.headers.get(idempotency.HEADER) or key
+    if key is None or key == "":
+        return await run_db(_checkout_sync, items, pay, pool="checkout")
+    if not idempotency.valid_key(key):
+        return JSONResponse({"ok": False, "error": "Ungültiger Idempotency-Key."}, status_code=400)
+    digest = idempotency.request_digest(items, pay)
+    async with _checkout_replay.exclusive(key):
+        stored = _checkout_replay.get(key) or await run_db(_stored_checkout, key)
+        if stored is not None:
+            _checkout_replay.put(key, *stored)
+            return _replay_checkout(stored, digest)
+        resp = await run_db(_checkout_sync, items, pay, key, digest, pool="checkout")
+        if resp.status_code == 200:
+            _checkout_replay.put(key, digest, resp.body)
+        return resp
+
+def _checkout_sync(db: Session, items: list, pay: dict,
+                   key: Optional[str] = None, digest: str = "") -> Response:
+    cfg = settings_snapshot()
     kassen_id = cfg["kasse"].get("id", "K1")
 
-    # Normalisieren + Summe
-    norm = []
-    total = 0.0
+    # Positionen vorprüfen (ohne DB)
+    rows = []
     for r in items:
         t = (r.get("type") or "").lower().strip()
         iid = int(r.get("id") or 0); qty = int(r.get("qty") or 0)
         if iid <= 0 or qty <= 0:
             return JSONResponse({"ok": False, "error":"Ungültige Position."}, status_code=400)
+        rows.append((t, iid, qty))
+
+    # Katalog in einem Rutsch laden (max. eine Abfrage je Typ)
+    services, produkte = _load_catalog(db, rows)
+
+    # Normalisieren + Summe (ganze Rappen)
+    norm = []
+    total = 0
+    for pos, (t, iid, qty) in enumerate(rows, start=1):
         if t == "service":
-            s = db.query(Service).get(iid)
-            if not s: return JSONResponse({"ok": False, "error":"Service nicht gefunden."}, status_code=400)
-            price = float(s.basispreis or 0.0); code = s.steuer_code or "S1"; grp = s.warengruppe or "DL"; name = s.name
+            s = services.get(iid)
+            if not s or not s.aktiv:
+                return JSONResponse({"ok": False, "error":f"Position {pos}: Service #{iid} nicht gefunden oder inaktiv."}, status_code=400)
+            price = s.basispreis_rp or 0; code = s.steuer_code or "S1"; grp = s.warengruppe or "DL"; name = s.name
         else:
-            p = db.query(Produkt).get(iid)
-            if not p: return JSONResponse({"ok": False, "error":"Produkt nicht gefunden."}, status_code=400)
-            price = float(p.verkaufspreis or 0.0); code = p.steuer_code or "S1"; grp = p.warengruppe or "PR"; name = p.name
-        lt = round(price * qty, 2); total += lt
+            p = produkte.get(iid)
+            if not p or not p.aktiv:
+                return JSONResponse({"ok": False, "error":f"Position {pos}: Produkt #{iid} nicht gefunden oder inaktiv."}, status_code=400)
+            price = p.verkaufspreis_rp or 0; code = p.steuer_code or "S1"; grp = p.warengruppe or "PR"; name = p.name
+        lt = price * qty; total += lt
         norm.append({"type":t,"id":iid,"qty":qty,"price":price,"total":lt,"tax_code":code,"grp":grp,"name":name})
 
-    total = round(total, 2)
     if total <= 0:
         return JSONResponse({"ok": False, "error":"Ungültiges Total."}, status_code=400)
 
     method = (pay.get("method") or "").lower().strip()
     am = pay.get("amounts") or {}
-    bar = float(am.get("bar") or 0); karte = float(am.get("karte") or 0); twint = float(am.get("twint") or 0)
+    try:
+        bar = to_rappen(am.get("bar") or 0); karte = to_rappen(am.get("karte") or 0); twint = to_rappen(am.get("twint") or 0)
+    except ValueError:
+        return JSONResponse({"ok": False, "error":"Ungültiger Betrag."}, status_code=400)
 
-    # Validierung
+    # Validierung (exakt in Rappen)
     if method not in {"bar","karte","twint","kombi"}:
         return JSONResponse({"ok": False, "error":"Ungültige Zahlart."}, status_code=400)
     if any(x<0 for x in (bar,karte,twint)):
         return JSONResponse({"ok": False, "error":"Negative Beträge nicht erlaubt."}, status_code=400)
     if method=="kombi":
-        if round(bar+karte+twint,2)!=total:
+        if bar+karte+twint!=total:
             return JSONResponse({"ok": False, "error":"Kombi-Beträge ≠ Total."}, status_code=400)
     elif method=="bar":
-        if round(bar,2)!=total: return JSONResponse({"ok": False, "error":"Barbetrag ≠ Total."}, status_code=400)
-        karte=twint=0.0
+        if bar!=total: return JSONResponse({"ok": False, "error":"Barbetrag ≠ Total."}, status_code=400)
+        karte=twint=0
     elif method=="karte":
-        if round(karte,2)!=total: return JSONResponse({"ok": False, "error":"Kartenbetrag ≠ Total."}, status_code=400)
-        bar=twint=0.0
+        if karte!=total: return JSONResponse({"ok": False, "error":"Kartenbetrag ≠ Total."}, status_code=400)
+        bar=twint=0
     elif method=="twint":
-        if round(twint,2)!=total: return JSONResponse({"ok": False, "error":"Twintbetrag ≠ Total."}, status_code=400)
-        bar=karte=0.0
+        if twint!=total: return JSONResponse({"ok": False, "error":"Twintbetrag ≠ Total."}, status_code=400)
+        bar=karte=0
 
-    # Persistenz
-    sale = Sale(ts=datetime.utcnow(), kassen_id=kassen_id, brutto_summe=total, rabatt_summe=0.0, storno=False)
+    # Persistenz (Rappen + Float-Spiegel für Anzeige/Altwerkzeuge)
+    sale = Sale(ts=datetime.utcnow(), kassen_id=kassen_id, brutto_rp=total, brutto_summe=chf(total),
+                rabatt_rp=0, rabatt_summe=0.0, storno=False)
     db.add(sale); db.flush()  # ID verfügbar
 
     for n in norm:
         db.add(SaleItem(
-            sale_id=sale.id, typ=n["type"], ref_id=n["id"], name_snapshot=n["name"],
-            menge=n["qty"], vk_brutto=n["price"], steuer_code=n["tax_code"], warengruppe=n["grp"]
+            sale_id=sale.id, typ=n["type"], ref_id=n["id"], name_snapshot=n["name"], menge=n["qty"],
+            vk_brutto_rp=n["price"], vk_brutto=chf(n["price"]), steuer_code=n["tax_code"], warengruppe=n["grp"]
         ))
 
-    if bar:   db.add(SalePayment(sale_id=sale.id, art="bar",   betrag=round(bar,2)))
-    if karte: db.add(SalePayment(sale_id=sale.id, art="karte", betrag=round(karte,2)))
-    if twint: db.add(SalePayment(sale_id=sale.id, art="twint", betrag=round(twint,2)))
-
-    db.commit()
+    for art, rp in (("bar", bar), ("karte", karte), ("twint", twint)):
+        if rp: db.add(SalePayment(sale_id=sale.id, art=art, betrag_rp=rp, betrag=chf(rp)))
 
-    return JSONResponse({
+    # Lager: Menge je Produkt summieren, bedingt abbuchen; fehlt Bestand -> alles zurück
+    need: dict[int, int] = {}
+    for n in norm:
+        if n["type"] != "service":
+            need[n["id"]] = need.get(n["id"], 0) + n["qty"]
+    stock: dict[int, int|None] = {}
+    for pid, qty in need.items():
+        ok, left = _book_stock(db, pid, -qty, "verkauf", sale_id=sale.id)
+        if not ok:
+            name = produkte[pid].name
+            db.rollback()
+            return JSONResponse({"ok": False, "error": f"Produkt '{name}' nicht genügend an Lager."}, status_code=409)
+        stock[pid] = left
+
+    # Tages-Rollup in derselben Transaktion fortschreiben
+    db.flush()
+    rollup_add_sale(db, sale.id)
+    resp = JSONResponse({
         "ok": True,
-        "items": norm,
-        "total": total,
+        "items": [n | {"price": chf(n["price"]), "total": chf(n["total"])} for n in norm],
+        "total": chf(total),
         "sale_id": sale.id,
-        "payment": {"method": method, "amounts":{"bar":round(bar,2),"karte":round(karte,2),"twint":round(twint,2)}}
+        "payment": {"method": method, "amounts":{"bar":chf(bar),"karte":chf(karte),"twint":chf(twint)}}
     })
+    if key:
+        db.add(CheckoutKey(key=key, digest=digest, sale_id=sale.id, response=resp.body.decode("utf-8")))
+        _prune_checkout_keys(db)
+    try:
+        db.commit()
+    except IntegrityError:
+        # derselbe Schlüssel wurde gleichzeitig in einem anderen Worker gebucht
+        db.rollback()
+        stored = _stored_checkout(db, key) if key else None
+        if stored is None:
+            raise
+        return _replay_checkout(stored, digest)
+    _stock_changed(stock)
+    return resp
+
+@app.get("/pos/lager")
+def pos_stock(request: Request, db: Session = Depends(get_db)):
+    """Lagerbestand je lagergeführter Produkt-ID für die POS-Anzeige (gecacht, siehe STOCK_STATE; ETag)."""
+    body = json.dumps({str(pid): n for pid, n in stock_levels(db).items()}, separators=(",", ":")).encode("utf-8")
+    return _cached_response(request, _etag(body), body, "application/json")
+
+# -----------------------------------------------------------------------------
+# Kundensuche (Type-ahead, app/-Modelle)
+# -----------------------------------------------------------------------------
+@app.get("/api/kunden/suche")
+def api_kunden_suche(q: str = "", limit: int = Query(10, ge=1, le=kunden_suche.MAX_LIMIT)):
+    """Beste Treffer zu Name/Telefon/E-Mail/Bemerkung als Präfix-Suche."""
+    with app_db.SessionLocal() as db:
+        return JSONResponse(kunden_suche.search_kunden(db, q, limit))
+
+# -----------------------------------------------------------------------------
+# Termine (Kalender, app/-Modelle)
+# -----------------------------------------------------------------------------
+def _termine_api(fetch, date_str: str, mitarbeiter_id: Optional[int]):
+    try:
+        tag = datetime.strptime(date_str, "%Y-%m-%d").date() if date_str else datetime.now().date()
+    except ValueError:
+        return JSONResponse({"error": "Ungültiges Datum (YYYY-MM-DD)."}, status_code=400)
+    with app_db.SessionLocal() as db:
+        return JSONResponse(termine.public(fetch(db, tag, mitarbeiter_id)))
+
+@app.get("/api/termine/day")
+def api_termine_day(date_str: str = Query("", alias="date"), mitarbeiter_id: Optional[int] = None):
+    """Termine eines Tages (optional je Mitarbeiter) inkl. Services und Kundenname."""
+    return _termine_api(termine.termine_day, date_str, mitarbeiter_id)
+
+@app.get("/api/termine/week")
+def api_termine_week(date_str: str = Query("", alias="date"), mitarbeiter_id: Optional[int] = None):
+    """Termine der Woche (Mo–So), die `date` enthält."""
+    return _termine_api(termine.termine_week, date_str, mitarbeiter_id)
+
+@app.get("/api/termine/frei")
+def api_termine_frei(
+    service_id: Optional[int] = None,
+    dauer: Optional[int] = None,
+    anzahl: int = Query(10, ge=1, le=200),
+    tage: Optional[int] = Query(None, ge=1, le=92),
+    mitarbeiter_id: Optional[int] = None,
+    ab: str = "",
+):
+    """Erste freie Slots für einen Service (Dauer aus Service.dauer_min) oder `dauer` Minuten."""
+    try:
+        start = datetime.fromisoformat(ab) if ab else None
+    except ValueError:
+        return JSONResponse({"error": "Ungültiger Zeitpunkt (ab=YYYY-MM-DDTHH:MM)."}, status_code=400)
+    with app_db.SessionLocal() as db:
+        if service_id is not None:
+            svc = db.get(AppService, service_id)
+            if svc is None:
+                return JSONResponse({"error": "Service nicht gefunden."}, status_code=404)
+            dauer = svc.dauer_min
+        if not dauer or dauer <= 0:
+            return JSONResponse({"error": "service_id oder dauer angeben."}, status_code=400)
+        return JSONResponse(verfuegbarkeit.freie_slots(
+            db, dauer, anzahl=anzahl, ab=start, tage=tage, mitarbeiter_id=mitarbeiter_id))
 
 # -----------------------------------------------------------------------------
 # Beleg-Preview (HTML)
 # -----------------------------------------------------------------------------
 @app.post("/beleg/preview", response_class=HTMLResponse)
-async def beleg_preview(request: Request, db: Session = Depends(get_db)):
+async def beleg_preview(request: Request):
     payload = await request.json()
     items = list(payload.get("items") or [])
     total = float(payload.get("total") or 0.0)
     payment = payload.get("payment") or {}
 
-    cfg = load_settings()
-    r1 = float(cfg["vat"].get("rate1", 0.0))
-    r2 = float(cfg["vat"].get("rate2", 0.0))
+    cfg = settings_snapshot()
+    vat = vat_rates(cfg)
+    r1, r2 = vat.percent("S1"), vat.percent("S2")
 
-    vat_totals = {"S1":0.0,"S2":0.0}
+    vat_totals = {"S1":0,"S2":0}   # Rappen
     for it in items:
         code = (it.get("tax_code") or "S1").upper()
-        gross = float(it.get("total") or 0.0)
-        rate = r1 if code=="S1" else r2
-        tax = round(gross - (gross/(1.0+rate/100.0)), 2)
+        _net, tax = split_gross(_to_cents(it.get("total")), vat.rate(code))
         vat_totals[code]+=tax
 
     meta = {
         "title": app.title, "ts": datetime.now(),
         "company": {
-            "name": load_settings()["company"].get("name",""),
-            "city": load_settings()["company"].get("city",""),
-            "vat_number": load_settings()["company"].get("vat_number",""),
+            "name": cfg["company"].get("name",""),
+            "city": cfg["company"].get("city",""),
+            "vat_number": cfg["company"].get("vat_number",""),
         },
-        "vat": {"rate1": r1, "rate2": r2, "S1": vat_totals["S1"], "S2": vat_totals["S2"]},
+        "vat": {"rate1": r1, "rate2": r2, "S1": chf(vat_totals["S1"]), "S2": chf(vat_totals["S2"])},
         "method": (payment.get("method") or "").upper(),
-        "bar": float((payment.get("amounts") or {}).get("bar") or 0),
-        "karte": float((payment.get("amounts") or {}).get("karte") or 0),
-        "twint": float((payment.get("amounts") or {}).get("twint") or 0),
+        "bar": _to_float((payment.get("amounts") or {}).get("bar")),
+        "karte": _to_float((payment.get("amounts") or {}).get("karte")),
+        "twint": _to_float((payment.get("amounts") or {}).get("twint")),
         "period": None
     }
     return templates.TemplateResponse("beleg.html",
@@ -497,7 +1171,7 @@ async def beleg_preview(request: Request, db: Session = Depends(get_db)):
 # -----------------------------------------------------------------------------
 @app.get("/einstellungen", response_class=HTMLResponse)
 def settings_page(request: Request):
-    return templates.TemplateResponse("einstellungen.html", _ctx(request, {"cfg": load_settings(), "saved": False}))
+    return templates.TemplateResponse("einstellungen.html", _ctx(request, {"cfg": settings_snapshot(), "saved": False}))
 
 @app.post("/einstellungen", response_class=HTMLResponse)
 def settings_save(
@@ -525,9 +1199,17 @@ def settings_save(
     save_settings(cfg)
     return RedirectResponse("/einstellungen?saved=1", status_code=303)
 
+@app.get("/einstellungen/cache")
+def settings_cache_info():
+    """Trefferzähler des Settings-Caches (Kontrolle im Betrieb)."""
+    return JSONResponse(settings_cache_stats())
+
 # -----------------------------------------------------------------------------
 # Berichte (HTML)
 # -----------------------------------------------------------------------------
+# Zahlungsarten in der Reihenfolge der Berichte
+REPORT_PAYMENT_ARTS = ("bar", "karte", "twint", "gutschein", "guthaben", "offen")
+
 def _parse_dates(von: str|None, bis: str|None):
     def _p(s):
         for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%Y-%m-%d %H:%M", "%d.%m.%Y %H:%M"):
@@ -539,101 +1221,197 @@ def _parse_dates(von: str|None, bis: str|None):
     dbis = _p(bis) if bis else None
     return dv, dbis
 
+# Kassenbuch-Listing: Seitengrösse (Default/Maximum)
+KASSENBUCH_PAGE_SIZE = 50
+KASSENBUCH_PAGE_MAX = 500
+
+def _page_size(limit: int|None) -> int:
+    return max(1, min(int(limit or KASSENBUCH_PAGE_SIZE), KASSENBUCH_PAGE_MAX))
+
 @app.get("/berichte/kassenbuch", response_class=HTMLResponse)
-def rep_kassenbuch(request: Request, von: str|None=None, bis: str|None=None, db: Session = Depends(get_db)):
+def rep_kassenbuch(request: Request, von: str|None=None, bis: str|None=None,
+                   cursor: str|None=None, limit: int|None=None, db: Session = Depends(get_db)):
     dv, dbis = _parse_dates(von, bis)
-    q = db.query(Sale)
-    if dv: q = q.filter(Sale.ts >= dv)
-    if dbis: q = q.filter(Sale.ts <= dbis)
-    sales = q.order_by(Sale.ts.desc()).all()
-
-    belege = len(sales)
-    storno_cnt = sum(1 for s in sales if s.storno)
-    rabatt_sum = round(sum(s.rabatt_summe or 0 for s in sales), 2)
-    zahlungen = {"bar":0.0,"karte":0.0,"twint":0.0,"gutschein":0.0,"guthaben":0.0,"offen":0.0}
-    for s in sales:
-        for p in s.payments:
-            if p.art in zahlungen:
-                zahlungen[p.art] += float(p.betrag or 0)
-    cfg = load_settings()
-    r1 = float(cfg["vat"].get("rate1", 0.0))
-    r2 = float(cfg["vat"].get("rate2", 0.0))
-    u_satz = {"S1":0.0,"S2":0.0}
-    for s in sales:
-        for it in s.items:
-            gross = float(it.vk_brutto or 0) * int(it.menge or 0)
-            u_satz[it.steuer_code or "S1"] += gross
+    limit = _page_size(limit)
+    sales, next_cursor = kassenbuch_page(db, dv, dbis, cursor=cursor, limit=limit)
+
+    # Summen über den ganzen Zeitraum – unabhängig von der angezeigten Seite
+    agg = aggregate_period(db, dv, dbis)
+    cfg = settings_snapshot()
+    vat = vat_rates(cfg)
+    r1, r2 = vat.percent("S1"), vat.percent("S2")
 
     ctx = _ctx(request, {
-        "sales": sales, "belege": belege, "storno_cnt": storno_cnt, "rabatt_sum": rabatt_sum,
-        "zahlungen": {k:round(v,2) for k,v in zahlungen.items()},
-        "u_satz": {"S1": round(u_satz["S1"],2), "S2": round(u_satz["S2"],2)},
-        "r1": r1, "r2": r2, "von": von, "bis": bis
+        "sales": sales, "belege": agg.belege, "storno_cnt": agg.storno_count,
+        "rabatt_sum": agg.rabatt_sum,
+        "zahlungen": {k: agg.payment_sum(k) for k in REPORT_PAYMENT_ARTS},
+        "u_satz": {k: chf(agg.tax_rp.get(k, 0)) for k in ("S1", "S2")},
+        "r1": r1, "r2": r2, "von": von, "bis": bis,
+        "cursor": cursor, "next_cursor": next_cursor, "limit": limit,
     })
     return templates.TemplateResponse("berichte_kassenbuch.html", ctx)
 
+@app.get("/berichte/kassenbuch.json")
+def rep_kassenbuch_json(von: str|None=None, bis: str|None=None,
+                        cursor: str|None=None, limit: int|None=None, db: Session = Depends(get_db)):
+    """Gleiche Seiten wie /berichte/kassenbuch, als JSON zum Nachladen im Browser."""
+    dv, dbis = _parse_dates(von, bis)
+    sales, next_cursor = kassenbuch_page(db, dv, dbis, cursor=cursor, limit=_page_size(limit))
+    items = [{
+        "id": s["id"],
+        "ts": s["ts"].isoformat(),
+        "ts_label": s["ts"].strftime("%d.%m.%Y %H:%M"),
+        "kassen_id": s["kassen_id"],
+        "brutto_summe": s["brutto_summe"],
+        "rabatt_summe": s["rabatt_summe"],
+        "payments": s["payments"],
+    } for s in sales]
+    return JSONResponse({"items": items, "next_cursor": next_cursor})
+
+@app.post("/berichte/rollup/rebuild")
+def rollup_rebuild(von: str|None=None, bis: str|None=None, db: Session = Depends(get_db)):
+    """Baut den Tages-Rollup für die Tage von..bis (leer = alle) aus dem Journal neu auf."""
+    dv, dbis = _parse_dates(von, bis)
+    rows = rebuild_daily_rollup(db, dv.date() if dv else None, dbis.date() if dbis else None)
+    db.commit()
+    return JSONResponse({"ok": True, "rows": rows})
+
+@app.get("/berichte/rollup/check")
+def rollup_check(von: str|None=None, bis: str|None=None, db: Session = Depends(get_db)):
+    """Vergleicht den Tages-Rollup mit dem Journal; listet Abweichungen je Tag/Kasse/Kennzahl."""
+    dv, dbis = _parse_dates(von, bis)
+    diffs = check_daily_rollup(db, dv.date() if dv else None, dbis.date() if dbis else None)
+    return JSONResponse({"ok": not diffs, "abweichungen": diffs})
+
 @app.get("/berichte/zahlungsarten", response_class=HTMLResponse)
 def rep_zahlungsarten(request: Request, von: str|None=None, bis: str|None=None, db: Session = Depends(get_db)):
     dv, dbis = _parse_dates(von, bis)
-    q = db.query(Sale)
-    if dv: q = q.filter(Sale.ts >= dv)
-    if dbis: q = q.filter(Sale.ts <= dbis)
-    sales = q.all()
-    counts = {"bar":[0,0.0],"karte":[0,0.0],"twint":[0,0.0],"gutschein":[0,0.0],"guthaben":[0,0.0],"offen":[0,0.0]}
-    for s in sales:
-        arts = set()
-        for p in s.payments:
-            if p.art in counts:
-                counts[p.art][1] += float(p.betrag or 0)
-                arts.add(p.art)
-        for a in arts:
-            counts[a][0] += 1
+    agg = aggregate_period(db, dv, dbis)
+    counts = {k: [agg.payment_count(k), agg.payment_sum(k)] for k in REPORT_PAYMENT_ARTS}
     ctx = _ctx(request, {"counts": counts, "von": von, "bis": bis})
     return templates.TemplateResponse("berichte_zahlungsarten.html", ctx)
 
 @app.get("/berichte/mwst", response_class=HTMLResponse)
 def rep_mwst(request: Request, von: str|None=None, bis: str|None=None, db: Session = Depends(get_db)):
     dv, dbis = _parse_dates(von, bis)
-    q = db.query(Sale)
-    if dv: q = q.filter(Sale.ts >= dv)
-    if dbis: q = q.filter(Sale.ts <= dbis)
-    sales = q.all()
+    agg = aggregate_period(db, dv, dbis)
 
-    cfg = load_settings()
-    r1 = float(cfg["vat"].get("rate1", 0.0))
-    r2 = float(cfg["vat"].get("rate2", 0.0))
-    sums = {"S1":0.0,"S2":0.0}
-    groups = {"DL":0.0,"PR":0.0,"TA":0.0}
-    for s in sales:
-        for it in s.items:
-            gross = float(it.vk_brutto or 0) * int(it.menge or 0)
-            sums[it.steuer_code or "S1"] += gross
-            groups[it.warengruppe or "DL"] += gross
-
-    def _split(gross, rate):
-        net = round(gross/(1.0+rate/100.0), 2)
-        tax = round(gross-net, 2)
-        return net, tax, round(gross, 2)
-
-    s1 = _split(sums["S1"], r1)
-    s2 = _split(sums["S2"], r2)
-    total = round(sums["S1"]+sums["S2"], 2)
+    cfg = settings_snapshot()
+    vat = vat_rates(cfg)
+    r1, r2 = vat.percent("S1"), vat.percent("S2")
+    sums = {k: agg.tax_rp.get(k, 0) for k in ("S1", "S2")}        # Rappen
+    groups = {k: agg.group_rp.get(k, 0) for k in ("DL", "PR", "TA")}
+
+    s1 = vat_split(sums["S1"], vat, "S1")
+    s2 = vat_split(sums["S2"], vat, "S2")
+    total = sums["S1"]+sums["S2"]
     anteile = {k: (0.0 if total==0 else round(v/total*100.0,1)) for k,v in groups.items()}
 
     ctx = _ctx(request, {"r1":r1,"r2":r2, "s1":s1, "s2":s2,
-                         "groups": {k: round(v,2) for k,v in groups.items()},
+                         "groups": {k: chf(v) for k,v in groups.items()},
                          "anteile": anteile, "von":von, "bis":bis})
     return templates.TemplateResponse("berichte_mwst.html", ctx)
 
 # -----------------------------------------------------------------------------
 # PDF-Export (ReportLab)
 # -----------------------------------------------------------------------------
-def _pdf_response(buf: BytesIO, filename: str) -> Response:
-    return Response(
-        content=buf.getvalue(),
-        media_type="application/pdf",
-        headers={"Content-Disposition": f'inline; filename="{filename}"'}
-    )
+# Zeilen je Journal-Tabelle im PDF
+PDF_TABLE_CHUNK = 500
+
+def _pdf_file_response(path: str, filename: str, etag: str|None = None) -> FileResponse:
+    """Liefert eine fertig gerenderte PDF-Datei gestreamt aus."""
+    headers = {"Content-Disposition": f'inline; filename="{filename}"'}
+    if etag:
+        headers["ETag"] = f'"{etag}"'
+    return FileResponse(path, media_type="application/pdf", headers=headers)
+
+def _pdf_tempfile(prefix: str) -> str:
+    fd, path = tempfile.mkstemp(prefix=f"{prefix}-", suffix=".pdf")
+    os.close(fd)
+    return path
+
+# _LazyStory und _pdf_canvas stützen sich auf ReportLab-Interna (Ablauf von
+# BaseDocTemplate.build(), Seitenobjekte des Canvas). Nur mit den geprüften
+# Versionen aktiv (requirements.txt), sonst normale Liste und Standard-Canvas.
+REPORTLAB_INTERNALS = ((5, 0), (5, 1))   # [von, bis)
+
+def _reportlab_internals_ok() -> bool:
+    try:
+        import reportlab
+        version = tuple(int(p) for p in reportlab.Version.split(".")[:2])
+    except Exception:
+        return False
+    lo, hi = REPORTLAB_INTERNALS
+    return lo <= version < hi
+
+class _LazyStory(list):
+    """
+    Story für doc.build(), die weitere Flowables erst bei Bedarf aus einem
+    Iterator nachlädt. BaseDocTemplate.build() arbeitet die Liste von vorne ab
+    (len() je Runde, del story[0]); es liegen so nur `ahead` Flowables (z. B.
+    Journal-Tabellen) gleichzeitig im Speicher statt des ganzen Berichts.
+    """
+    def __init__(self, head, more, ahead: int = 2):
+        super().__init__(head)
+        self._more = iter(more)
+        self._ahead = ahead
+
+    def __len__(self):
+        n = super().__len__()
+        while self._more is not None and n < self._ahead:
+            nxt = next(self._more, None)
+            if nxt is None:
+                self._more = None
+                break
+            self.append(nxt)
+            n += 1
+        return n
+
+def _pdf_story(head: list, more) -> list:
+    """Story mit nachgeladenen Flowables; ohne geprüfte ReportLab-Version alles vorab."""
+    if _reportlab_internals_ok():
+        return _LazyStory(head, more)
+    return head + list(more)
+
+_pdf_canvas_cls = None
+
+def _pdf_canvas():
+    """
+    Canvas, der jede fertige Seite sofort komprimiert. ReportLab hält alle
+    Seiten bis zum Speichern im Speicher – sonst unkomprimiert (~15 KB je
+    Kassenbuch-Seite), so nur noch in der Größe der fertigen PDF-Datei.
+    Ohne geprüfte ReportLab-Version der Standard-Canvas.
+    """
+    global _pdf_canvas_cls
+    from reportlab.pdfgen.canvas import Canvas
+    if not _reportlab_internals_ok():
+        return Canvas
+    if _pdf_canvas_cls is None:
+        import zlib
+        from reportlab.pdfbase.pdfdoc import PDFArray, PDFDictionary, PDFName, PDFStream
+
+        class _DeflatingCanvas(Canvas):
+            def showPage(self):
+                super().showPage()
+                page = self._doc.Pages.pages[-1]
+                if page.compression and page.stream and not page.Contents:
+                    # mit gesetztem Filter übernimmt PDFStream den Inhalt unverändert
+                    page.Contents = PDFStream(
+                        PDFDictionary({"Filter": PDFArray([PDFName("FlateDecode")])}),
+                        zlib.compress(page.stream.encode("utf-8")))
+                    page.Contents.__Comment__ = "page stream"
+                    page.stream = None
+
+        _pdf_canvas_cls = _DeflatingCanvas
+    return _pdf_canvas_cls
+
+def _build_pdf(doc, story, path: str) -> str:
+    try:
+        doc.build(story, canvasmaker=_pdf_canvas())
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
 
 def _ensure_reportlab():
     try:
@@ -651,41 +1429,43 @@ def _pdf_set_styles():
     styles = getSampleStyleSheet()
     return colors, A4, styles, mm, SimpleDocTemplate
 
-@app.get("/berichte/kassenbuch.pdf")
-def rep_kassenbuch_pdf(request: Request, von: str|None=None, bis: str|None=None, db: Session = Depends(get_db)):
+async def _serve_report_pdf(rtype: str, filename: str, von: str|None, bis: str|None):
+    """
+    Gemeinsamer Ablauf der PDF-Endpunkte: Ergebnis aus dem Berichts-Cache,
+    sonst im PDF-Pool rendern (Temp-Datei → Cache) und gestreamt ausliefern.
+    render_now least das Ergebnis; prune lässt die Datei solange stehen.
+    """
     ok, _ = _ensure_reportlab()
     if not ok:
         return PlainTextResponse("PDF-Export benötigt 'reportlab' (pip install reportlab).", status_code=501)
+    job = await anyio.to_thread.run_sync(report_jobs.render_now, rtype, von, bis, None, limiter=_limiter("pdf"))
+    if job["status"] != "done":
+        return PlainTextResponse(f"PDF-Export fehlgeschlagen: {job['error']}", status_code=500)
+    return _pdf_file_response(job["path"], filename, job["content_hash"])
 
+@app.get("/berichte/kassenbuch.pdf")
+async def rep_kassenbuch_pdf(request: Request, von: str|None=None, bis: str|None=None):
+    return await _serve_report_pdf("kassenbuch", "kassenbuch.pdf", von, bis)
+
+def _render_kassenbuch_pdf(db: Session, von: str|None, bis: str|None, kassen_id: str|None = None) -> str:
     dv, dbis = _parse_dates(von, bis)
-    q = db.query(Sale)
-    if dv: q = q.filter(Sale.ts >= dv)
-    if dbis: q = q.filter(Sale.ts <= dbis)
-    sales = q.order_by(Sale.ts.asc()).all()
-
-    belege = len(sales)
-    storno_cnt = sum(1 for s in sales if s.storno)
-    rabatt_sum = round(sum(s.rabatt_summe or 0 for s in sales), 2)
-    zahlungen = {"bar":0.0,"karte":0.0,"twint":0.0,"gutschein":0.0,"guthaben":0.0,"offen":0.0}
-    for s in sales:
-        for p in s.payments:
-            if p.art in zahlungen:
-                zahlungen[p.art] += float(p.betrag or 0)
+    agg = aggregate_period(db, dv, dbis, kassen_id)
+    belege = agg.belege
+    storno_cnt = agg.storno_count
+    rabatt_sum = agg.rabatt_sum
+    zahlungen = {k: agg.payment_sum(k) for k in REPORT_PAYMENT_ARTS}
 
-    cfg = load_settings()
-    r1 = float(cfg["vat"].get("rate1", 0.0))
-    r2 = float(cfg["vat"].get("rate2", 0.0))
-    u_satz = {"S1":0.0,"S2":0.0}
-    for s in sales:
-        for it in s.items:
-            u_satz[it.steuer_code or "S1"] += float(it.vk_brutto or 0) * int(it.menge or 0)
+    cfg = settings_snapshot()
+    vat = vat_rates(cfg)
+    r1, r2 = vat.percent("S1"), vat.percent("S2")
+    u_satz = {k: chf(agg.tax_rp.get(k, 0)) for k in ("S1", "S2")}
 
     from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
     colors, A4, styles, mm, SimpleDocTemplate = _pdf_set_styles()
 
-    buf = BytesIO()
+    path = _pdf_tempfile("kassenbuch")
     doc = SimpleDocTemplate(
-        buf, pagesize=A4,
+        path, pagesize=A4,
         leftMargin=15*mm, rightMargin=15*mm, topMargin=12*mm, bottomMargin=12*mm
     )
     story = []
@@ -716,51 +1496,50 @@ def rep_kassenbuch_pdf(request: Request, von: str|None=None, bis: str|None=None,
     story.append(t2)
     story.append(Spacer(1, 8))
 
-    rows = [["Datum/Uhrzeit","Kasse","Brutto (CHF)","Rabatt","Zahlungen"]]
-    for s in sales:
-        pays = ", ".join([f"{p.art}:{p.betrag:.2f}" for p in s.payments])
-        rows.append([
-            s.ts.strftime("%d.%m.%Y %H:%M"), s.kassen_id,
-            f"{(s.brutto_summe or 0):.2f}", f"{(s.rabatt_summe or 0):.2f}",
-            pays or "-"
-        ])
-    t3 = Table(rows, colWidths=[40*mm, 20*mm, 30*mm, 25*mm, 65*mm], repeatRows=1)
-    t3.setStyle(TableStyle([
+    # Journal in Tabellen-Blöcken: kleine Tabellen lassen sich von ReportLab
+    # deutlich billiger umbrechen als eine einzige Riesentabelle. Die Blöcke
+    # entstehen erst während doc.build() (_pdf_story) – der Speicher hängt so
+    # nicht von der Anzahl Belege ab.
+    header = ["Datum/Uhrzeit","Kasse","Brutto (CHF)","Rabatt","Zahlungen"]
+    style = TableStyle([
         ("GRID",(0,0),(-1,-1),0.25,colors.grey),
         ("BACKGROUND",(0,0),(-1,0),colors.whitesmoke),
         ("ALIGN",(2,1),(3,-1),"RIGHT")
-    ]))
-    story.append(t3)
-
-    doc.build(story)
-    return _pdf_response(buf, "kassenbuch.pdf")
+    ])
+    def _table(rows):
+        t3 = Table([header] + rows, colWidths=[40*mm, 20*mm, 30*mm, 25*mm, 65*mm], repeatRows=1)
+        t3.setStyle(style)
+        return t3
+
+    def _journal():
+        rows, tables = [], 0
+        for ts, kasse, brutto, rabatt, pays in kassenbuch_rows(db, dv, dbis, kassen_id):
+            rows.append([
+                ts.strftime("%d.%m.%Y %H:%M"), kasse,
+                f"{(brutto or 0):.2f}", f"{(rabatt or 0):.2f}",
+                pays or "-"
+            ])
+            if len(rows) >= PDF_TABLE_CHUNK:
+                yield _table(rows); rows = []; tables += 1
+        if rows or not tables:
+            yield _table(rows)
+
+    return _build_pdf(doc, _pdf_story(story, _journal()), path)
 
 @app.get("/berichte/zahlungsarten.pdf")
-def rep_zahlungsarten_pdf(request: Request, von: str|None=None, bis: str|None=None, db: Session = Depends(get_db)):
-    ok, _ = _ensure_reportlab()
-    if not ok:
-        return PlainTextResponse("PDF-Export benötigt 'reportlab' (pip install reportlab).", status_code=501)
+async def rep_zahlungsarten_pdf(request: Request, von: str|None=None, bis: str|None=None):
+    return await _serve_report_pdf("zahlungsarten", "zahlungsarten.pdf", von, bis)
 
+def _render_zahlungsarten_pdf(db: Session, von: str|None, bis: str|None, kassen_id: str|None = None) -> str:
     dv, dbis = _parse_dates(von, bis)
-    q = db.query(Sale)
-    if dv: q = q.filter(Sale.ts >= dv)
-    if dbis: q = q.filter(Sale.ts <= dbis)
-    sales = q.all()
-    counts = {"bar":[0,0.0],"karte":[0,0.0],"twint":[0,0.0],"gutschein":[0,0.0],"guthaben":[0,0.0],"offen":[0,0.0]}
-    for s in sales:
-        arts = set()
-        for p in s.payments:
-            if p.art in counts:
-                counts[p.art][1] += float(p.betrag or 0)
-                arts.add(p.art)
-        for a in arts:
-            counts[a][0] += 1
+    agg = aggregate_period(db, dv, dbis, kassen_id)
+    counts = {k: [agg.payment_count(k), agg.payment_sum(k)] for k in REPORT_PAYMENT_ARTS}
 
     from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
     colors, A4, styles, mm, SimpleDocTemplate = _pdf_set_styles()
 
-    buf = BytesIO()
-    doc = SimpleDocTemplate(buf, pagesize=A4,
+    path = _pdf_tempfile("zahlungsarten")
+    doc = SimpleDocTemplate(path, pagesize=A4,
                             leftMargin=15*mm, rightMargin=15*mm,
                             topMargin=12*mm, bottomMargin=12*mm)
     story = []
@@ -779,45 +1558,32 @@ def rep_zahlungsarten_pdf(request: Request, von: str|None=None, bis: str|None=No
     ]))
     story.append(t)
 
-    doc.build(story)
-    return _pdf_response(buf, "zahlungsarten.pdf")
+    return _build_pdf(doc, story, path)
 
 @app.get("/berichte/mwst.pdf")
-def rep_mwst_pdf(request: Request, von: str|None=None, bis: str|None=None, db: Session = Depends(get_db)):
-    ok, _ = _ensure_reportlab()
-    if not ok:
-        return PlainTextResponse("PDF-Export benötigt 'reportlab' (pip install reportlab).", status_code=501)
+async def rep_mwst_pdf(request: Request, von: str|None=None, bis: str|None=None):
+    return await _serve_report_pdf("mwst", "mwst_warengruppen.pdf", von, bis)
 
+def _render_mwst_pdf(db: Session, von: str|None, bis: str|None, kassen_id: str|None = None) -> str:
     dv, dbis = _parse_dates(von, bis)
-    q = db.query(Sale)
-    if dv: q = q.filter(Sale.ts >= dv)
-    if dbis: q = q.filter(Sale.ts <= dbis)
-    sales = q.all()
+    agg = aggregate_period(db, dv, dbis, kassen_id)
 
-    cfg = load_settings()
-    r1 = float(cfg["vat"].get("rate1", 0.0))
-    r2 = float(cfg["vat"].get("rate2", 0.0))
-    sums = {"S1":0.0,"S2":0.0}
-    groups = {"DL":0.0,"PR":0.0,"TA":0.0}
-    for s in sales:
-        for it in s.items:
-            gross = float(it.vk_brutto or 0) * int(it.menge or 0)
-            sums[it.steuer_code or "S1"] += gross
-            groups[it.warengruppe or "DL"] += gross
-
-    def _split(gross, rate):
-        net = round(gross/(1.0+rate/100.0), 2)
-        tax = round(gross-net, 2)
-        return net, tax, round(gross, 2)
-    s1 = _split(sums["S1"], r1); s2 = _split(sums["S2"], r2)
-    total = round(sums["S1"]+sums["S2"], 2)
+    cfg = settings_snapshot()
+    vat = vat_rates(cfg)
+    r1, r2 = vat.percent("S1"), vat.percent("S2")
+    sums = {k: agg.tax_rp.get(k, 0) for k in ("S1", "S2")}        # Rappen
+    groups = {k: agg.group_rp.get(k, 0) for k in ("DL", "PR", "TA")}
+
+    s1 = vat_split(sums["S1"], vat, "S1"); s2 = vat_split(sums["S2"], vat, "S2")
+    total = sums["S1"]+sums["S2"]
     anteile = {k: (0.0 if total==0 else round(v/total*100.0,1)) for k,v in groups.items()}
+    groups = {k: chf(v) for k, v in groups.items()}
 
     from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
     colors, A4, styles, mm, SimpleDocTemplate = _pdf_set_styles()
 
-    buf = BytesIO()
-    doc = SimpleDocTemplate(buf, pagesize=A4,
+    path = _pdf_tempfile("mwst")
+    doc = SimpleDocTemplate(path, pagesize=A4,
                             leftMargin=15*mm, rightMargin=15*mm,
                             topMargin=12*mm, bottomMargin=12*mm)
     story = []
@@ -849,8 +1615,62 @@ def rep_mwst_pdf(request: Request, von: str|None=None, bis: str|None=None, db: S
     ]))
     story.append(t2)
 
-    doc.build(story)
-    return _pdf_response(buf, "mwst_warengruppen.pdf")
+    return _build_pdf(doc, story, path)
+
+# -----------------------------------------------------------------------------
+# Berichts-Jobs (Hintergrund-Queue mit Cache auf Platte)
+# -----------------------------------------------------------------------------
+REPORT_CACHE_DIR = Path("app/data/report_cache")
+
+def _report_fingerprint(db: Session, von: str|None, bis: str|None, kassen_id: str|None) -> str:
+    # Datenstand des Zeitraums + MWST-Sätze (stehen ebenfalls im PDF)
+    dv, dbis = _parse_dates(von, bis)
+    vat = settings_snapshot()["vat"]
+    return f"{period_fingerprint(db, dv, dbis, kassen_id)}|{vat.get('rate1')}|{vat.get('rate2')}"
+
+report_jobs = ReportJobQueue(
+    engine, REPORT_CACHE_DIR,
+    {
+        "kassenbuch": _render_kassenbuch_pdf,
+        "zahlungsarten": _render_zahlungsarten_pdf,
+        "mwst": _render_mwst_pdf,
+    },
+    _report_fingerprint,
+    workers=WORKER_POOLS["pdf"],
+)
+
+def _job_json(job: dict) -> dict:
+    out = {
+        "job_id": job["id"], "typ": job["rtype"], "status": job["status"],
+        "von": job["von"] or None, "bis": job["bis"] or None, "kassen_id": job["kassen_id"] or None,
+        "content_hash": job["content_hash"], "error": job["error"],
+    }
+    if job["status"] == "done":
+        out["download"] = f"/berichte/jobs/{job['id']}/download"
+    return out
+
+@app.post("/berichte/jobs")
+def report_job_submit(typ: str, von: str|None=None, bis: str|None=None, kassen_id: str|None=None):
+    """Reiht einen PDF-Bericht ein (oder liefert das gecachte Ergebnis) und gibt die Job-ID zurück."""
+    try:
+        job = report_jobs.submit(typ, von, bis, kassen_id)
+    except ValueError as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=400)
+    return JSONResponse(_job_json(job), status_code=200 if job["status"] == "done" else 202)
+
+@app.get("/berichte/jobs/{job_id}")
+def report_job_status(job_id: str):
+    job = report_jobs.get(job_id)
+    if not job:
+        return JSONResponse({"ok": False, "error": "Job nicht gefunden."}, status_code=404)
+    return JSONResponse(_job_json(job))
+
+@app.get("/berichte/jobs/{job_id}/download")
+def report_job_download(job_id: str):
+    job = report_jobs.get(job_id)
+    if not job or not report_jobs.lease(job):
+        return JSONResponse({"ok": False, "error": "Ergebnis nicht verfügbar."}, status_code=404)
+    return _pdf_file_response(job["path"], f"{job['rtype']}.pdf", job["content_hash"])
 
 # -----------------------------------------------------------------------------
 # Dev-Server
@@ -933,14 +1753,6 @@ def _safe_parse_dates(von: Optional[str], bis: Optional[str]) -> Tuple[Optional[
                     return None
         return parse(von), parse(bis)
 
-# ---------- Aggregation ----------
-def _split_net_tax(gross: float, rate: float) -> Tuple[float, float]:
-    if not rate:
-        return round(gross, 2), 0.0
-    net = round(gross / (1.0 + rate / 100.0), 2)
-    tax = round(gross - net, 2)
-    return net, tax
-
 @app.get("/berichte/tagesabschluss", response_class=HTMLResponse)
 def z_bericht(
     request: Request,
@@ -953,68 +1765,47 @@ def z_bericht(
     if dv is None and dbis is None:
         today = date.today()
         dv = datetime.combine(today, time(0, 0, 0))
-        dbis = datetime.combine(today, time(23, 59, 59))
+        dbis = datetime.combine(today, time.max)  # ganzer Tag -> reine Rollup-Abfrage
 
     # --- Daten laden ---
-    # Erwartet deine Modelle: Sale, SaleItem, SalePayment (wie im Kassensystem)
+    # Aggregation in der DB (GROUP BY über sales/sale_items/sale_payments)
     try:
-        q = db.query(Sale)  # type: ignore[name-defined]
+        agg = aggregate_period(db, dv, dbis)
     except Exception as e:
-        # Hier landen wir, wenn die Modelle an dieser Stelle nicht importierbar sind.
+        # Hier landen wir, wenn die Journal-Tabellen fehlen oder nicht lesbar sind.
         # Besser klare Fehlermeldung als 500-Blackbox:
         return HTMLResponse(
-            f"<pre>Modelle nicht verfügbar: {e}\n"
-            f"Stelle sicher, dass Sale/SaleItem/SalePayment in main.py oben importiert sind.</pre>",
+            f"<pre>Verkaufsjournal nicht verfügbar: {e}\n"
+            f"Stelle sicher, dass die Tabellen sales/sale_items/sale_payments existieren.</pre>",
             status_code=500,
         )
 
-    if dv:   q = q.filter(Sale.ts >= dv)  # type: ignore[name-defined]
-    if dbis: q = q.filter(Sale.ts <= dbis)  # type: ignore[name-defined]
-    sales = q.all()
-
-    belege = len(sales)
-    brutto_total = round(sum(float(s.brutto_summe or 0) for s in sales), 2)
-    rabatt_total = round(sum(float(s.rabatt_summe or 0) for s in sales), 2)
-    rabatt_count = sum(1 for s in sales if (s.rabatt_summe or 0) > 0)
-    storno_count = sum(1 for s in sales if getattr(s, "storno", False))
-    storno_sum = round(sum(float(s.brutto_summe or 0) for s in sales if getattr(s, "storno", False)), 2)
+    belege = agg.belege
+    brutto_total = agg.brutto_sum
+    rabatt_total = agg.rabatt_sum
+    rabatt_count = agg.rabatt_count
+    storno_count = agg.storno_count
+    storno_sum = agg.storno_sum
 
     # Zahlarten summieren
-    zahlungen = {"bar": 0.0, "karte": 0.0, "twint": 0.0, "gutschein": 0.0}
-    for s in sales:
-        for p in getattr(s, "payments", []):
-            k = (getattr(p, "art", "") or "").lower()
-            if k in zahlungen:
-                zahlungen[k] += float(getattr(p, "betrag", 0) or 0)
+    zahlungen = {k: agg.payment_sum(k) for k in ("bar", "karte", "twint", "gutschein")}
 
     # Steuersätze & Warengruppen aus Positionen
     cfg = _safe_load_settings()
-    r1 = float(cfg["vat"].get("rate1", 0.0))  # S1
-    r2 = float(cfg["vat"].get("rate2", 0.0))  # S2
-
-    sums_by_tax = {"S1": 0.0, "S2": 0.0}
-    sums_by_group = {"DL": 0.0, "PR": 0.0, "TA": 0.0}
-    for s in sales:
-        for it in getattr(s, "items", []):
-            menge = int(getattr(it, "menge", 0) or 0)
-            vk_brutto = float(getattr(it, "vk_brutto", 0) or 0)
-            gross = vk_brutto * menge
-            tax_code = (getattr(it, "steuer_code", "S1") or "S1").upper()
-            grp_code = (getattr(it, "warengruppe", "DL") or "DL").upper()
-            if tax_code not in sums_by_tax: sums_by_tax[tax_code] = 0.0
-            if grp_code not in sums_by_group: sums_by_group[grp_code] = 0.0
-            sums_by_tax[tax_code] += gross
-            sums_by_group[grp_code] += gross
-
-    s1_net, s1_tax = _split_net_tax(sums_by_tax.get("S1", 0.0), r1)
-    s2_net, s2_tax = _split_net_tax(sums_by_tax.get("S2", 0.0), r2)
-    netto_total = round(s1_net + s2_net, 2)
-    mwst_total  = round(s1_tax + s2_tax, 2)
-
-    dl = round(sums_by_group.get("DL", 0.0), 2)
-    pr = round(sums_by_group.get("PR", 0.0), 2)
-
-    bon_avg = round((brutto_total / belege), 2) if belege else 0.0
+    vat = vat_rates(cfg)
+    r1, r2 = vat.percent("S1"), vat.percent("S2")
+
+    # Netto/MWST je Satz in Rappen, Summen exakt
+    s1_net, s1_tax = split_gross(agg.tax_rp.get("S1", 0), vat.rate("S1"))
+    s2_net, s2_tax = split_gross(agg.tax_rp.get("S2", 0), vat.rate("S2"))
+    netto_total = chf(s1_net + s2_net)
+    mwst_total  = chf(s1_tax + s2_tax)
+    s1_net, s1_tax, s2_net, s2_tax = chf(s1_net), chf(s1_tax), chf(s2_net), chf(s2_tax)
+
+    dl = chf(agg.group_rp.get("DL", 0))
+    pr = chf(agg.group_rp.get("PR", 0))
+
+    bon_avg = chf(div_round(agg.brutto_rp, belege)) if belege else 0.0
 
     kassensturz = {
         "anfang": 0.0, "einlagen": 0.0, "auslagen": 0.0, "end": zahlungen["bar"],
@@ -1048,12 +1839,7 @@ def z_bericht(
         "rabatte": {"count": rabatt_count, "summe": rabatt_total},
         "stornos": {"count": storno_count, "summe": storno_sum, "detail": ""},
 
-        "zahlungen": {
-            "bar": round(zahlungen["bar"], 2),
-            "karte": round(zahlungen["karte"], 2),
-            "twint": round(zahlungen["twint"], 2),
-            "gutschein": round(zahlungen["gutschein"], 2)
-        },
+        "zahlungen": zahlungen,
 
         "kassensturz": kassensturz,
         "mitarbeiter": mitarbeiter,
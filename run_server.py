@@ -1,4 +1,5 @@
 # run_server.py
+import argparse
 import os
 import sys
 import webbrowser
@@ -24,14 +25,58 @@ def _open_browser_later(url: str, delay: float = 0.8):
             pass
     threading.Thread(target=_go, daemon=True).start()
 
-def main():
-    _prepare_workdir_for_pyinstaller()
+def _parse_args(argv=None):
+    from app.config import settings as app_settings
+    p = argparse.ArgumentParser(description="Kassensystem Basic starten")
+    p.add_argument("--server", action="store_true",
+                   help="Produktionsmodus: mehrere Worker-Prozesse, kein Browser (Standard: Desktop, 1 Prozess)")
+    p.add_argument("--host", default=None,
+                   help=f"Server: Adresse (Standard {app_settings.SERVER_HOST}; 0.0.0.0 = im Netz erreichbar)")
+    p.add_argument("--port", type=int, default=None, help=f"Port (Standard {app_settings.SERVER_PORT})")
+    p.add_argument("--workers", type=int, default=app_settings.SERVER_WORKERS,
+                   help="Server: Anzahl Worker-Prozesse (0 = min(4, CPUs))")
+    p.add_argument("--keep-alive", type=int, default=app_settings.SERVER_KEEPALIVE_SEC,
+                   help="Server: Keep-Alive-Timeout in Sekunden")
+    p.add_argument("--backlog", type=int, default=app_settings.SERVER_BACKLOG,
+                   help="Server: max. wartende Verbindungen")
+    p.add_argument("--graceful-timeout", type=int, default=app_settings.SERVER_GRACEFUL_TIMEOUT_SEC,
+                   help="Server: Sekunden zum Abarbeiten offener Requests bei Stopp/Neuladen")
+    return p.parse_args(argv)
+
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+def _check_session_secret(host: str, workers: int):
+    """
+    Mit dem Entwicklungs-Geheimnis kann jeder ein gültiges Session-Cookie
+    bauen. Erlaubt nur für einen lokalen Einzelprozess; sonst Abbruch mit Hinweis.
+    """
+    from app.config import settings as app_settings
+    if app_settings.session_secret() != app_settings.DEV_SESSION_SECRET:
+        return
+    if workers > 1 or host not in LOOPBACK_HOSTS:
+        raise SystemExit(
+            f"Server-Modus ({host}, {workers} Worker) nicht mit dem Entwicklungs-Geheimnis: "
+            f"{app_settings.SESSION_SECRET_ENV} auf einen zufälligen Wert setzen, z. B. "
+            f"python -c \"import secrets; print(secrets.token_hex(32))\"")
+
+def _prepare_schema():
+    """
+    Schema-Anlage und Migrationen laufen beim Import von main. Im Server-Modus
+    einmal im Master-Prozess, bevor die Worker starten; die Worker erben
+    main.SCHEMA_READY_ENV und überspringen sie beim eigenen Import von main –
+    sonst würden mehrere Worker gleichzeitig ALTER TABLE / Rollup-Aufbau versuchen.
+    """
+    import main
+    from app.models import base as app_db
+    os.environ[main.SCHEMA_READY_ENV] = "1"
+    main.report_jobs.init_storage()
+    main.engine.dispose()
+    app_db.engine.dispose()
 
+def run_desktop(port: int = 8000):
     # Jetzt normal starten, ohne deinen Code umzubauen
     import uvicorn
-    # Optional: Port/Tuning zentral definieren
     host = "127.0.0.1"
-    port = 8000
 
     # Browser aufrufen, wenn Server gleich ready ist
     _open_browser_later(f"http://{host}:{port}/")
@@ -40,5 +85,42 @@ def main():
     # wir importieren main:app und starten uvicorn
     uvicorn.run("main:app", host=host, port=port, reload=False, log_level="info")
 
+def run_server(args):
+    """
+    Mehrere Worker unter dem Prozess-Manager von uvicorn:
+    - SIGHUP: Worker nacheinander neu starten (Code/Config neu laden)
+    - SIGTERM/Ctrl+C: keine neuen Verbindungen, offene Requests bis
+      --graceful-timeout abarbeiten, dann beenden
+    - abgestürzte Worker werden ersetzt
+    Gemeinsamer Zustand liegt in der DB (Belege, Belegnummern, Lager, Rollup,
+    Berichts-Jobs) bzw. in Dateien mit Änderungsprüfung (Settings, DEV-Config);
+    prozesslokale Caches werden über app.services.shared_state invalidiert.
+    """
+    import uvicorn
+    from app.config import settings as app_settings
+    workers = args.workers or min(4, os.cpu_count() or 1)
+    host = args.host or app_settings.SERVER_HOST
+    _check_session_secret(host, workers)
+    _prepare_schema()
+    uvicorn.run(
+        "main:app",
+        host=host,
+        port=args.port or app_settings.SERVER_PORT,
+        workers=workers,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=True,
+        log_level="info",
+    )
+
+def main(argv=None):
+    _prepare_workdir_for_pyinstaller()
+    args = _parse_args(argv)
+    if args.server:
+        run_server(args)
+    else:
+        run_desktop(args.port or 8000)
+
 if __name__ == "__main__":
     main()
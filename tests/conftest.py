@@ -0,0 +1,78 @@
+# tests/conftest.py
+"""
+Die App legt ihre DBs relativ zum Arbeitsverzeichnis an (app/data/app.db,
+db/kassensystem.db). Die Tests laufen deshalb in einem Temp-Verzeichnis mit
+frischen DBs; static/templates werden verlinkt. Der Wechsel passiert beim
+Laden dieser Datei – vor dem ersten Import von main bzw. app.models.base.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def _make_workdir(path: Path) -> Path:
+    (path / "app" / "data").mkdir(parents=True)
+    (path / "db").mkdir()
+    for sub in ("static", "templates"):
+        (path / "app" / sub).symlink_to(ROOT / "app" / sub, target_is_directory=True)
+    return path
+
+
+_WORKDIR = _make_workdir(Path(tempfile.mkdtemp(prefix="ksb-tests-")))
+_OLD_CWD = os.getcwd()
+os.chdir(_WORKDIR)
+
+
+def pytest_unconfigure(config):
+    os.chdir(_OLD_CWD)
+    shutil.rmtree(_WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def main_app():
+    """main.py mit frischer app/data/app.db (Schema + Migrationen wie beim Start)."""
+    import main
+    return main
+
+
+@pytest.fixture(scope="session")
+def app_db():
+    """app/-Engine (db/kassensystem.db) mit allen Tabellen der app/-Modelle."""
+    from app.models import base
+    import app.models.entities  # noqa: F401
+    import app.models.user  # noqa: F401
+    base.Base.metadata.create_all(bind=base.engine)
+    return base
+
+
+@pytest.fixture
+def sqlite_file(tmp_path):
+    """Pfad fuer eine eigene SQLite-Datei je Test."""
+    return tmp_path / "test.db"
+
+
+class FreshWorkdir:
+    """Leeres Arbeitsverzeichnis wie beim ersten Start; main laeuft darin in einem eigenen Prozess."""
+
+    def __init__(self, path: Path):
+        self.path = _make_workdir(path)
+        self.app_db = path / "app" / "data" / "app.db"
+
+    def import_main(self, **env: str) -> None:
+        """`import main` (Schema-Anlage, Migrationen) mit zusaetzlichen Umgebungsvariablen."""
+        subprocess.run([sys.executable, "-c", "import main"], cwd=self.path,
+                       env=dict(os.environ, PYTHONPATH=str(ROOT), **env), check=True)
+
+
+@pytest.fixture
+def fresh_workdir(tmp_path):
+    """Eigenes Arbeitsverzeichnis fuer Start-/Migrationstests (siehe FreshWorkdir)."""
+    return FreshWorkdir(tmp_path)
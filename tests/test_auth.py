@@ -0,0 +1,73 @@
+# tests/test_auth.py
+"""Benutzer-Cache in app/services/auth.py: Invalidierung erst nach dem Commit."""
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings as app_settings
+from app.services import auth, shared_state
+
+
+@pytest.fixture
+def user_id(app_db):
+    from app.models.user import User
+    with app_db.SessionLocal() as db:
+        user = User(email=f"cache-{id(db)}@example.com", full_name="Cache Test",
+                    password_hash=auth.hash_password("geheim", iterations=1000), role="Mitarbeiter",
+                    is_active=True)
+        db.add(user)
+        db.commit()
+        return user.id
+
+
+def _current(app_db, uid):
+    with app_db.SessionLocal() as db:
+        return auth.get_current_user(SimpleNamespace(session={auth.SESSION_USER_ID: uid}), db)
+
+
+def test_change_visible_after_commit_despite_concurrent_read(app_db, user_id, monkeypatch):
+    from app.models.user import User
+    monkeypatch.setattr(app_settings, "AUTH_USER_CACHE_TTL", 300)
+    assert _current(app_db, user_id).role == "Mitarbeiter"
+
+    with app_db.SessionLocal() as db:
+        db.get(User, user_id).role = "Admin"
+        db.flush()
+        # paralleler Request vor dem Commit: liest (und cacht) den alten Stand
+        assert _current(app_db, user_id).role == "Mitarbeiter"
+        db.commit()
+
+    assert _current(app_db, user_id).role == "Admin"
+
+
+def test_rollback_keeps_cache(app_db, user_id, monkeypatch):
+    from app.models.user import User
+    monkeypatch.setattr(app_settings, "AUTH_USER_CACHE_TTL", 300)
+    _current(app_db, user_id)
+    before = shared_state.stamp(auth.USER_STATE_NAME)
+
+    with app_db.SessionLocal() as db:
+        db.get(User, user_id).role = "Admin"
+        db.flush()
+        db.rollback()
+
+    assert shared_state.stamp(auth.USER_STATE_NAME) == before
+    assert _current(app_db, user_id).role == "Mitarbeiter"
+
+
+def test_deactivate_user_logs_out(app_db, user_id, monkeypatch):
+    monkeypatch.setattr(app_settings, "AUTH_USER_CACHE_TTL", 300)
+    assert _current(app_db, user_id) is not None
+    with app_db.SessionLocal() as db:
+        assert auth.deactivate_user(db, user_id)
+    assert _current(app_db, user_id) is None
+
+
+
+def test_listeners_only_on_app_sessions(app_db):
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    for name, fn in (("after_flush", auth._users_flushed), ("after_commit", auth._users_committed),
+                     ("after_rollback", auth._users_rolled_back)):
+        assert event.contains(app_db.SessionLocal, name, fn)
+        assert not event.contains(Session, name, fn)      # z. B. Sessions von main.py
@@ -0,0 +1,69 @@
+# tests/test_barcode.py
+"""Barcode/SKU in main.py: eindeutig ueber Services und Produkte, auch wenn die Vorpruefung ueberholt wird."""
+import pytest
+
+
+@pytest.fixture
+def race(main_app, monkeypatch):
+    """Erste Vorpruefung laesst alles durch – wie ein paralleler Request, der noch nicht committet hat."""
+    original, calls = main_app._barcode_taken, []
+
+    def taken(db, code, own=None):
+        calls.append(code)
+        return None if len(calls) == 1 else original(db, code, own)
+
+    monkeypatch.setattr(main_app, "_barcode_taken", taken)
+    return main_app
+
+
+def _form(main, model, **kw):
+    values = dict(request=None, name="Neu", preis_chf="10", tax_code="S1", aktiv=True, barcode="",
+                  warengruppe="DL" if model == "service" else "PR")
+    if model == "produkt":
+        values["lagerbestand"] = ""
+    values.update(kw)
+    with main.SessionLocal() as db:
+        if "item_id" in values:
+            item_id = values.pop("item_id")
+            fn = main.service_edit_post if model == "service" else main.produkt_edit_post
+            return fn(item_id, db=db, **values)
+        fn = main.service_new_post if model == "service" else main.produkt_new_post
+        return fn(db=db, **values)
+
+
+def _service(main, name, barcode):
+    with main.SessionLocal() as db:
+        s = main.Service(name=name, basispreis_rp=4500, basispreis=45.0, steuer_code="S1", warengruppe="DL",
+                         aktiv=1, barcode=barcode)
+        db.add(s)
+        db.commit()
+        return s.id
+
+
+@pytest.mark.parametrize("model", ["service", "produkt"])
+def test_new_item_with_taken_barcode_gets_form_error(race, model):
+    code = "7610001" if model == "service" else "7610004"
+    _service(race, "Haarschnitt", code)
+    resp = _form(race, model, barcode=code)
+    assert resp.status_code == 400
+    assert f"Barcode/SKU {code} bereits vergeben (Haarschnitt)" in resp.body.decode()
+
+
+def test_edit_to_taken_barcode_gets_form_error(race):
+    _service(race, "Farbe", "761002")
+    own = _service(race, "Schnitt", None)
+    resp = _form(race, "service", item_id=own, barcode="761002")
+    assert resp.status_code == 400
+    assert "bereits vergeben (Farbe)" in resp.body.decode()
+    with race.SessionLocal() as db:
+        assert db.get(race.Service, own).barcode is None
+
+
+def test_trigger_blocks_cross_table_duplicate(main_app):
+    from sqlalchemy.exc import IntegrityError
+    _service(main_app, "Pflege", "761003")
+    with main_app.SessionLocal() as db:
+        db.add(main_app.Produkt(name="Shampoo", verkaufspreis_rp=1500, verkaufspreis=15.0, steuer_code="S1",
+                                warengruppe="PR", aktiv=1, barcode="761003"))
+        with pytest.raises(IntegrityError):
+            db.commit()
@@ -0,0 +1,81 @@
+# tests/test_config_store.py
+"""DEV-UI-Konfig (app/services/config_store.py): Snapshot, Neuladen nach Dateiaenderung, Abonnenten, Dashboard."""
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings as app_settings
+from app.services import config_store
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    path = tmp_path / "dev_ui_config.json"
+    monkeypatch.setattr(app_settings, "DEV_CONFIG_PATH", str(path))
+    monkeypatch.setattr(app_settings, "DEV_CONFIG_POLL_SEC", 0)
+    monkeypatch.setattr(config_store, "_snapshot", None)
+    monkeypatch.setattr(config_store, "_file_key", None)
+    monkeypatch.setattr(config_store, "_subscribers", [])
+    return path
+
+
+def _write(path, mtime_ns, **flags):
+    cfg = {"header_visibility": {"/kunden": 0}, "dashboard_flags": flags}
+    path.write_text(json.dumps(cfg), encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_subscribers_notified_after_file_change(config_file):
+    _write(config_file, 1_700_000_000_000_000_000, kassenbuch=1)
+    first = config_store.current_config()
+    assert "/kunden" not in [it["href"] for it in config_store.effective_nav_items(True)]
+    got = []
+    unsubscribe = config_store.subscribe(got.append)
+
+    _write(config_file, 1_700_000_001_000_000_000, kassenbuch=0)
+    snap = config_store.current_config()
+    assert got == [snap] and snap.version == first.version + 1
+    assert config_store.effective_dash_flags(True)["kassenbuch"] == 0
+    assert config_store.effective_dash_flags(False)["kassenbuch"] == 1      # ausserhalb DEV: Standard
+
+    # nur beruehrt, Inhalt gleich: neu gelesen, aber keine Benachrichtigung
+    _write(config_file, 1_700_000_002_000_000_000, kassenbuch=0)
+    assert config_store.current_config() is snap and len(got) == 1
+
+    unsubscribe()
+    _write(config_file, 1_700_000_003_000_000_000, kassenbuch=1)
+    assert config_store.current_config().version == snap.version + 1 and len(got) == 1
+
+
+def test_broken_file_keeps_last_snapshot(config_file):
+    _write(config_file, 1_700_000_000_000_000_000, top_artikel=0)
+    snap = config_store.current_config()
+    got = []
+    config_store.subscribe(got.append)
+    config_file.write_text('{"dashboard_flags": {"top_art', encoding="utf-8")   # halb geschrieben
+    assert config_store.current_config() is snap and got == []
+
+
+def test_poll_interval_and_save(config_file, monkeypatch):
+    _write(config_file, 1_700_000_000_000_000_000, umsatz_heute=1)
+    config_store.current_config()
+    monkeypatch.setattr(app_settings, "DEV_CONFIG_POLL_SEC", 3600)
+    _write(config_file, 1_700_000_001_000_000_000, umsatz_heute=0)
+    assert config_store.effective_dash_flags(True)["umsatz_heute"] == 1       # noch im Pruefintervall
+
+    got = []
+    config_store.subscribe(got.append)
+    config_store.save_config({"dashboard_flags": {"pos_quick": 0}})           # eigene Aenderung: sofort
+    assert config_store.effective_dash_flags(True)["pos_quick"] == 0
+    assert len(got) == 1 and not config_file.with_name(config_file.name + ".tmp").exists()
+
+
+def test_dashboard_tiles_follow_config(main_app, config_file):
+    _write(config_file, 1_700_000_000_000_000_000, kassenbuch=0)
+    client = TestClient(main_app.app)
+    html = client.get("/").text                                             # DEV ist Standard
+    assert "Kasse öffnen" in html and "Tagesabschluss (demnächst)" not in html
+    _write(config_file, 1_700_000_001_000_000_000, kassenbuch=1)
+    assert "Tagesabschluss (demnächst)" in client.get("/").text
@@ -0,0 +1,110 @@
+# tests/test_idempotency.py
+"""Idempotenter POS-Checkout (main.pos_checkout, app/services/idempotency.py)."""
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services import idempotency, shared_state
+
+
+@pytest.fixture
+def produkt(main_app):
+    with main_app.SessionLocal() as db:
+        p = main_app.Produkt(name="Haarwachs", verkaufspreis_rp=1800, verkaufspreis=18.0, steuer_code="S1",
+                             warengruppe="PR", aktiv=1, lagerbestand=50)
+        db.add(p)
+        db.commit()
+        shared_state.bump(main_app.STOCK_STATE)
+        return p.id
+
+
+@pytest.fixture
+def client(main_app):
+    return TestClient(main_app.app)
+
+
+def _payload(pid, qty=1):
+    return {"items": [{"type": "produkt", "id": pid, "qty": qty}],
+            "payment": {"method": "bar", "amounts": {"bar": 18.0 * qty}}}
+
+
+def _key():
+    return f"test-{uuid.uuid4()}"
+
+
+def _stored_sale_id(main, key):
+    with main.SessionLocal() as db:
+        row = db.get(main.CheckoutKey, key)
+        return None if row is None else row.sale_id
+
+
+def _sale_count(main):
+    with main.SessionLocal() as db:
+        return db.query(main.Sale).count()
+
+
+def test_replay_returns_stored_response(main_app, client, produkt):
+    key = _key()
+    first = client.post("/pos/checkout", json=_payload(produkt), headers={idempotency.HEADER: key})
+    assert first.status_code == 200
+    before = _sale_count(main_app)
+
+    main_app._checkout_replay._entries.clear()            # auch ohne Prozess-Cache: aus checkout_keys
+    again = client.post("/pos/checkout", json=_payload(produkt), headers={idempotency.HEADER: key})
+    assert again.status_code == 200
+    assert again.content == first.content
+    assert again.headers.get(idempotency.REPLAY_HEADER) == "true"
+    assert _sale_count(main_app) == before
+
+
+def test_same_key_other_payload_is_rejected(main_app, client, produkt):
+    key = _key()
+    assert client.post("/pos/checkout", json=_payload(produkt), headers={idempotency.HEADER: key}).status_code == 200
+    before = _sale_count(main_app)
+    other = client.post("/pos/checkout", json=_payload(produkt, qty=2), headers={idempotency.HEADER: key})
+    assert other.status_code == 422
+    assert _sale_count(main_app) == before
+
+
+def test_concurrent_duplicates_book_one_sale(main_app, produkt):
+    key = _key()
+    before = _sale_count(main_app)
+
+    async def run():
+        transport = httpx.ASGITransport(app=main_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://kasse") as c:
+            return await asyncio.gather(*(
+                c.post("/pos/checkout", json=_payload(produkt), headers={idempotency.HEADER: key})
+                for _ in range(4)))
+
+    responses = asyncio.run(run())
+    assert [r.status_code for r in responses] == [200] * 4
+    assert len({r.json()["sale_id"] for r in responses}) == 1
+    assert sum(r.headers.get(idempotency.REPLAY_HEADER) == "true" for r in responses) == 3
+    assert _sale_count(main_app) == before + 1
+    assert _stored_sale_id(main_app, key) == responses[0].json()["sale_id"]
+
+
+def test_key_committed_elsewhere_replays_on_integrity_error(main_app, produkt):
+    # zweiter Worker: hat den Schluessel weder im Cache noch beim Nachschauen gesehen,
+    # bucht selbst und scheitert beim Commit am Primaerschluessel von checkout_keys
+    key, body = _key(), _payload(produkt)
+    digest = idempotency.request_digest(body["items"], body["payment"])
+    with main_app.SessionLocal() as db:
+        first = main_app._checkout_sync(db, body["items"], body["payment"], key, digest)
+    assert first.status_code == 200
+    before = _sale_count(main_app)
+    with main_app.SessionLocal() as db:
+        stock = db.get(main_app.Produkt, produkt).lagerbestand
+
+    with main_app.SessionLocal() as db:
+        second = main_app._checkout_sync(db, body["items"], body["payment"], key, digest)
+    assert second.status_code == 200
+    assert second.body == first.body
+    assert second.headers.get(idempotency.REPLAY_HEADER) == "true"
+    assert _sale_count(main_app) == before                 # Verkauf zurueckgerollt
+    with main_app.SessionLocal() as db:
+        assert db.get(main_app.Produkt, produkt).lagerbestand == stock
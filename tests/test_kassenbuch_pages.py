@@ -0,0 +1,98 @@
+# tests/test_kassenbuch_pages.py
+"""Kassenbuch-Seiten per Keyset (reports.kassenbuch_page, /berichte/kassenbuch[.json]): Cursor, gleiche ts, letzte Seite."""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services import reports
+
+DAY = datetime(2030, 7, 1)
+VON, BIS = "2030-07-01", "2030-07-02"
+
+
+@pytest.fixture(scope="module")
+def journal(main_app):
+    """12 Belege; 5 davon mit derselben ts (Gleichstand -> Reihenfolge nach id)."""
+    same = DAY + timedelta(hours=10, microseconds=250)
+    stamps = [DAY + timedelta(hours=9, minutes=i) for i in range(4)] + [same] * 5 + \
+             [DAY + timedelta(hours=11, minutes=i) for i in range(3)]
+    with main_app.SessionLocal() as db:
+        sales = []
+        for i, ts in enumerate(stamps):
+            sale = main_app.Sale(ts=ts, kassen_id="K9", brutto_rp=1000 + i, brutto_summe=(1000 + i) / 100,
+                                 rabatt_rp=0)
+            sale.payments.append(main_app.SalePayment(art="bar", betrag_rp=1000 + i, betrag=(1000 + i) / 100))
+            sales.append(sale)
+        db.add_all(sales)
+        db.commit()
+        # erwartete Reihenfolge: neuste zuerst, bei gleicher ts hoehere id zuerst
+        return [s.id for s in sorted(sales, key=lambda s: (s.ts, s.id), reverse=True)]
+
+
+def _all_pages(main, limit):
+    pages, cursor = [], None
+    with main.SessionLocal() as db:
+        while True:
+            rows, cursor = reports.kassenbuch_page(db, datetime(2030, 7, 1), datetime(2030, 7, 2),
+                                                   cursor=cursor, limit=limit)
+            pages.append([r["id"] for r in rows])
+            if cursor is None:
+                return pages
+
+
+def test_cursor_roundtrip():
+    ts = datetime(2030, 7, 1, 10, 0, 0, 250)
+    assert reports.decode_cursor(reports.encode_cursor(ts, 42)) == (ts, 42)
+    assert reports.decode_cursor(reports.encode_cursor(datetime(2030, 7, 1), 7)) == (datetime(2030, 7, 1), 7)
+    for bad in (None, "", "kaputt", "2030-07-01T10:00:00_x", "_5"):
+        assert reports.decode_cursor(bad) is None                 # ungueltig: erste Seite
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 5, 12, 50])
+def test_pages_cover_every_row_once(main_app, journal, limit):
+    pages = _all_pages(main_app, limit)
+    assert [sid for page in pages for sid in page] == journal      # auch ueber den ts-Gleichstand hinweg
+    assert all(len(p) == limit for p in pages[:-1])
+    assert 0 < len(pages[-1]) <= limit                             # keine leere Seite am Schluss
+
+
+def test_page_ending_inside_tie_continues_by_id(main_app, journal):
+    with main_app.SessionLocal() as db:
+        first, cursor = reports.kassenbuch_page(db, DAY, DAY + timedelta(days=1), limit=5)
+        ts, sid = reports.decode_cursor(cursor)
+        assert (ts, sid) == (first[-1]["ts"], first[-1]["id"])
+        second, _ = reports.kassenbuch_page(db, DAY, DAY + timedelta(days=1), cursor=cursor, limit=5)
+    assert first[-1]["ts"] == second[0]["ts"]                       # Schnitt mitten im Gleichstand
+    assert second[0]["id"] < first[-1]["id"]
+
+
+def test_json_endpoint_follows_cursor(main_app, journal):
+    client = TestClient(main_app.app)
+    ids, cursor, pages = [], None, 0
+    while True:
+        params = {"von": VON, "bis": BIS, "limit": 4}
+        if cursor:
+            params["cursor"] = cursor
+        data = client.get("/berichte/kassenbuch.json", params=params).json()
+        pages += 1
+        ids += [it["id"] for it in data["items"]]
+        for it in data["items"]:
+            assert it["payments"] == [{"art": "bar", "betrag": it["brutto_summe"]}]
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert ids == journal and pages == 3
+
+    capped = client.get("/berichte/kassenbuch.json", params={"von": VON, "bis": BIS, "limit": 10 ** 6}).json()
+    assert [it["id"] for it in capped["items"]] == journal and capped["next_cursor"] is None
+
+
+def test_html_page_links_next_cursor(main_app, journal):
+    client = TestClient(main_app.app)
+    first = client.get("/berichte/kassenbuch", params={"von": VON, "bis": BIS, "limit": 10})
+    assert first.status_code == 200 and 'id="kb_more"' in first.text
+    with main_app.SessionLocal() as db:
+        _, cursor = reports.kassenbuch_page(db, DAY, DAY + timedelta(days=1), limit=10)
+    last = client.get("/berichte/kassenbuch", params={"von": VON, "bis": BIS, "limit": 10, "cursor": cursor})
+    assert last.status_code == 200 and 'id="kb_more"' not in last.text
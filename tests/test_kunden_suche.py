@@ -0,0 +1,74 @@
+# tests/test_kunden_suche.py
+"""Kundensuche (app/services/kunden_suche.py): Telefon-Normalisierung, FTS-Index nachtraeglich anlegen."""
+import random
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from app.services import kunden_suche
+
+SAMPLES = ["079 123 45 67", "+41 79 123 45 67", "0041 79 123 45 67", "41791234567", "4179123456",
+           "+41 44", "+4144", "  +41 79", "041 123", "(079) 123-45-67", "079/123'45'67", "", "abc 079",
+           "00 41 79 1", "+49 170 1234567", "417912345678"]
+
+
+def test_sql_and_python_normalize_phone_identically():
+    rnd = random.Random(2301)
+    values = list(SAMPLES)
+    for _ in range(2000):
+        head = rnd.choice(["", "+", "+41", "41", "0041", "0", " +41 "])
+        values.append(head + "".join(rnd.choice("0123456789 -/().'") for _ in range(rnd.randint(0, 12))))
+    con = sqlite3.connect(":memory:")
+    try:
+        con.execute("CREATE TABLE t (v TEXT)")
+        con.executemany("INSERT INTO t VALUES (?)", [(v,) for v in values])
+        rows = con.execute(f"SELECT v, {kunden_suche._phone_sql('v')} FROM t").fetchall()
+    finally:
+        con.close()
+    for value, indexed in rows:
+        assert (indexed.split(" ")[0] if indexed else "") == kunden_suche.normalize_phone(value), value
+
+
+@pytest.fixture
+def engine(sqlite_file):
+    eng = create_engine(f"sqlite:///{sqlite_file}")
+    yield eng
+    eng.dispose()
+
+
+def test_index_created_on_first_search_when_kunden_was_missing(engine, monkeypatch):
+    from app.models.base import Base
+    from app.models.entities import Kunde
+    assert kunden_suche.ensure_kunden_fts(engine) is False        # wie beim Start ohne kunden
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.add_all([Kunde(name="Anna Muster", telefon="+41 79 123 45 67"), Kunde(name="Beat Beispiel")])
+        db.commit()
+        assert [k["name"] for k in kunden_suche.search_kunden(db, "079 123")] == ["Anna Muster"]
+    assert sa_inspect(engine).has_table(kunden_suche.FTS_TABLE)
+
+    # ohne FTS-Index und innerhalb der Wartezeit: LIKE, kein erneuter Versuch
+    calls = []
+    monkeypatch.setattr(kunden_suche, "ensure_kunden_fts", lambda e: calls.append(e) or False)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP TABLE {kunden_suche.FTS_TABLE}")
+    with Session(engine) as db:
+        assert [k["name"] for k in kunden_suche.search_kunden(db, "Beat")] == ["Beat Beispiel"]
+    assert calls == []
+
+
+def test_outdated_view_is_replaced(engine):
+    from app.models.base import Base
+    from app.models.entities import Kunde
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"CREATE VIEW {kunden_suche.SOURCE_VIEW} AS "
+                             f"SELECT id, name, telefon, email, bemerkungen FROM kunden")
+    with Session(engine) as db:
+        db.add(Kunde(name="Cla", telefon="41791234567"))
+        db.commit()
+    assert kunden_suche.ensure_kunden_fts(engine)
+    with Session(engine) as db:
+        assert [k["name"] for k in kunden_suche.search_kunden(db, "079 12")] == ["Cla"]
@@ -0,0 +1,143 @@
+# tests/test_money.py
+"""
+Eigenschaften von app/services/money.py und den Summen darauf: zufaellige,
+aber geseedete Faelle (reproduzierbar), Vergleich mit einer Decimal-Referenz.
+Kein Betrag darf um einen Rappen abweichen.
+"""
+import random
+from decimal import ROUND_HALF_UP, Decimal
+
+import pytest
+
+from app.services import money, pricing, shared_state
+from app.services.tax_rates import DEFAULT_RATES, TaxRates
+
+CASES = 5000
+RATES = [Decimal(r) for r in DEFAULT_RATES.values()] + [Decimal("0.077"), Decimal("0.025")]
+TABLE = TaxRates.build(DEFAULT_RATES)
+
+
+def _ref_rappen(d: Decimal) -> int:
+    return int(d.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) * 100)
+
+
+def test_to_rappen_matches_decimal_and_roundtrips():
+    rnd = random.Random(1601)
+    for _ in range(CASES):
+        text = f"{rnd.randint(-10 ** 6, 10 ** 6)}.{rnd.randint(0, 999):03d}"
+        assert money.to_rappen(text) == _ref_rappen(Decimal(text)), text
+        rp = rnd.randint(-10 ** 9, 10 ** 9)
+        assert money.to_rappen(money.chf(rp)) == rp              # float-JSON zurueck, ohne Drift
+        assert money.to_rappen(money.fmt_chf(rp)) == rp
+
+
+def test_split_gross_adds_up_and_matches_reference():
+    rnd = random.Random(1602)
+    for _ in range(CASES):
+        gross, rate = rnd.randint(-10 ** 7, 10 ** 7), rnd.choice(RATES)
+        net, tax = money.split_gross(gross, rate)
+        assert net + tax == gross
+        assert net == _ref_rappen(Decimal(gross) / 100 / (1 + rate)), (gross, rate)
+
+
+def test_allocate_sums_exactly_and_stays_proportional():
+    rnd = random.Random(1603)
+    for _ in range(CASES):
+        weights = [rnd.randint(0, 50_000) for _ in range(rnd.randint(1, 12))]
+        total = rnd.randint(0, 100_000)
+        parts = money.allocate(total, weights)
+        assert len(parts) == len(weights)
+        if sum(weights) == 0:
+            assert parts == [0] * len(weights)
+            continue
+        assert sum(parts) == total
+        # jeder Anteil (ausser dem Rest auf der letzten Position) hoechstens einen halben Rappen daneben
+        for w, p in zip(weights[:-1], parts[:-1]):
+            assert abs(Decimal(p) - Decimal(w * total) / sum(weights)) <= Decimal("0.5")
+
+
+def _random_cart(rnd):
+    items = [{"line_id": i, "typ": "service", "ref_id": i, "name": f"Pos {i}",
+              "qty": rnd.choice([1, 1, 2, 3, Decimal("0.5"), Decimal("1.5")]),
+              "unit_price": f"{rnd.randint(5, 400)}.{rnd.randint(0, 99):02d}",
+              "steuer_code": rnd.choice(list(DEFAULT_RATES))} for i in range(rnd.randint(1, 10))]
+    cart = {"items": items, "tip": f"{rnd.randint(0, 20)}.{rnd.randint(0, 99):02d}"}
+    if rnd.random() < 0.5:
+        cart["discount_percent"] = rnd.choice([5, 10, 12.5, 33])
+    return cart
+
+
+def test_summarize_cart_totals_consistent():
+    rnd = random.Random(1604)
+    for _ in range(CASES // 5):
+        cart = _random_cart(rnd)
+        out = pricing.summarize_cart(cart, db=None, rates=TABLE)
+        rp = money.to_rappen
+        lines = [rp(it["line_gross"]) for it in out["items"]]
+        assert lines == [_ref_rappen(Decimal(it["unit_price"]) * it["qty"]) for it in cart["items"]]
+        assert rp(out["subtotal_gross"]) == sum(lines)
+        discount = rp(out["discount_amount"])
+        if "discount_percent" in cart:
+            assert discount == _ref_rappen(Decimal(sum(lines)) / 100 * Decimal(str(cart["discount_percent"])) / 100)
+        assert rp(out["total_gross"]) == sum(lines) - discount + rp(cart["tip"])
+        assert sum(rp(v) for v in out["tax_by_code"].values()) == rp(out["tax_total"])
+
+
+def test_line_total_rounds_once_per_line():
+    assert money.line_total("0.125", 8) == 100               # nicht 0.13 x 8 = 1.04
+    assert money.line_total(Decimal("19.995"), 3) == 5999
+    assert money.line_total(4.35, Decimal("0.5")) == 218
+    rnd = random.Random(1607)
+    for _ in range(CASES):
+        price = Decimal(f"{rnd.randint(0, 999)}.{rnd.randint(0, 9999):04d}")
+        qty = rnd.choice([1, 2, 3, 7, 8, Decimal("0.5"), Decimal("1.25")])
+        assert money.line_total(price, qty) == _ref_rappen(price * qty), (price, qty)
+    with pytest.raises(ValueError):
+        money.line_total("abc", 1)
+
+
+def test_summarize_cart_sub_rappen_unit_price():
+    cart = {"items": [{"line_id": 1, "typ": "produkt", "ref_id": 1, "name": "Tube", "qty": 8,
+                       "unit_price": "0.125", "steuer_code": "CH-8.1"}]}
+    out = pricing.summarize_cart(cart, db=None, rates=TABLE)
+    assert out["items"][0]["line_gross"] == 1.0
+    assert out["total_gross"] == 1.0
+
+
+@pytest.fixture
+def katalog(main_app):
+    rnd = random.Random(1605)
+    with main_app.SessionLocal() as db:
+        items = [main_app.Produkt(name=f"Artikel {i}", verkaufspreis_rp=rnd.randint(50, 25_000), verkaufspreis=0.0,
+                                  steuer_code=rnd.choice(["S1", "S2"]), warengruppe="PR", aktiv=1)
+                 for i in range(20)]
+        db.add_all(items)
+        db.commit()
+        shared_state.bump(main_app.STOCK_STATE)
+        return {p.id: p.verkaufspreis_rp for p in items}
+
+
+def test_checkout_totals_never_drift(main_app, katalog):
+    rnd = random.Random(1606)
+    ids = sorted(katalog)
+    for _ in range(60):
+        cart = [{"type": "produkt", "id": pid, "qty": rnd.randint(1, 5)} for pid in rnd.sample(ids, rnd.randint(1, 8))]
+        total = sum(katalog[r["id"]] * r["qty"] for r in cart)
+        parts = money.allocate(total, [rnd.randint(1, 100) for _ in range(3)])
+        # Kombi-Zahlung wie vom Browser: CHF als float
+        amounts = dict(zip(("bar", "karte", "twint"), map(money.chf, parts)))
+        with main_app.SessionLocal() as db:
+            off = dict(amounts, bar=money.chf(parts[0] + 1))
+            assert main_app._checkout_sync(db, cart, {"method": "kombi", "amounts": off}).status_code == 400
+        with main_app.SessionLocal() as db:
+            assert main_app._checkout_sync(db, cart, {"method": "kombi", "amounts": amounts}).status_code == 200
+        with main_app.SessionLocal() as db:
+            sale = db.query(main_app.Sale).order_by(main_app.Sale.id.desc()).first()
+            assert sale.brutto_rp == total
+            assert sum(p.betrag_rp for p in db.query(main_app.SalePayment).filter_by(sale_id=sale.id)) == total
+            lines = db.query(main_app.SaleItem).filter_by(sale_id=sale.id).all()
+            assert sum(i.vk_brutto_rp * i.menge for i in lines) == total
+            vat = main_app.vat_rates()
+            for i in lines:
+                net, tax, gross = main_app.vat_split(i.vk_brutto_rp * i.menge, vat, i.steuer_code)
+                assert money.to_rappen(net) + money.to_rappen(tax) == money.to_rappen(gross)
@@ -0,0 +1,52 @@
+# tests/test_pdf_export.py
+"""Kassenbuch-PDF: Journal-Tabellen werden waehrend doc.build() nachgeladen (nur mit gepruefter ReportLab-Version)."""
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("reportlab")
+
+
+def test_lazy_story_pulls_on_demand(main_app):
+    pulled = []
+
+    def more():
+        for i in range(10):
+            pulled.append(i)
+            yield i
+
+    story = main_app._LazyStory(["kopf"], more(), ahead=3)
+    assert pulled == []
+    assert len(story) == 3 and pulled == [0, 1]
+    del story[0]
+    assert len(story) == 3 and pulled == [0, 1, 2]
+    while len(story):
+        del story[0]
+    assert pulled == list(range(10))
+
+
+@pytest.mark.parametrize("internals", [True, False], ids=["geprueft", "andere-version"])
+def test_kassenbuch_pdf_contains_every_row(main_app, monkeypatch, internals):
+    pypdf = pytest.importorskip("pypdf")
+    main = main_app
+    if not internals:
+        monkeypatch.setattr(main, "REPORTLAB_INTERNALS", ((0, 0), (0, 1)))
+        from reportlab.pdfgen.canvas import Canvas
+        assert main._pdf_canvas() is Canvas
+        assert type(main._pdf_story(["kopf"], iter([1, 2]))) is list
+    assert main._reportlab_internals_ok() is internals
+    n, day = 2 * main.PDF_TABLE_CHUNK + 37, datetime(2024, 2, 1)
+    with main.SessionLocal() as db:
+        for i in range(n):
+            db.add(main.Sale(ts=day + timedelta(seconds=30 * i), kassen_id="K7", brutto_rp=1000,
+                             brutto_summe=10.0, rabatt_rp=0))
+        db.commit()
+        path = main._render_kassenbuch_pdf(db, "2024-02-01", "2024-02-02", "K7")
+        db.query(main.Sale).filter_by(kassen_id="K7").delete()
+        db.commit()
+
+    reader = pypdf.PdfReader(path)
+    text = "".join(page.extract_text() for page in reader.pages)
+    assert len(re.findall(r"\d\d\.\d\d\.\d{4} \d\d:\d\d", text)) == n
+    assert len(reader.pages) > 1
@@ -0,0 +1,89 @@
+# tests/test_pos_catalog.py
+"""POS-Katalog in main.py: /catalog-Alias (ASGI), ETag/If-None-Match fuer /pos/katalog und /pos/lager."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services import shared_state
+
+
+@pytest.fixture
+def client(main_app):
+    return TestClient(main_app.app)
+
+
+@pytest.fixture
+def produkt(main_app):
+    with main_app.SessionLocal() as db:
+        p = main_app.Produkt(name="Conditioner", verkaufspreis_rp=2200, verkaufspreis=22.0, steuer_code="S1",
+                             warengruppe="PR", aktiv=1, lagerbestand=9)
+        db.add(p)
+        db.commit()
+        main_app._catalog_changed(p)
+        shared_state.bump(main_app.STOCK_STATE)
+        return p.id
+
+
+@pytest.mark.parametrize("path, target", [
+    ("/catalog", "/katalog"),
+    ("/catalog?q=wachs", "/katalog?q=wachs"),
+    ("/catalog/produkt/neu", "/katalog/produkt/neu"),
+    ("/catalog/service/3?x=1&y=2", "/katalog/service/3?x=1&y=2"),
+])
+def test_catalog_alias_redirects(client, path, target):
+    for method in ("GET", "POST"):                                  # 307: Methode und Body bleiben
+        resp = client.request(method, path, follow_redirects=False)
+        assert resp.status_code == 307
+        assert resp.headers["location"] == "http://testserver" + target
+
+
+def test_other_paths_pass_alias(client):
+    assert client.get("/catalogue", follow_redirects=False).status_code == 404
+    assert client.get("/katalog", follow_redirects=False).status_code == 200
+
+
+def _etag(client, path):
+    resp = client.get(path)
+    assert resp.status_code == 200
+    return resp.headers["etag"], resp
+
+
+def test_if_none_match_gives_304(client, produkt):
+    etag, resp = _etag(client, "/pos/katalog")
+    assert "Conditioner" in resp.text
+    for header in (etag, f"W/{etag}", f'"veraltet", {etag}', "*"):
+        again = client.get("/pos/katalog", headers={"If-None-Match": header})
+        assert again.status_code == 304 and again.content == b""
+        assert again.headers["etag"] == etag
+    assert client.get("/pos/katalog", headers={"If-None-Match": '"veraltet"'}).status_code == 200
+
+
+def test_catalog_etag_changes_after_edit(client, produkt):
+    etag, _ = _etag(client, "/pos/katalog")
+    resp = client.post(f"/katalog/produkt/{produkt}", data={
+        "name": "Conditioner XL", "preis_chf": "24.50", "tax_code": "S1", "warengruppe": "PR", "aktiv": "true",
+        "lagerbestand": "9", "barcode": ""}, follow_redirects=False)
+    assert resp.status_code in (302, 303)
+    assert client.get("/pos/katalog", headers={"If-None-Match": etag}).status_code == 200
+    new_etag, resp = _etag(client, "/pos/katalog")
+    assert new_etag != etag and "Conditioner XL" in resp.text and "24.50" in resp.text
+
+    resp = client.post("/katalog/service/neu", data={"name": "Bartpflege", "preis_chf": "25", "tax_code": "S1",
+                                                     "warengruppe": "DL", "aktiv": "true", "barcode": ""},
+                       follow_redirects=False)
+    assert resp.status_code in (302, 303)
+    assert _etag(client, "/pos/katalog")[0] != new_etag
+
+
+def test_stock_etag_changes_after_sale(client, produkt):
+    catalog_etag, _ = _etag(client, "/pos/katalog")
+    etag, resp = _etag(client, "/pos/lager")
+    assert resp.json()[str(produkt)] == 9
+    assert client.get("/pos/lager", headers={"If-None-Match": etag}).status_code == 304
+
+    sale = client.post("/pos/checkout", json={"items": [{"type": "produkt", "id": produkt, "qty": 2}],
+                                              "payment": {"method": "bar", "amounts": {"bar": 44.0}}})
+    assert sale.status_code == 200
+    assert client.get("/pos/lager", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/pos/lager").json()[str(produkt)] == 7
+    # Bestand ist nicht Teil des Katalogs: dessen ETag bleibt
+    assert client.get("/pos/katalog", headers={"If-None-Match": catalog_etag}).status_code == 304
@@ -0,0 +1,111 @@
+# tests/test_report_jobs.py
+"""Berichts-Jobs (app/services/report_jobs.py): Queue, Ergebnis-Cache je Datenstand, Aufraeumen mit Lease."""
+import os
+import tempfile
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+from app.services.report_jobs import ReportJobQueue
+
+
+@pytest.fixture
+def queue(sqlite_file, tmp_path):
+    state = {"fp": "v1", "renders": 0}
+
+    def render(db, von, bis, kassen_id):
+        state["renders"] += 1
+        fd, path = tempfile.mkstemp(suffix=".pdf", dir=tmp_path)
+        with os.fdopen(fd, "wb") as f:
+            f.write(f"%PDF {von} {bis} {kassen_id} {state['fp']}".encode())
+        return path
+
+    def broken(db, von, bis, kassen_id):
+        raise RuntimeError("kaputt")
+
+    engine = create_engine(f"sqlite:///{sqlite_file}")
+    q = ReportJobQueue(engine, tmp_path / "cache", {"test": render, "kaputt": broken},
+                       lambda db, von, bis, kassen_id: state["fp"], max_artifacts=2, lease_sec=60)
+    q.state = state
+    yield q
+    engine.dispose()
+
+
+def _work(q):
+    """Ein Durchlauf eines Worker-Threads (ohne start(), deterministisch)."""
+    job = q._claim()
+    assert job is not None
+    q._run(job)
+    return q.get(job["id"])
+
+
+def _age(path, seconds):
+    t = time.time() - seconds
+    os.utime(path, (t, t))
+
+
+def test_submit_queues_once_per_data_state(queue):
+    job = queue.submit("test", "2024-01-01", "2024-01-31")
+    assert job["status"] == "queued"
+    assert queue.submit("test", "2024-01-01", "2024-01-31")["id"] == job["id"]   # noch in Arbeit
+    assert queue._claim() is not None and queue._claim() is None                  # nur ein Worker bekommt ihn
+
+    queue._run(queue.get(job["id"]))
+    done = queue.get(job["id"])
+    assert done["status"] == "done" and os.path.exists(done["path"])
+    assert queue.submit("test", "2024-01-01", "2024-01-31")["id"] == job["id"]   # Cache-Treffer
+    assert queue.state["renders"] == 1
+
+    queue.state["fp"] = "v2"                                                      # neue Verkaeufe
+    assert queue.submit("test", "2024-01-01", "2024-01-31")["status"] == "queued"
+
+
+def test_render_now_reuses_result_and_dedups_files(queue):
+    first = queue.render_now("test", "2024-02-01")
+    assert first["status"] == "done"
+    assert queue.render_now("test", "2024-02-01")["id"] == first["id"]
+    assert queue.state["renders"] == 1
+
+    os.unlink(first["path"])                                   # Datei weg: neu rendern
+    again = queue.render_now("test", "2024-02-01")
+    assert again["id"] != first["id"] and again["content_hash"] == first["content_hash"]
+    assert again["path"] == first["path"] and os.path.exists(again["path"])
+
+
+def test_failed_render_is_recorded(queue):
+    job = queue.render_now("kaputt")
+    assert job["status"] == "failed" and job["error"] == "kaputt"
+    with pytest.raises(ValueError):
+        queue.submit("unbekannt")
+
+
+def test_prune_keeps_max_artifacts(queue):
+    jobs = []
+    for month in range(1, 5):
+        jobs.append(queue.render_now("test", f"2024-{month:02d}-01"))
+        _age(jobs[-1]["path"], 3600)                           # Lease laengst abgelaufen
+        time.sleep(0.01)
+    queue._prune()
+    assert [queue.get(j["id"]) is not None for j in jobs] == [False, False, True, True]
+    assert sorted(p.name for p in queue.cache_dir.iterdir()) == sorted(
+        os.path.basename(j["path"]) for j in jobs[2:])
+
+
+def test_prune_spares_file_being_served(queue):
+    served = queue.render_now("test", "2024-05-01")
+    _age(served["path"], 3600)
+    # Auslieferung: Cache-Treffer least die Datei (wie _serve_report_pdf bzw. der Download)
+    assert queue.render_now("test", "2024-05-01")["id"] == served["id"]
+    with open(served["path"], "rb") as streaming:
+        for month in (6, 7):
+            queue.render_now("test", f"2024-{month:02d}-01")
+            time.sleep(0.01)
+        assert queue.get(served["id"]) is None                 # Job ist aus dem Index
+        assert os.path.exists(served["path"])                  # Datei bleibt waehrend der Lease
+        assert streaming.read().startswith(b"%PDF")
+
+    _age(served["path"], 3600)                                 # Lease abgelaufen
+    queue._prune()
+    assert not os.path.exists(served["path"])
+    assert queue.lease(served) is False
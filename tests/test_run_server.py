@@ -0,0 +1,26 @@
+# tests/test_run_server.py
+"""Server-Modus (run_server.py): nur lokal per Standard, kein Entwicklungs-Geheimnis im Netz/mit Workern."""
+import pytest
+
+import run_server
+from app.config import settings as app_settings
+
+
+def test_server_binds_locally_by_default():
+    assert app_settings.SERVER_HOST == "127.0.0.1"
+    assert run_server._parse_args(["--server"]).host is None
+
+
+@pytest.mark.parametrize("host, workers", [("0.0.0.0", 1), ("127.0.0.1", 4), ("192.168.1.20", 2)])
+def test_dev_secret_refused_for_public_or_multi_worker(monkeypatch, host, workers):
+    monkeypatch.delenv(app_settings.SESSION_SECRET_ENV, raising=False)
+    with pytest.raises(SystemExit, match=app_settings.SESSION_SECRET_ENV):
+        run_server._check_session_secret(host, workers)
+
+
+def test_local_single_worker_or_own_secret_allowed(monkeypatch):
+    monkeypatch.delenv(app_settings.SESSION_SECRET_ENV, raising=False)
+    run_server._check_session_secret("127.0.0.1", 1)
+    monkeypatch.setenv(app_settings.SESSION_SECRET_ENV, "a3f9" * 16)
+    assert app_settings.session_secret() == "a3f9" * 16
+    run_server._check_session_secret("0.0.0.0", 4)
@@ -0,0 +1,83 @@
+# tests/test_settings.py
+"""Settings-Datei in main.py: Snapshot-Cache (Inode/mtime/Groesse), atomares Speichern, /einstellungen/cache."""
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def settings_file(main_app, tmp_path, monkeypatch):
+    path = tmp_path / "settings.json"
+    monkeypatch.setattr(main_app, "SETTINGS_PATH", path)
+    monkeypatch.setattr(main_app, "_settings_cache", (None, None))
+    return path
+
+
+def _write(path, rate1, mtime_ns=None):
+    path.write_text(json.dumps({"vat": {"rate1": rate1, "rate2": 2.6}}), encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_snapshot_cached_until_file_changes(main_app, settings_file):
+    _write(settings_file, 8.1, mtime_ns=1_700_000_000_000_000_000)
+    first = main_app.settings_snapshot()
+    assert first["vat"]["rate1"] == 8.1
+    assert main_app.settings_snapshot() is first
+
+    # gleiche Datei (Inode) und Groesse, anderer Inhalt: erst die neue mtime macht ihn sichtbar
+    _write(settings_file, 7.7, mtime_ns=1_700_000_000_000_000_000)
+    assert main_app.settings_snapshot() is first
+    _write(settings_file, 7.7, mtime_ns=1_700_000_001_000_000_000)
+    assert main_app.settings_snapshot()["vat"]["rate1"] == 7.7
+
+    # andere Groesse bei gleicher mtime
+    _write(settings_file, 10.25, mtime_ns=1_700_000_001_000_000_000)
+    assert main_app.settings_snapshot()["vat"]["rate1"] == 10.25
+
+
+def test_snapshot_is_read_only(main_app, settings_file):
+    _write(settings_file, 8.1)
+    snap = main_app.settings_snapshot()
+    with pytest.raises(TypeError):
+        snap["vat"]["rate1"] = 0
+    with pytest.raises(TypeError):
+        snap["kasse"] = {}
+    copy = main_app.load_settings()
+    copy["vat"]["rate1"] = 0
+    assert main_app.settings_snapshot()["vat"]["rate1"] == 8.1
+
+
+def test_save_replaces_file_atomically(main_app, settings_file, monkeypatch):
+    _write(settings_file, 8.1)
+    data = main_app.load_settings()
+    data["kasse"]["id"] = "K2"
+    main_app.save_settings(data)
+    assert main_app.settings_snapshot()["kasse"]["id"] == "K2"
+
+    # Abbruch mitten im Schreiben: alte Datei unveraendert, keine Temp-Datei zurueck
+    def broken_dump(obj, f, **kw):
+        f.write('{"kasse": ')
+        raise OSError("Platte voll")
+
+    monkeypatch.setattr(main_app.json, "dump", broken_dump)
+    with pytest.raises(OSError):
+        main_app.save_settings({"kasse": {"id": "K3"}})
+    assert json.loads(settings_file.read_text(encoding="utf-8"))["kasse"]["id"] == "K2"
+    assert [p.name for p in settings_file.parent.iterdir()] == ["settings.json"]
+    assert main_app.settings_snapshot()["kasse"]["id"] == "K2"
+
+
+def test_cache_endpoint_counts_hits_and_misses(main_app, settings_file):
+    _write(settings_file, 8.1)
+    client = TestClient(main_app.app)
+    before = client.get("/einstellungen/cache").json()
+    main_app.settings_snapshot()
+    main_app.settings_snapshot()
+    _write(settings_file, 10.25, mtime_ns=1_800_000_000_000_000_000)
+    main_app.settings_snapshot()
+    after = client.get("/einstellungen/cache").json()
+    assert after["misses"] - before["misses"] == 2
+    assert after["hits"] - before["hits"] == 1
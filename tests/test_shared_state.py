@@ -0,0 +1,44 @@
+# tests/test_shared_state.py
+"""Stempel fuer Cache-Invalidierung (app/services/shared_state.py) und Schema-Anlage im Server-Modus."""
+import sqlite3
+import threading
+
+from app.services import shared_state
+
+
+def test_every_bump_is_a_new_stamp():
+    seen = {shared_state.stamp("test_ns")}
+    for _ in range(50):
+        # schnell hintereinander: gleiche mtime/Inode waeren moeglich, das Token nicht
+        written = shared_state.bump("test_ns")
+        assert written not in seen
+        assert shared_state.stamp("test_ns") == written
+        seen.add(written)
+
+
+def test_parallel_bumps_leave_a_valid_stamp():
+    got, lock = [], threading.Lock()
+
+    def run():
+        for _ in range(20):
+            token = shared_state.bump("test_parallel")
+            with lock:
+                got.append(token)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert None not in got and len(set(got)) == len(got)
+    assert shared_state.stamp("test_parallel") in got
+
+
+def test_worker_import_skips_schema_setup(fresh_workdir):
+    fresh_workdir.import_main(KSB_SCHEMA_READY="1")
+
+    con = sqlite3.connect(fresh_workdir.app_db)
+    try:
+        assert con.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table'").fetchone() == (0,)
+    finally:
+        con.close()
@@ -0,0 +1,102 @@
+# tests/test_sqlite_concurrency.py
+"""
+SQLite-Profil (apply_sqlite_profile: WAL, busy_timeout, ...): Berichte lesen,
+waehrend Checkouts schreiben – ohne "database is locked".
+"""
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.config import settings as app_settings
+from app.models.base import apply_sqlite_profile
+from app.services import reports
+
+
+def _engine(path, pragmas):
+    # timeout=0: pysqlite wartet sonst selbst 5 s; massgeblich soll nur das Profil sein
+    return apply_sqlite_profile(
+        create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 0}), pragmas)
+
+
+def _commit_while_reading(engine):
+    """Schreibt und committet, waehrend eine zweite Verbindung mitten in einem SELECT steht."""
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE t (id INTEGER PRIMARY KEY, v INTEGER)")
+        conn.exec_driver_sql("INSERT INTO t (v) VALUES " + ",".join("(1)" for _ in range(500)))
+    with engine.connect() as reader, engine.connect() as writer:
+        rows = reader.exec_driver_sql("SELECT v FROM t")
+        rows.fetchone()                                    # Lesetransaktion offen
+        with writer.begin():
+            writer.exec_driver_sql("INSERT INTO t (v) VALUES (2)")
+        assert len(rows.fetchall()) == 499                 # Leser sieht seinen Snapshot
+
+
+def test_profile_sets_pragmas(sqlite_file):
+    engine = _engine(sqlite_file, None)
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar().lower() == "wal"
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == app_settings.SQLITE_PRAGMAS["busy_timeout"]
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1      # NORMAL
+
+
+def test_reader_blocks_writer_without_wal(sqlite_file):
+    engine = _engine(sqlite_file, {"journal_mode": "DELETE", "busy_timeout": 0})
+    with pytest.raises(OperationalError, match="database is locked"):
+        _commit_while_reading(engine)
+
+
+def test_reader_does_not_block_writer_with_profile(sqlite_file):
+    _commit_while_reading(_engine(sqlite_file, None))
+
+
+def test_reports_during_checkouts(main_app):
+    main = main_app
+    with main.SessionLocal() as db:
+        svc = main.Service(name="Konkurrenz-Test", basispreis_rp=2500, basispreis=25.0,
+                           steuer_code="S1", warengruppe="DL", aktiv=1)
+        db.add(svc)
+        db.commit()
+        sid = svc.id
+        before = db.execute(text("SELECT COUNT(*) FROM sales")).scalar()
+
+    writers, per_writer = 4, 15
+    errors, stop = [], threading.Event()
+    items = [{"type": "service", "id": sid, "qty": 2}]
+    pay = {"method": "bar", "amounts": {"bar": 50.0}}
+
+    def checkout():
+        try:
+            for _ in range(per_writer):
+                with main.SessionLocal() as db:
+                    resp = main._checkout_sync(db, items, pay)
+                    assert resp.status_code == 200, resp.body
+        except Exception as exc:          # pragma: no cover - Fehler wird unten gemeldet
+            errors.append(exc)
+
+    def report():
+        try:
+            while not stop.is_set():
+                with main.SessionLocal() as db:
+                    reports.journal_totals(db)
+                    for _ in reports.kassenbuch_rows(db):
+                        pass
+                    time.sleep(0.01)      # Lesetransaktion bleibt offen
+        except Exception as exc:          # pragma: no cover
+            errors.append(exc)
+
+    readers = [threading.Thread(target=report) for _ in range(2)]
+    threads = [threading.Thread(target=checkout) for _ in range(writers)]
+    for t in readers + threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stop.set()
+    for t in readers:
+        t.join()
+
+    assert errors == []
+    with main.SessionLocal() as db:
+        assert db.execute(text("SELECT COUNT(*) FROM sales")).scalar() == before + writers * per_writer
@@ -0,0 +1,102 @@
+# tests/test_stock.py
+"""Lager in main.py: bedingter Abzug, Produkte ohne Lagerfuehrung, Cache-Stempel, Migration."""
+import sqlite3
+
+import pytest
+
+from app.services import shared_state
+
+
+@pytest.fixture
+def produkt(main_app):
+    def make(lagerbestand):
+        with main_app.SessionLocal() as db:
+            p = main_app.Produkt(name="Shampoo", verkaufspreis_rp=1500, verkaufspreis=15.0, steuer_code="S1",
+                                 warengruppe="PR", aktiv=1, lagerbestand=lagerbestand)
+            db.add(p)
+            db.commit()
+            shared_state.bump(main_app.STOCK_STATE)     # wie _stock_changed im Formular
+            return p.id
+    return make
+
+
+def _sell(main, pid, qty):
+    with main.SessionLocal() as db:
+        return main._checkout_sync(db, [{"type": "produkt", "id": pid, "qty": qty}],
+                                   {"method": "bar", "amounts": {"bar": 15.0 * qty}})
+
+
+def _stock(main, pid):
+    with main.SessionLocal() as db:
+        return db.get(main.Produkt, pid).lagerbestand
+
+
+def test_sale_needs_enough_stock(main_app, produkt):
+    pid = produkt(1)
+    assert _sell(main_app, pid, 2).status_code == 409
+    assert _stock(main_app, pid) == 1
+    assert _sell(main_app, pid, 1).status_code == 200
+    assert _stock(main_app, pid) == 0
+    assert _sell(main_app, pid, 1).status_code == 409
+
+
+def test_untracked_product_is_sold_and_stays_null(main_app, produkt):
+    pid = produkt(None)
+    assert _sell(main_app, pid, 3).status_code == 200
+    assert _stock(main_app, pid) is None
+    with main_app.SessionLocal() as db:
+        moves = db.query(main_app.LagerJournal).filter_by(produkt_id=pid).all()
+    assert [(m.menge, m.bestand_nach, m.grund) for m in moves] == [(-3, None, "verkauf")]
+    with main_app.SessionLocal() as db:
+        assert pid not in main_app.stock_levels(db)
+
+
+def test_count_starts_tracking(main_app, produkt):
+    pid = produkt(None)
+    with main_app.SessionLocal() as db:
+        item = db.get(main_app.Produkt, pid)
+        assert main_app._correct_stock(db, item, "4") == {pid: 4}
+        db.commit()
+    assert _stock(main_app, pid) == 4
+    assert _sell(main_app, pid, 5).status_code == 409
+
+
+def test_stock_levels_follow_other_workers(main_app, produkt):
+    pid = produkt(7)
+    with main_app.SessionLocal() as db:
+        assert main_app.stock_levels(db)[pid] == 7
+        # anderer Worker bucht: DB direkt aendern, Stempel setzen
+        db.query(main_app.Produkt).filter_by(id=pid).update({"lagerbestand": 3})
+        db.commit()
+        assert main_app.stock_levels(db)[pid] == 7      # ohne Stempel: Cache
+        shared_state.bump(main_app.STOCK_STATE)
+        assert main_app.stock_levels(db)[pid] == 3
+
+
+def test_own_sale_updates_cache(main_app, produkt):
+    pid = produkt(5)
+    with main_app.SessionLocal() as db:
+        main_app.stock_levels(db)
+    assert _sell(main_app, pid, 2).status_code == 200
+    with main_app.SessionLocal() as db:
+        assert main_app.stock_levels(db)[pid] == 3
+
+
+def test_untracked_stock_migration(fresh_workdir):
+    con = sqlite3.connect(fresh_workdir.app_db)
+    con.executescript("""
+        CREATE TABLE produkte (id INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, verkaufspreis FLOAT,
+                               steuer_code VARCHAR(10), lagerbestand INTEGER, aktiv BOOLEAN, warengruppe VARCHAR(4));
+        INSERT INTO produkte VALUES (1, 'Shampoo', 10, 'S1', 5, 1, 'PR'), (2, 'Wachs', 10, 'S1', 0, 1, 'PR');
+    """)
+    con.commit()
+    con.close()
+
+    fresh_workdir.import_main()
+
+    con = sqlite3.connect(fresh_workdir.app_db)
+    try:
+        # vor der Lagerfuehrung nie gezaehlt: ohne Lagerfuehrung weiter
+        assert con.execute("SELECT id, lagerbestand FROM produkte ORDER BY id").fetchall() == [(1, None), (2, None)]
+    finally:
+        con.close()
@@ -0,0 +1,39 @@
+# tests/test_tax_rates.py
+"""Steuersaetze (app/services/tax_rates.py): Fallback ohne Konfig und Standardcode im Checkout."""
+from decimal import Decimal
+from types import SimpleNamespace
+
+from app.services import tax_rates
+from app.services.checkout import process_checkout
+
+
+def test_fallback_uses_current_swiss_rates():
+    table = tax_rates._parse_konfig(None)
+    assert table.rate("CH-8.1") == Decimal("0.081")
+    assert table.rate("CH-3.8") == Decimal("0.038")
+    assert table.rate("CH-2.6") == Decimal("0.026")
+    assert table.rate("CH-0") == 0
+    assert "CH-7.7" not in table.rates
+    assert tax_rates._parse_konfig("{kaputt") is table
+
+
+def test_item_without_code_is_taxed_at_standard_rate(app_db):
+    with app_db.SessionLocal() as db:
+        res = process_checkout(db, {
+            "items": [{"type": "service", "name": "Haarschnitt", "price": "108.10", "qty": 1}],
+            "payment": [{"method": "bar", "amount": "108.10"}],
+        }, SimpleNamespace(id=None, role="kasse"))
+    assert res["tax_breakdown"] == {"CH-8.1": "8.10"}      # keine Konfig 'taxes': Fallback
+
+
+def test_checkout_taxes_discounted_lines_in_rappen(app_db):
+    with app_db.SessionLocal() as db:
+        res = process_checkout(db, {
+            "items": [{"type": "service", "name": "Haarschnitt", "price": "108.10", "qty": 1},
+                      {"type": "produkt", "name": "Tube", "price": "0.125", "qty": 8, "tax": "CH-2.6"}],
+            "discount_pct": "10", "tip": "2",
+            "payment": [{"method": "bar", "amount": "100.19"}],
+        }, SimpleNamespace(id=None, role="kasse"))
+    assert (res["subtotal"], res["discount"], res["total"]) == ("109.10", "10.91", "100.19")
+    # Rabatt 10.81 / 0.10 auf die Zeilen verteilt, Steuer aus 97.29 bzw. 0.90
+    assert res["tax_breakdown"] == {"CH-8.1": "7.29", "CH-2.6": "0.02"}
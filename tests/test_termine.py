@@ -0,0 +1,71 @@
+# tests/test_termine.py
+"""Kalender-Cache in app/services/termine.py: Invalidierung bei Termin- und Stammdaten-Aenderungen."""
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from app.services import shared_state, termine
+
+TAG = date(2025, 3, 4)
+
+
+@pytest.fixture
+def termin(app_db):
+    from app.models.entities import Kunde, Mitarbeiter, Service, Termin, TerminService
+    with app_db.SessionLocal() as db:
+        k = Kunde(name="Anna Muster")
+        m = Mitarbeiter(name="Mia", rollen="mitarbeiter")
+        s = Service(name="Schnitt", dauer_min=30, basispreis=Decimal("45.00"), steuer_code="CH-8.1")
+        db.add_all([k, m, s])
+        db.flush()
+        t = Termin(kunde_id=k.id, mitarbeiter_id=m.id, start_ts=datetime(2025, 3, 4, 9, 0),
+                   ende_ts=datetime(2025, 3, 4, 9, 30), zustand="gebucht")
+        db.add(t)
+        db.flush()
+        db.add(TerminService(termin_id=t.id, service_id=s.id))
+        db.commit()
+        return {"kunde": k.id, "mitarbeiter": m.id, "service": s.id, "termin": t.id}
+
+
+def _day(app_db, mitarbeiter_id):
+    with app_db.SessionLocal() as db:
+        return termine.termine_day(db, TAG, mitarbeiter_id)[0]
+
+
+@pytest.mark.parametrize("model, key, field, value, shown", [
+    ("Kunde", "kunde", "name", "Anna Neu", "kunde"),
+    ("Mitarbeiter", "mitarbeiter", "name", "Mia Neu", "mitarbeiter"),
+    ("Service", "service", "name", "Schnitt Neu", "services"),
+])
+def test_renaming_joined_rows_refreshes_cache(app_db, termin, model, key, field, value, shown):
+    from app.models import entities
+    mid = termin["mitarbeiter"]
+    assert _day(app_db, mid)["id"] == termin["termin"]
+    with app_db.SessionLocal() as db:
+        setattr(db.get(getattr(entities, model), termin[key]), field, value)
+        db.commit()
+    got = _day(app_db, mid)[shown]
+    assert (got == [value]) if shown == "services" else (got == value)
+
+
+def test_unrelated_field_keeps_cache(app_db, termin):
+    from app.models.entities import Kunde
+    _day(app_db, termin["mitarbeiter"])
+    before = shared_state.stamp(termine.STATE_NAME)
+    with app_db.SessionLocal() as db:
+        db.get(Kunde, termin["kunde"]).punkte = 10        # z. B. Treuepunkte beim Checkout
+        db.add(Kunde(name="Neukunde"))
+        db.commit()
+    assert shared_state.stamp(termine.STATE_NAME) == before
+
+
+def test_moving_termin_refreshes_cache(app_db, termin):
+    from app.models.entities import Termin
+    assert _day(app_db, None)
+    with app_db.SessionLocal() as db:
+        db.get(Termin, termin["termin"]).start_ts = datetime(2025, 3, 5, 9, 0)
+        db.get(Termin, termin["termin"]).ende_ts = datetime(2025, 3, 5, 9, 30)
+        db.commit()
+    with app_db.SessionLocal() as db:
+        assert termin["termin"] not in {t["id"] for t in termine.termine_day(db, TAG)}